@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import PlainTextResponse
 from typing import Optional, List, Dict, Any
 from services.cache_service import get_cache_service, CacheService
 from pydantic import BaseModel
@@ -42,6 +43,18 @@ async def get_cache_stats(cache: CacheService = Depends(get_cache)):
         logger.error(f"获取缓存统计失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取缓存统计失败: {str(e)}")
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_cache_metrics(cache: CacheService = Depends(get_cache)):
+    """以Prometheus文本格式导出缓存指标"""
+    try:
+        return PlainTextResponse(
+            cache.render_prometheus(),
+            media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+    except Exception as e:
+        logger.error(f"导出缓存指标失败: {e}")
+        raise HTTPException(status_code=500, detail=f"导出缓存指标失败: {str(e)}")
+
 @router.get("/keys", response_model=CacheResponse)
 async def get_cache_keys(
     pattern: str = "*",
@@ -1,6 +1,10 @@
+import json
 from fastapi import APIRouter, Query, Depends
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from services.log_service import log_service
+from services.log_service import log_service, decode_log_cursor, encode_log_cursor
+from services.log_search import SearchQuery
+from services.metrics_service import get_metrics_collector
 from typing import Optional
 
 router = APIRouter(
@@ -15,8 +19,11 @@ def get_logs(
     end_time: Optional[str] = Query(None, description="结束时间，格式: YYYY-MM-DDTHH:MM:SS"),
     level: Optional[str] = Query(None, description="日志级别: info, warning, error"),
     path: Optional[str] = Query(None, description="路径包含的字符串"),
+    status_code: Optional[int] = Query(None, description="响应状态码"),
+    q: Optional[str] = Query(None, description="全文检索message/error/body：空格为AND，支持OR、-排除和\"词组\""),
     limit: int = Query(100, description="每页条数"),
-    offset: int = Query(0, description="偏移量")
+    offset: int = Query(0, description="偏移量"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），传入时忽略offset")
 ):
     """获取日志列表，支持过滤和分页"""
     try:
@@ -25,6 +32,39 @@ def get_logs(
             datetime.fromisoformat(start_time)
         if end_time:
             datetime.fromisoformat(end_time)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": f"时间格式错误: {str(e)}"
+        }
+
+    try:
+        if cursor:
+            decode_log_cursor(cursor)
+        if q:
+            SearchQuery.parse(q)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+    try:
+        # 游标分页：开销只与limit有关
+        if cursor:
+            return {
+                "success": True,
+                "data": log_service.get_logs_page(
+                    start_time=start_time,
+                    end_time=end_time,
+                    level=level,
+                    path=path,
+                    status_code=status_code,
+                    limit=limit,
+                    cursor=cursor,
+                    q=q
+                )
+            }
 
         # 调用日志服务获取日志
         logs = log_service.get_logs(
@@ -32,25 +72,82 @@ def get_logs(
             end_time=end_time,
             level=level,
             path=path,
+            status_code=status_code,
             limit=limit,
-            offset=offset
+            offset=offset,
+            q=q
         )
+        # 附带下一页游标，后续页可改用游标分页
+        if logs["logs"] and offset + limit < logs["total"]:
+            logs["next_cursor"] = encode_log_cursor(logs["logs"][-1])
+        else:
+            logs["next_cursor"] = None
 
         return {
             "success": True,
             "data": logs
         }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"获取日志失败: {str(e)}"
+        }
+
+@router.get("/export")
+def export_logs(
+    start_time: Optional[str] = Query(None, description="开始时间，格式: YYYY-MM-DDTHH:MM:SS"),
+    end_time: Optional[str] = Query(None, description="结束时间，格式: YYYY-MM-DDTHH:MM:SS"),
+    level: Optional[str] = Query(None, description="日志级别: info, warning, error"),
+    path: Optional[str] = Query(None, description="路径包含的字符串"),
+    status_code: Optional[int] = Query(None, description="响应状态码"),
+    q: Optional[str] = Query(None, description="全文检索条件，语法与列表接口相同")
+):
+    """以NDJSON流式导出日志（每行一条，按时间倒序）"""
+    try:
+        if start_time:
+            datetime.fromisoformat(start_time)
+        if end_time:
+            datetime.fromisoformat(end_time)
     except ValueError as e:
         return {
             "success": False,
             "error": f"时间格式错误: {str(e)}"
         }
-    except Exception as e:
+
+    try:
+        if q:
+            SearchQuery.parse(q)
+    except ValueError as e:
         return {
             "success": False,
-            "error": f"获取日志失败: {str(e)}"
+            "error": str(e)
         }
 
+    def generate(batch_size: int = 200):
+        # 逐条产出，按批拼接后发送，内存占用与导出总量无关
+        batch = []
+        for log in log_service.iter_logs(
+            start_time=start_time,
+            end_time=end_time,
+            level=level,
+            path=path,
+            status_code=status_code,
+            release_segments=True,
+            q=q
+        ):
+            batch.append(json.dumps(log, ensure_ascii=False))
+            if len(batch) >= batch_size:
+                yield ("\n".join(batch) + "\n").encode("utf-8")
+                batch = []
+        if batch:
+            yield ("\n".join(batch) + "\n").encode("utf-8")
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=logs.ndjson"}
+    )
+
 @router.get("/recent")
 def get_recent_logs(
     limit: int = Query(50, description="获取条数")
@@ -69,22 +166,86 @@ def get_recent_logs(
         }
 
 @router.get("/stats")
-def get_log_stats():
-    """获取日志统计信息"""
+def get_log_stats(
+    start_time: Optional[str] = Query(None, description="开始时间，格式: YYYY-MM-DDTHH:MM:SS，默认结束时间前24小时"),
+    end_time: Optional[str] = Query(None, description="结束时间，格式: YYYY-MM-DDTHH:MM:SS，默认当前时间")
+):
+    """获取日志统计信息（按级别、分类、路径、状态码的计数和响应时间分位数）"""
+    try:
+        if start_time:
+            datetime.fromisoformat(start_time)
+        if end_time:
+            datetime.fromisoformat(end_time)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": f"时间格式错误: {str(e)}"
+        }
+
+    try:
+        return {
+            "success": True,
+            "data": log_service.get_log_stats(start_time=start_time, end_time=end_time)
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"获取日志统计失败: {str(e)}"
+        }
+
+@router.get("/metrics")
+def get_system_metrics(
+    seconds: Optional[int] = Query(None, ge=1, description="返回最近多少秒的样本，默认返回缓冲区中的全部样本")
+):
+    """获取系统指标采样（CPU、内存、请求数、错误数、活动连接数）"""
     try:
-        # 这里可以实现各种统计逻辑，例如不同级别的日志数量、每小时的请求数等
-        # 为了简单起见，我们只返回一个示例
+        collector = get_metrics_collector()
         return {
             "success": True,
             "data": {
-                "info_count": 120,
-                "warning_count": 25,
-                "error_count": 5,
-                "total_count": 150
+                **collector.get_stats(),
+                "samples": collector.recent(seconds)
             }
         }
     except Exception as e:
         return {
             "success": False,
-            "error": f"获取日志统计失败: {str(e)}"
-        }
\ No newline at end of file
+            "error": f"获取系统指标失败: {str(e)}"
+        }
+
+@router.get("/performance")
+def get_performance(
+    hours: int = Query(24, ge=1, le=24 * 365, description="查询最近多少小时"),
+    max_points: int = Query(300, ge=1, le=5000, description="序列最多返回的点数，决定读取的精度层级")
+):
+    """获取性能指标汇总和序列（按跨度自动选择原始/分钟/小时精度）"""
+    try:
+        return {
+            "success": True,
+            "data": {
+                "summary": log_service.get_performance_metrics(hours=hours),
+                "series": log_service.get_performance_series(hours=hours, max_points=max_points)
+            }
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"获取性能指标失败: {str(e)}"
+        }
+
+@router.get("/latency")
+def get_latency(
+    hours: int = Query(1, ge=1, le=24, description="统计最近多少小时（按整点小时，含当前小时）"),
+    route: Optional[str] = Query(None, description="路由模板过滤（子串匹配）")
+):
+    """获取按路由、状态码类别的响应时间分位数（p50/p90/p99/p999，合并所有worker）"""
+    try:
+        return {
+            "success": True,
+            "data": log_service.get_latency_stats(hours=hours, route=route)
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"获取响应时间分位数失败: {str(e)}"
+        }
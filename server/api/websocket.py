@@ -3,6 +3,7 @@ from typing import Dict, Set
 import json
 import asyncio
 from services.session_service import SessionService
+from services.log_service import log_service
 from config import SESSION_FILE, SESSION_EXPIRE_MINUTES
 import logging
 
@@ -15,10 +16,15 @@ verified_admin_connections: Set[str] = set()
 
 logger = logging.getLogger(__name__)
 
+# 日志实时推送每条消息最多包含的日志条数
+LOG_TAIL_BATCH_SIZE = 100
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
         self.verified_admin_connections: Set[str] = set()
+        # 日志订阅：session_id -> (订阅者, 推送任务)
+        self.log_subscriptions: Dict[str, tuple] = {}
     
     async def connect(self, websocket: WebSocket, session_id: str):
         await websocket.accept()
@@ -26,6 +32,7 @@ class ConnectionManager:
         logger.info(f"WebSocket连接已建立: {session_id}")
     
     def disconnect(self, session_id: str):
+        self.stop_log_subscription(session_id)
         if session_id in self.active_connections:
             del self.active_connections[session_id]
         if session_id in self.verified_admin_connections:
@@ -49,6 +56,17 @@ class ConnectionManager:
             self.verified_admin_connections.add(session_id)
             logger.info(f"管理员权限已验证: {session_id}")
     
+    def stop_log_subscription(self, session_id: str) -> bool:
+        """取消连接的日志订阅，返回是否存在订阅"""
+        subscription = self.log_subscriptions.pop(session_id, None)
+        if subscription is None:
+            return False
+        subscriber, task = subscription
+        log_service.tail.unsubscribe(subscriber)
+        if task is not asyncio.current_task():
+            task.cancel()
+        return True
+    
     def get_connection_count(self) -> int:
         return len(self.active_connections)
     
@@ -105,6 +123,14 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 )
             elif message_data.get("type") == "check_admin_status":
                 await send_admin_status(session_id)
+            elif message_data.get("type") == "subscribe_logs":
+                await handle_log_subscription(session_id, message_data)
+            elif message_data.get("type") == "unsubscribe_logs":
+                stopped = manager.stop_log_subscription(session_id)
+                await manager.send_personal_message(
+                    json.dumps({"type": "log_unsubscribed", "success": stopped}),
+                    session_id
+                )
             else:
                 # 回显其他消息
                 await manager.send_personal_message(
@@ -199,6 +225,73 @@ async def send_admin_status(session_id: str):
         session_id
     )
 
+async def handle_log_subscription(session_id: str, message_data: dict):
+    """订阅实时日志（仅限已验证的管理员连接），重复订阅时替换原有过滤条件"""
+    def result(success: bool, message: str, **extra):
+        return json.dumps({
+            "type": "log_subscription_result",
+            "success": success,
+            "message": message,
+            **extra
+        }, ensure_ascii=False)
+
+    if not manager.is_admin_connected(session_id):
+        await manager.send_personal_message(result(False, "需要管理员权限"), session_id)
+        return
+
+    filters = {
+        "level": message_data.get("level") or None,
+        "category": message_data.get("category") or None,
+        "path": message_data.get("path") or None,
+        "status_code": message_data.get("status_code")
+    }
+    try:
+        if filters["status_code"] is not None:
+            filters["status_code"] = int(filters["status_code"])
+    except (TypeError, ValueError):
+        await manager.send_personal_message(result(False, "状态码格式错误"), session_id)
+        return
+
+    manager.stop_log_subscription(session_id)
+    try:
+        subscriber = log_service.tail.subscribe(**filters)
+    except ValueError as e:
+        await manager.send_personal_message(result(False, str(e)), session_id)
+        return
+
+    task = asyncio.create_task(push_logs(session_id, subscriber))
+    manager.log_subscriptions[session_id] = (subscriber, task)
+    await manager.send_personal_message(result(True, "日志订阅成功", filters=filters), session_id)
+
+async def push_logs(session_id: str, subscriber):
+    """把订阅者队列中的日志批量推送给客户端，直到取消订阅、连接断开或消费过慢被丢弃"""
+    try:
+        while True:
+            batch = await subscriber.next_batch(LOG_TAIL_BATCH_SIZE)
+            websocket = manager.active_connections.get(session_id)
+            if websocket is None:
+                break
+            if batch is None:
+                logger.warning(f"日志订阅消费过慢，已丢弃: {session_id}")
+                await websocket.send_text(json.dumps({
+                    "type": "log_tail_dropped",
+                    "message": "日志推送积压过多，订阅已取消，请重新订阅"
+                }, ensure_ascii=False))
+                break
+            await websocket.send_text(json.dumps(
+                {"type": "log_tail", "logs": batch}, ensure_ascii=False, default=str
+            ))
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.error(f"推送日志失败 {session_id}: {e}")
+    finally:
+        subscription = manager.log_subscriptions.get(session_id)
+        if subscription is not None and subscription[0] is subscriber:
+            manager.stop_log_subscription(session_id)
+        else:
+            log_service.tail.unsubscribe(subscriber)
+
 # API端点：检查管理员是否通过WebSocket连接
 @router.get("/admin/websocket_status/{session_id}")
 async def check_admin_websocket_status(session_id: str):
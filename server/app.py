@@ -5,16 +5,7 @@ import signal
 import sys
 import asyncio
 import threading
-from api.auth import router as auth_router
-from api.chat import router as chat_router
-from api.log import router as log_router
-from api.websocket import router as websocket_router
-from api.cache import router as cache_router
-from config import SERVER_PORT, UVICORN_WORKERS, USE_REDIS_CACHE, REDIS_URL
-from middleware.logging_middleware import LoggingMiddleware
-
-# 创建FastAPI应用
-app = FastAPI()
+from config import SERVER_PORT, UVICORN_WORKERS, USE_REDIS_CACHE, REDIS_URL, USE_SHARED_MEMORY_CACHE
 
 # 全局变量用于跟踪服务器状态
 server_running = True
@@ -30,6 +21,10 @@ def cleanup():
     session_service = SessionService(SESSION_FILE, SESSION_EXPIRE_MINUTES)
     session_service.shutdown()  # 使用优化后的shutdown方法
     print("会话服务已关闭")
+    # 关闭日志服务（已由关闭事件关闭时不重复执行）
+    from services.log_service import log_service
+    log_service.shutdown()
+    print("日志服务已关闭")
     print("清理完成，应用已退出。")
 
 # 信号处理函数
@@ -41,90 +36,131 @@ def handle_shutdown(sig, frame):
     cleanup()
     sys.exit(0)
 
-# 注册信号处理
-signal.signal(signal.SIGINT, handle_shutdown)
-signal.signal(signal.SIGTERM, handle_shutdown)
-
-# 添加CORS中间件，允许前端访问
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://127.0.0.1:3000",
-        "ws://localhost:3000",
-        "ws://127.0.0.1:3000"
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# 注册API路由
-app.include_router(auth_router)
-app.include_router(chat_router)
-app.include_router(log_router)
-app.include_router(websocket_router)
-app.include_router(cache_router)
-
-# 导入数据库和缓存初始化函数
-from services.database_service import init_database
-from services.cache_service import init_cache_service, close_cache_service
-
-# 应用启动事件
-@app.on_event("startup")
-async def startup_event():
-    """应用启动时的初始化任务"""
-    print("正在初始化数据库...")
-    await init_database()
-    print("数据库初始化完成")
-    
-    print("正在初始化缓存服务...")
-    await init_cache_service(use_redis=USE_REDIS_CACHE, redis_url=REDIS_URL)
-    print("缓存服务初始化完成")
-
-# 应用关闭事件
-@app.on_event("shutdown")
-async def shutdown_event():
-    """应用关闭时的清理任务"""
-    print("正在关闭缓存服务...")
-    await close_cache_service()
-    print("缓存服务已关闭")
-    
-    print("正在关闭数据库连接...")
-    from services.database_service import get_connection_pool
-    pool = get_connection_pool()
-    await pool.close_all()
-    print("数据库连接已关闭")
-
-# 添加日志中间件
-app.add_middleware(LoggingMiddleware)
-print("日志中间件已添加")
-
-# 根路由
-@app.get("/")
-async def root():
-    return {"message": "Welcome to the backend API!"}
-
-# 调试路由：列出所有路由
-@app.get("/debug/routes")
-async def list_routes():
-    routes = []
-    for route in app.routes:
-        if hasattr(route, 'path') and hasattr(route, 'methods'):
-            routes.append({
-                "path": route.path,
-                "methods": list(route.methods) if hasattr(route, 'methods') else [],
-                "name": getattr(route, 'name', 'Unknown')
-            })
-        elif hasattr(route, 'path'):
-            routes.append({
-                "path": route.path,
-                "type": "WebSocket" if "websocket" in str(type(route)).lower() else "Other",
-                "name": getattr(route, 'name', 'Unknown')
-            })
-    return {"routes": routes}
+def create_app() -> FastAPI:
+    """创建FastAPI应用（导入API路由会初始化会话服务等单例）"""
+    from api.auth import router as auth_router
+    from api.chat import router as chat_router
+    from api.log import router as log_router
+    from api.websocket import router as websocket_router
+    from api.cache import router as cache_router
+    from middleware.logging_middleware import LoggingMiddleware
+
+    # 创建FastAPI应用
+    app = FastAPI()
+
+    # 添加CORS中间件，允许前端访问
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "http://localhost:3000",
+            "http://127.0.0.1:3000",
+            "ws://localhost:3000",
+            "ws://127.0.0.1:3000"
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # 注册API路由
+    app.include_router(auth_router)
+    app.include_router(chat_router)
+    app.include_router(log_router)
+    app.include_router(websocket_router)
+    app.include_router(cache_router)
+
+    # 导入数据库和缓存初始化函数
+    from services.database_service import init_database
+    from services.cache_service import init_cache_service, close_cache_service
+    from services.log_service import init_log_service, close_log_service
+
+    # 应用启动事件
+    @app.on_event("startup")
+    async def startup_event():
+        """应用启动时的初始化任务"""
+        print("正在启动日志服务...")
+        await init_log_service()
+        print("日志服务启动完成")
+
+        print("正在初始化数据库...")
+        await init_database()
+        print("数据库初始化完成")
+
+        print("正在初始化缓存服务...")
+        await init_cache_service(
+            use_redis=USE_REDIS_CACHE,
+            redis_url=REDIS_URL,
+            use_shared_memory=USE_SHARED_MEMORY_CACHE
+        )
+        print("缓存服务初始化完成")
+
+        # 注册系统指标采集的连接数来源
+        from api.websocket import get_connection_manager
+        from services.database_service import get_connection_pool
+        from services.metrics_service import get_metrics_collector
+        metrics = get_metrics_collector()
+        metrics.register_gauge("websocket_connections", get_connection_manager().get_connection_count)
+        metrics.register_gauge("db_connections", lambda: get_connection_pool().get_stats()["in_use"])
+
+    # 应用关闭事件
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        """应用关闭时的清理任务"""
+        print("正在关闭缓存服务...")
+        await close_cache_service()
+        print("缓存服务已关闭")
+
+        print("正在关闭数据库连接...")
+        from services.database_service import get_connection_pool
+        pool = get_connection_pool()
+        await pool.close_all()
+        print("数据库连接已关闭")
+
+        # 最后关闭日志服务，写完关闭过程中产生的日志
+        print("正在关闭日志服务...")
+        await close_log_service()
+        print("日志服务已关闭")
+
+    # 添加日志中间件
+    app.add_middleware(LoggingMiddleware)
+    print("日志中间件已添加")
+
+    # 根路由
+    @app.get("/")
+    async def root():
+        return {"message": "Welcome to the backend API!"}
+
+    # 调试路由：列出所有路由
+    @app.get("/debug/routes")
+    async def list_routes():
+        routes = []
+        for route in app.routes:
+            if hasattr(route, 'path') and hasattr(route, 'methods'):
+                routes.append({
+                    "path": route.path,
+                    "methods": list(route.methods) if hasattr(route, 'methods') else [],
+                    "name": getattr(route, 'name', 'Unknown')
+                })
+            elif hasattr(route, 'path'):
+                routes.append({
+                    "path": route.path,
+                    "type": "WebSocket" if "websocket" in str(type(route)).lower() else "Other",
+                    "name": getattr(route, 'name', 'Unknown')
+                })
+        return {"routes": routes}
+
+    return app
+
+# 以 python app.py 运行时，spawn方式启动的子进程（日志扫描进程池）会以 __mp_main__ 重新执行本文件；
+# 子进程不需要应用，也不能初始化会话服务等单例（会和主进程同时写会话文件）
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
+    # 注册信号处理（只在以脚本方式运行的服务器进程中）
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+
     print(f"启动服务器，监听端口 {SERVER_PORT}...")
     print("WebSocket服务已启用")
     
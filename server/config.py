@@ -49,4 +49,94 @@ REDIS_URL = "redis://localhost:6379"
 # 默认缓存过期时间（秒）
 DEFAULT_CACHE_TTL = 3600
 # 内存缓存最大条目数
-MEMORY_CACHE_MAX_SIZE = 1000
\ No newline at end of file
+MEMORY_CACHE_MAX_SIZE = 1000
+# 内存缓存最大占用字节数（按序列化大小估算，0表示不限制）
+MEMORY_CACHE_MAX_BYTES = 0
+# 内存缓存淘汰策略：lru（最近最少使用）或 tinylfu（W-TinyLFU频率准入）
+MEMORY_CACHE_POLICY = "lru"
+# 是否使用跨进程共享内存缓存（多worker共享，USE_REDIS_CACHE为True时忽略）
+USE_SHARED_MEMORY_CACHE = False
+# 共享内存缓存文件路径（空字符串表示自动选择/dev/shm或系统临时目录）
+SHARED_MEMORY_CACHE_PATH = ""
+# 共享内存缓存槽位数与每个槽位的字节数（键+JSON值需小于槽位大小-32）
+SHARED_MEMORY_CACHE_SLOTS = 4096
+SHARED_MEMORY_CACHE_SLOT_SIZE = 1024
+
+# 日志配置
+# 日志目录（日志段、索引、统计文件和维护锁都在该目录下）；相对路径按server目录解析
+LOG_DIR = "logs"
+# 日志写入队列最大长度
+LOG_QUEUE_MAX_SIZE = 10000
+# 日志队列满时的处理策略：drop（丢弃）、block（阻塞调用方）、sample（按采样率保留，错误日志始终保留）
+LOG_QUEUE_FULL_POLICY = "drop"
+# sample策略下的采样率
+LOG_QUEUE_SAMPLE_RATE = 0.1
+
+# 日志实时推送（WebSocket订阅）的最大订阅数，以及每个订阅者的队列长度（队列满时丢弃该订阅）
+LOG_TAIL_MAX_SUBSCRIBERS = 20
+LOG_TAIL_QUEUE_SIZE = 1000
+
+# 日志查询结果缓存（/api/logs重复查询直接返回缓存结果，段版本变化时失效）
+LOG_QUERY_CACHE_ENABLED = True
+# 最多缓存的查询数，以及缓存结果的最大占用字节数（按序列化大小估算）
+LOG_QUERY_CACHE_SIZE = 256
+LOG_QUERY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# 涉及当天（写入中）数据的结果的最长保留时间（秒），只涉及已关闭段的结果不过期
+LOG_QUERY_CACHE_LIVE_TTL = 300
+
+# 多日日志并行扫描：已关闭的日志段按天交给进程池扫描
+# 进程数（不超过CPU核数，0表示不使用进程池）
+LOG_SCAN_WORKERS = 4
+# 查询范围内已关闭的天数达到该值时才使用进程池
+LOG_SCAN_PARALLEL_MIN_DAYS = 2
+
+# 日志保留策略：按顺序匹配，第一条匹配的规则决定日志保留多久
+# level/category为列表（级别不区分大小写），path为路径前缀列表，省略的条件不限；
+# keep_days: 保留天数；sample_after_days/sample_rate: 超过该天数后只按采样率保留
+LOG_RETENTION_POLICIES = [
+    {"name": "health_checks", "path": ["/api/cache/health"], "keep_days": 1},
+    {"name": "errors", "level": ["ERROR", "CRITICAL"], "keep_days": 180},
+    {"name": "info", "level": ["INFO", "DEBUG"], "keep_days": 30, "sample_after_days": 7, "sample_rate": 0.1},
+]
+# 未匹配任何规则的日志以及性能指标文件的保留天数
+LOG_RETENTION_DEFAULT_DAYS = 30
+# 日志目录的磁盘预算（字节），超出时从最早的一天开始删除已关闭的日志
+LOG_DISK_BUDGET_BYTES = 5 * 1024 * 1024 * 1024
+# 日志所在磁盘至少保留的可用空间（字节），不足时同样删除最早的日志
+LOG_DISK_MIN_FREE_BYTES = 1024 * 1024 * 1024
+
+# 系统指标采集配置
+# 采样分辨率（秒），可选1、10、60
+METRICS_RESOLUTION_SECONDS = 10
+# 环形缓冲区保留的时长（秒），容量为该值除以分辨率
+METRICS_RETENTION_SECONDS = 3600
+
+# 请求日志管道配置（LoggingMiddleware写入日志前的采样与裁剪）
+# 是否启用日志管道（False则按原样记录全部请求）
+LOG_PIPELINE_ENABLED = True
+# 按路由的采样率（0~1，键为路径，以*结尾表示前缀匹配），未列出的路由使用默认采样率
+LOG_SAMPLE_RATES = {}
+LOG_DEFAULT_SAMPLE_RATE = 1.0
+# 按请求方法的采样率（优先于路由采样率），CORS预检请求默认不记录（仍计入统计）
+LOG_METHOD_SAMPLE_RATES = {"OPTIONS": 0.0}
+# 状态码不低于该值或耗时超过慢请求阈值（毫秒）的请求始终完整记录，不参与采样和合并
+# （4xx请求不参与采样，但仍可被合并为重复计数）
+LOG_ALWAYS_KEEP_STATUS = 500
+LOG_SLOW_REQUEST_MS = 1000
+# 记录的请求头/响应头白名单（小写，空列表表示不记录）
+LOG_REQUEST_HEADER_ALLOWLIST = ["user-agent", "content-type", "content-length", "origin", "referer"]
+LOG_RESPONSE_HEADER_ALLOWLIST = []
+# 请求体中需要脱敏的JSON字段
+LOG_REDACT_FIELDS = ["password", "old_password", "new_password", "token", "access_token", "api_key"]
+# 请求体最多记录的字节数，单条日志序列化后的最大字节数
+LOG_BODY_MAX_BYTES = 512
+LOG_ENTRY_MAX_BYTES = 2048
+# 中间件最多捕获的请求体字节数（需完整捕获才能对JSON脱敏，超出部分不捕获）
+LOG_BODY_CAPTURE_BYTES = 64 * 1024
+# 合并重复轮询的路由：相同的请求只记录首条，其余计数后合并为一条汇总日志
+LOG_DEDUP_PATHS = ["/auth/check_session_expiry", "/auth/is_admin"]
+# 合并窗口：空闲超过该时长（秒）或窗口总时长超过最大值时输出汇总
+LOG_DEDUP_WINDOW_SECONDS = 300
+LOG_DEDUP_MAX_WINDOW_SECONDS = 3600
+# 判断相同请求时是否比较请求体（False时只比较方法、路径、状态码和客户端IP）
+LOG_DEDUP_INCLUDE_BODY = False
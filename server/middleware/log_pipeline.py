@@ -0,0 +1,290 @@
+"""请求日志管道
+
+LoggingMiddleware在把请求日志交给日志服务之前，依次经过：
+1. 头部白名单：只保留配置的请求头/响应头（Authorization、Cookie等默认不记录）
+2. 请求体脱敏与截断：JSON请求体中的密码、令牌等字段替换为***，超长部分截断；只处理确定写入的日志
+3. 单条大小上限：序列化后仍超限时依次去掉头部、进一步截断请求体
+4. 重复轮询合并：配置的路由上相同的请求（方法、路径、状态码、客户端IP，可选包含
+   请求体）只记录首条，其余只计数。每次重复都会延长窗口，空闲超过dedup_window或
+   窗口总时长超过dedup_max_window时结束，输出一条带 repeat_count 的汇总日志
+5. 按方法/路由采样：成功请求按采样率保留，保留的日志带 sample_rate 字段
+
+空的查询参数和请求体不记录。
+
+5xx请求和慢请求始终完整记录，不参与采样和合并。
+"""
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import (
+    LOG_SAMPLE_RATES, LOG_DEFAULT_SAMPLE_RATE, LOG_METHOD_SAMPLE_RATES, LOG_ALWAYS_KEEP_STATUS,
+    LOG_SLOW_REQUEST_MS, LOG_REQUEST_HEADER_ALLOWLIST, LOG_RESPONSE_HEADER_ALLOWLIST,
+    LOG_REDACT_FIELDS, LOG_BODY_MAX_BYTES, LOG_ENTRY_MAX_BYTES, LOG_DEDUP_PATHS,
+    LOG_DEDUP_WINDOW_SECONDS, LOG_DEDUP_MAX_WINDOW_SECONDS, LOG_DEDUP_INCLUDE_BODY
+)
+
+REDACTED = "***"
+TRUNCATED_SUFFIX = "...(已截断)"
+
+
+class LogPipeline:
+    """请求日志的采样、脱敏与合并"""
+
+    SWEEP_INTERVAL = 1.0  # 检查过期合并窗口的最小间隔（秒）
+    MAX_DEDUP_KEYS = 10000  # 同时跟踪的合并键上限
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None, default_sample_rate: float = 1.0,
+                 method_sample_rates: Optional[Dict[str, float]] = None,
+                 always_keep_status: int = 500, slow_request_ms: float = 1000,
+                 request_header_allowlist: Iterable[str] = (), response_header_allowlist: Iterable[str] = (),
+                 redact_fields: Iterable[str] = (), max_body_bytes: int = 512, max_entry_bytes: int = 2048,
+                 dedup_paths: Iterable[str] = (), dedup_window: float = 300, dedup_max_window: float = 3600,
+                 dedup_include_body: bool = False):
+        self.exact_rates: Dict[str, float] = {}
+        self.prefix_rates: List[tuple] = []
+        for route, rate in (sample_rates or {}).items():
+            if route.endswith("*"):
+                self.prefix_rates.append((route[:-1], rate))
+            else:
+                self.exact_rates[route] = rate
+        self.prefix_rates.sort(key=lambda item: len(item[0]), reverse=True)  # 最长前缀优先
+        self.default_sample_rate = default_sample_rate
+        self.method_sample_rates = {method.upper(): rate for method, rate in (method_sample_rates or {}).items()}
+        self.always_keep_status = always_keep_status
+        self.slow_request_ms = slow_request_ms
+        self.request_header_allowlist = [name.lower() for name in request_header_allowlist]
+        self.response_header_allowlist = [name.lower() for name in response_header_allowlist]
+        self.redact_fields = {name.lower() for name in redact_fields}
+        self.max_body_bytes = max_body_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.dedup_paths = set(dedup_paths)
+        self.dedup_window = dedup_window
+        self.dedup_max_window = dedup_max_window
+        self.dedup_include_body = dedup_include_body
+
+        self._dedup: Dict[tuple, Dict[str, Any]] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            'received': 0,
+            'kept': 0,
+            'sampled_out': 0,
+            'deduplicated': 0,
+            'truncated': 0
+        }
+
+    # ---- 字段裁剪 ----
+
+    @staticmethod
+    def select_headers(headers, allowlist: List[str]) -> Dict[str, str]:
+        """按白名单挑选头部（headers为Starlette Headers或字典）"""
+        selected = {}
+        for name in allowlist:
+            value = headers.get(name)
+            if value is not None:
+                selected[name] = value
+        return selected
+
+    def _redact(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if str(key).lower() in self.redact_fields else self._redact(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._redact(item) for item in value]
+        return value
+
+    def clean_body(self, body) -> str:
+        """脱敏并截断请求体（body可以是中间件捕获的原始字节）"""
+        if isinstance(body, (bytes, bytearray)):
+            body = bytes(body).decode("utf-8", "replace")
+        if not body:
+            return body
+        if self.redact_fields and body[:1] in ("{", "["):
+            try:
+                body = json.dumps(self._redact(json.loads(body)), ensure_ascii=False, separators=(",", ":"))
+            except ValueError:
+                pass
+        return self._truncate(body, self.max_body_bytes)
+
+    def _truncate(self, text: str, max_bytes: int) -> str:
+        data = text.encode("utf-8")
+        if len(data) <= max_bytes:
+            return text
+        self.stats['truncated'] += 1
+        return data[:max(0, max_bytes)].decode("utf-8", "ignore") + TRUNCATED_SUFFIX
+
+    def _enforce_size(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """单条日志超过大小上限时，依次去掉头部、查询参数，再截断请求体和错误信息"""
+        size = len(json.dumps(entry, ensure_ascii=False))
+        if size <= self.max_entry_bytes:
+            return entry
+        for field in ("response_headers", "headers", "query_params"):
+            if field in entry:
+                size -= len(json.dumps(entry.pop(field), ensure_ascii=False))
+                if size <= self.max_entry_bytes:
+                    return entry
+        for field in ("body", "error"):
+            value = entry.get(field)
+            if isinstance(value, str) and value:
+                overflow = size - self.max_entry_bytes
+                entry[field] = self._truncate(value, len(value.encode("utf-8")) - overflow - len(TRUNCATED_SUFFIX) * 3)
+                size = len(json.dumps(entry, ensure_ascii=False))
+                if size <= self.max_entry_bytes:
+                    break
+        return entry
+
+    # ---- 采样与合并 ----
+
+    def sample_rate_for(self, path: str, method: Optional[str] = None) -> float:
+        """采样率：方法配置优先（如OPTIONS预检请求），其次精确路由、最长前缀、默认值"""
+        rate = self.method_sample_rates.get(method) if method else None
+        if rate is not None:
+            return rate
+        rate = self.exact_rates.get(path)
+        if rate is not None:
+            return rate
+        for prefix, rate in self.prefix_rates:
+            if path.startswith(prefix):
+                return rate
+        return self.default_sample_rate
+
+    def process(self, entry: Dict[str, Any], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """处理一条请求日志，返回需要写入的日志（可能为空，也可能包含到期的合并汇总）
+
+        now: 当前单调时钟秒数，回放历史日志时由调用方按日志时间传入
+        """
+        now = time.monotonic() if now is None else now
+        output: List[Dict[str, Any]] = []
+        with self._lock:
+            self.stats['received'] += 1
+            if now - self._last_sweep >= self.SWEEP_INTERVAL:
+                output.extend(self._sweep(now))
+
+            status_code = entry.get("status_code") or 0
+            important = status_code >= self.always_keep_status or \
+                (entry.get("processing_time_ms") or 0) >= self.slow_request_ms
+            for field in ("query_params", "body"):
+                if field in entry and not entry[field]:
+                    del entry[field]
+
+            if not important:
+                path = entry.get("path", "")
+                if status_code < 400:
+                    rate = self.sample_rate_for(path, entry.get("method"))
+                    if rate < 1.0:
+                        if random.random() >= rate:
+                            self.stats['sampled_out'] += 1
+                            return output
+                        entry["sample_rate"] = rate
+                if path in self.dedup_paths and not self._track_repeat(entry, now, output):
+                    self.stats['deduplicated'] += 1
+                    return output
+
+            # 请求体只在确定写入时才解码和脱敏（合并窗口的首条同样作为汇总模板）
+            if isinstance(entry.get("body"), (str, bytes, bytearray)):
+                entry["body"] = self.clean_body(entry["body"])
+            self.stats['kept'] += 1
+            output.append(self._enforce_size(entry))
+        return output
+
+    def _dedup_key(self, entry: Dict[str, Any]) -> tuple:
+        return (entry.get("method"), entry.get("path"), entry.get("status_code"), entry.get("client_ip"),
+                entry.get("body") if self.dedup_include_body else None)
+
+    def _track_repeat(self, entry: Dict[str, Any], now: float, output: List[Dict[str, Any]]) -> bool:
+        """记录一次可合并的请求，返回这条日志是否需要写入（窗口内的首条）"""
+        key = self._dedup_key(entry)
+        state = self._dedup.get(key)
+        if state is not None and now < state["expires"] and now - state["started"] < self.dedup_max_window:
+            state["count"] += 1
+            state["last_timestamp"] = entry.get("timestamp")
+            state["last_processing_time_ms"] = entry.get("processing_time_ms")
+            state["expires"] = now + self.dedup_window
+            return False
+        if state is not None:
+            summary = self._summary(self._dedup.pop(key))
+            if summary:
+                output.append(summary)
+        if len(self._dedup) >= self.MAX_DEDUP_KEYS:
+            oldest = min(self._dedup, key=lambda k: self._dedup[k]["expires"])
+            summary = self._summary(self._dedup.pop(oldest))
+            if summary:
+                output.append(summary)
+        self._dedup[key] = {
+            "template": entry,
+            "count": 0,
+            "first_timestamp": entry.get("timestamp"),
+            "last_timestamp": entry.get("timestamp"),
+            "last_processing_time_ms": entry.get("processing_time_ms"),
+            "started": now,
+            "expires": now + self.dedup_window
+        }
+        return True
+
+    @staticmethod
+    def _summary(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """窗口结束时生成合并汇总日志（窗口内没有重复请求则不生成）"""
+        if state["count"] == 0:
+            return None
+        summary = {
+            key: value for key, value in state["template"].items()
+            if key not in ("headers", "response_headers", "seq")
+        }
+        summary.update(
+            timestamp=state["last_timestamp"],
+            processing_time_ms=state["last_processing_time_ms"],
+            repeat_count=state["count"],
+            window_start=state["first_timestamp"],
+            message="重复请求已合并"
+        )
+        return summary
+
+    def _sweep(self, now: float) -> List[Dict[str, Any]]:
+        """输出已过期窗口的合并汇总（调用方需持有锁）"""
+        self._last_sweep = now
+        output = []
+        expired = [
+            key for key, state in self._dedup.items()
+            if now >= state["expires"] or now - state["started"] >= self.dedup_max_window
+        ]
+        for key in expired:
+            summary = self._summary(self._dedup.pop(key))
+            if summary:
+                output.append(summary)
+        return output
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """输出全部未结束窗口的合并汇总（关闭时调用）"""
+        with self._lock:
+            states = list(self._dedup.values())
+            self._dedup.clear()
+        return [summary for summary in map(self._summary, states) if summary]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取管道统计信息"""
+        return {**self.stats, 'dedup_windows': len(self._dedup)}
+
+
+def create_log_pipeline() -> LogPipeline:
+    """按config.py中的配置创建日志管道"""
+    return LogPipeline(
+        sample_rates=LOG_SAMPLE_RATES,
+        default_sample_rate=LOG_DEFAULT_SAMPLE_RATE,
+        method_sample_rates=LOG_METHOD_SAMPLE_RATES,
+        always_keep_status=LOG_ALWAYS_KEEP_STATUS,
+        slow_request_ms=LOG_SLOW_REQUEST_MS,
+        request_header_allowlist=LOG_REQUEST_HEADER_ALLOWLIST,
+        response_header_allowlist=LOG_RESPONSE_HEADER_ALLOWLIST,
+        redact_fields=LOG_REDACT_FIELDS,
+        max_body_bytes=LOG_BODY_MAX_BYTES,
+        max_entry_bytes=LOG_ENTRY_MAX_BYTES,
+        dedup_paths=LOG_DEDUP_PATHS,
+        dedup_window=LOG_DEDUP_WINDOW_SECONDS,
+        dedup_max_window=LOG_DEDUP_MAX_WINDOW_SECONDS,
+        dedup_include_body=LOG_DEDUP_INCLUDE_BODY
+    )
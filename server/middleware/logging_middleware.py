@@ -1,10 +1,20 @@
+"""请求日志中间件（纯ASGI实现）
+
+直接包装ASGI的receive/send，不经过BaseHTTPMiddleware：
+- 不预先读取请求体：应用读取请求体时顺带保存收到的分块（上限LOG_BODY_CAPTURE_BYTES），
+  只有日志确定写入时才由管道解码和脱敏
+- 响应消息原样转发，不缓冲；处理时间在发送最后一个响应体分块时计算，
+  流式响应（如/chat）记录的是整个流结束的耗时
+- 客户端中途断开、应用抛出异常时同样记录日志
+"""
 import time
-import json
 import logging
 from datetime import datetime
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from services.log_service import LogService
+from starlette.datastructures import Headers, QueryParams
+from services.log_service import get_log_service
+from services.metrics_service import get_metrics_collector
+from middleware.log_pipeline import create_log_pipeline
+from config import LOG_PIPELINE_ENABLED, LOG_BODY_CAPTURE_BYTES
 
 # 配置日志记录器
 logging.basicConfig(
@@ -13,90 +23,181 @@ logging.basicConfig(
 )
 logger = logging.getLogger("app_logger")
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+BODY_METHODS = ("POST", "PUT", "PATCH")
+
+
+class _RequestState:
+    """单个请求的日志状态"""
+
+    __slots__ = ("timestamp", "start", "end", "body_chunks", "body_size", "body_overflow", "status_code",
+                 "response_headers", "logged")
+
+    def __init__(self):
+        self.timestamp = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.end = None
+        self.body_chunks = []
+        self.body_size = 0
+        self.body_overflow = False
+        self.status_code = None
+        self.response_headers = None
+        self.logged = False
+
+    def capture(self, chunk: bytes):
+        """保存应用读取到的请求体分块，超过上限后不再保存"""
+        if not chunk or self.body_overflow:
+            return
+        self.body_size += len(chunk)
+        if self.body_size > LOG_BODY_CAPTURE_BYTES:
+            self.body_overflow = True
+            self.body_chunks = []
+        else:
+            self.body_chunks.append(chunk)
+
+    def body(self):
+        if self.body_overflow:
+            # 未完整捕获的请求体无法脱敏，只记录大小
+            return f"(请求体过大，未记录: 超过{LOG_BODY_CAPTURE_BYTES}字节)"
+        return b"".join(self.body_chunks)
+
+
+class LoggingMiddleware:
     def __init__(self, app):
-        super().__init__(app)
-        self.log_service = LogService()
-
-    async def dispatch(self, request: Request, call_next):
-        # 记录请求开始时间
-        start_time = time.time()
-        timestamp = datetime.now().isoformat()
-        client_ip = request.client.host
-        path = request.url.path
-        method = request.method
-
-        # 记录请求信息
-        request_data = {
-            "timestamp": timestamp,
-            "client_ip": client_ip,
-            "path": path,
-            "method": method,
-            "headers": dict(request.headers),
-            "query_params": dict(request.query_params)
-        }
-
-        # 如果是POST请求，尝试获取请求体
-        if method in ["POST", "PUT", "PATCH"]:
-            try:
-                body = await request.body()
-                request_data["body"] = body.decode() if body else ""
-            except Exception as e:
-                logger.error(f"无法获取请求体: {str(e)}")
-                request_data["body"] = "无法获取请求体"
-
-        logger.info(f"收到请求: {method} {path}")
-
-        try:
-            # 处理请求
-            response = await call_next(request)
-
-            # 计算请求处理时间
-            processing_time = time.time() - start_time
-            status_code = response.status_code
-
-            # 记录响应信息
-            response_data = {
-                "status_code": status_code,
-                "processing_time_ms": round(processing_time * 1000, 2),
-                "headers": dict(response.headers)
-            }
-
-            # 合并请求和响应信息
-            log_entry = {
-                **request_data,
-                **response_data
-            }
-
-            # 根据状态码记录不同级别的日志
-            if status_code >= 500:
-                logger.error(f"请求失败: {method} {path} {status_code}")
-                log_entry["level"] = "error"
-            elif status_code >= 400:
-                logger.warning(f"请求警告: {method} {path} {status_code}")
-                log_entry["level"] = "warning"
-            else:
-                logger.info(f"请求成功: {method} {path} {status_code}")
-                log_entry["level"] = "info"
-
-            # 存储日志
+        self.app = app
+        self.log_service = get_log_service()
+        self.metrics = get_metrics_collector()
+        # 写入前的采样、脱敏与重复合并
+        self.pipeline = create_log_pipeline() if LOG_PIPELINE_ENABLED else None
+        if self.pipeline is not None:
+            self.log_service.add_shutdown_hook(self._flush_pipeline)
+
+    def _flush_pipeline(self):
+        """日志服务关闭前写入尚未结束的重复合并汇总"""
+        for entry in self.pipeline.flush():
+            self.log_service.save_log(entry, record_stats=False)
+
+    def _request_headers(self, headers):
+        if self.pipeline is None:
+            return dict(headers)
+        return self.pipeline.select_headers(headers, self.pipeline.request_header_allowlist)
+
+    def _response_headers(self, headers):
+        if self.pipeline is None:
+            return dict(headers)
+        return self.pipeline.select_headers(headers, self.pipeline.response_header_allowlist)
+
+    def _store(self, log_entry):
+        """所有请求都计入统计，经过管道后保留的日志才写入"""
+        if self.pipeline is None:
+            body = log_entry.get("body")
+            if isinstance(body, bytes):
+                log_entry["body"] = body.decode("utf-8", "replace")
             self.log_service.save_log(log_entry)
+            return
+        self.log_service.record_stats(log_entry)
+        for entry in self.pipeline.process(log_entry):
+            self.log_service.save_log(entry, record_stats=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = _RequestState()
+        method = scope["method"]
+        path = scope["path"]
+        logger.info(f"收到请求: {method} {path}")
 
-            return response
+        if method in BODY_METHODS:
+            async def receive_wrapper():
+                message = await receive()
+                if message["type"] == "http.request":
+                    state.capture(message.get("body", b""))
+                return message
+        else:
+            receive_wrapper = receive
+
+        async def send_wrapper(message):
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                state.status_code = message["status"]
+                state.response_headers = message.get("headers")
+            elif message_type == "http.response.body" and not message.get("more_body", False):
+                # 最后一个响应体分块发送完成即视为请求结束；
+                # 5xx响应之后应用通常还会抛出异常，等应用返回后再记录以带上错误信息
+                await send(message)
+                state.end = time.perf_counter()
+                if state.status_code < 500:
+                    self._log_request(scope, state)
+                return
+            await send(message)
 
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
         except Exception as e:
-            # 记录异常信息
-            processing_time = time.time() - start_time
-            error_log = {
-                **request_data,
-                "status_code": 500,
-                "processing_time_ms": round(processing_time * 1000, 2),
-                "error": str(e),
-                "level": "error"
-            }
-
             logger.error(f"请求异常: {method} {path} - {str(e)}")
-            self.log_service.save_log(error_log)
-
+            self._log_request(scope, state, error=e)
             # 重新抛出异常，让FastAPI处理
             raise
+        else:
+            if not state.logged:
+                # 5xx响应，或响应未发送完（如客户端断开连接）
+                self._log_request(scope, state)
+
+    def _log_request(self, scope, state: _RequestState, error: Exception = None):
+        """组装并存储一次请求的日志"""
+        if state.logged:
+            return
+        state.logged = True
+        processing_time = (state.end or time.perf_counter()) - state.start
+        method = scope["method"]
+        path = scope["path"]
+        client = scope.get("client")
+
+        log_entry = {
+            "timestamp": state.timestamp,
+            "client_ip": client[0] if client else None,
+            "path": path,
+            "method": method,
+            "headers": self._request_headers(Headers(scope=scope)),
+            "query_params": dict(QueryParams(scope.get("query_string", b"")))
+        }
+        if method in BODY_METHODS:
+            log_entry["body"] = state.body()
+
+        status_code = state.status_code
+        if error is not None:
+            if status_code is None:
+                status_code = 500
+            log_entry["error"] = str(error)
+        elif status_code is None:
+            # 没有发送响应头，客户端已断开
+            status_code = 499
+            log_entry["error"] = "客户端在响应前断开连接"
+        log_entry["status_code"] = status_code
+        log_entry["processing_time_ms"] = round(processing_time * 1000, 2)
+        self.metrics.record_request(status_code, log_entry["processing_time_ms"])
+        # 按匹配到的路由模板统计分位数，未匹配的路径合并为一项，避免基数膨胀
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        self.log_service.latency.record(route, status_code, log_entry["processing_time_ms"])
+        if state.response_headers is not None:
+            response_headers = self._response_headers(Headers(raw=state.response_headers))
+            if response_headers:
+                log_entry["response_headers"] = response_headers
+
+        # 根据状态码记录不同级别的日志
+        if error is not None or status_code >= 500:
+            if error is None:
+                logger.error(f"请求失败: {method} {path} {status_code}")
+            log_entry["level"] = "error"
+        elif status_code >= 400:
+            logger.warning(f"请求警告: {method} {path} {status_code}")
+            log_entry["level"] = "warning"
+        else:
+            logger.info(f"请求成功: {method} {path} {status_code}")
+            log_entry["level"] = "info"
+
+        try:
+            self._store(log_entry)
+        except Exception as e:
+            logger.error(f"记录请求日志失败: {method} {path} - {str(e)}")
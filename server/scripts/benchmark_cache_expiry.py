@@ -0,0 +1,117 @@
+"""过期清理期间的get延迟基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_cache_expiry.py [缓存条目数] [过期比例]
+
+向SyncMemoryCache写入大量条目（其中一部分已过期），然后在后台线程执行清理的同时
+在前台持续执行get，统计get延迟的p50/p99/max。对比两种清理方式：
+- 全量扫描：在一次持锁中遍历所有条目（旧的cleanup_expired实现）
+- 增量清理：按过期时间桶分批清理（当前实现，每批之间释放锁）
+
+全量扫描期间所有get都被同一次持锁阻塞，停顿体现在max列；增量清理把停顿
+拆成多个短批次，尾延迟上限约为单批清理的耗时。
+
+开始前先检查一秒内重复写入同一个键（新旧过期时间落在同一个桶）后，
+cleanup_expired仍能回收到期的条目。
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache_service import SyncMemoryCache
+
+
+def build_cache(size: int, expired_ratio: float) -> SyncMemoryCache:
+    cache = SyncMemoryCache(max_size=size + 1, default_ttl=0)
+    expired = int(size * expired_ratio)
+    # 短TTL的条目最后写入，避免写入过程中的增量清理提前把它们回收
+    for i in range(size):
+        cache.set(f"user:{i}", {"id": i}, ttl=3600 if i < size - expired else 1)
+    # 等待短TTL的条目全部到期
+    time.sleep(2.1)
+    return cache
+
+
+def full_scan_cleanup(cache: SyncMemoryCache):
+    """旧实现：持锁遍历全部条目"""
+    with cache._lock:
+        now = time.time()
+        expired_keys = [
+            key for key, item in cache._cache.items()
+            if item['expires_at'] and now > item['expires_at']
+        ]
+        for key in expired_keys:
+            cache._remove_key(key)
+
+
+def incremental_cleanup(cache: SyncMemoryCache, batch: int = 256):
+    """新实现：分批清理到期时间桶"""
+    while cache.cleanup_expired(batch) >= batch:
+        time.sleep(0)
+
+
+def check_reset_expiry() -> bool:
+    """一秒内重复写入的键到期后应被cleanup_expired回收"""
+    cache = SyncMemoryCache(max_size=10, default_ttl=0)
+    cache.set("a", 1, ttl=1)
+    cache.set("b", 1, ttl=1)
+    cache.set("b", 2, ttl=1)
+    indexed = sum(len(bucket) for bucket in cache._expiry_buckets.values())
+    time.sleep(2.1)
+    removed = cache.cleanup_expired()
+    remaining = cache.get_stats()['total_items']
+    ok = indexed == 2 and removed == 2 and remaining == 0
+    print(f"一秒内重复写入: 过期索引 {indexed} 项, 到期后清理 {removed} 项, 剩余 {remaining} 项 "
+          f"{'通过' if ok else '失败'}")
+    return ok
+
+
+def measure(label: str, size: int, expired_ratio: float, cleanup):
+    cache = build_cache(size, expired_ratio)
+    live_keys = [f"user:{i}" for i in range(size - int(size * expired_ratio))]
+    latencies = []
+    done = threading.Event()
+
+    def run_cleanup():
+        start = time.perf_counter()
+        cleanup(cache)
+        run_cleanup.elapsed = time.perf_counter() - start
+        done.set()
+
+    cleaner = threading.Thread(target=run_cleanup)
+    cleaner.start()
+    i = 0
+    while not done.is_set() or len(latencies) < 1000:
+        key = live_keys[i % len(live_keys)]
+        start = time.perf_counter()
+        cache.get(key)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    cleaner.join()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    p999 = latencies[int(len(latencies) * 0.999)]
+    print(f"{label:<10} 清理耗时 {run_cleanup.elapsed * 1000:8.1f} ms  "
+          f"get p50 {p50 * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us  p99.9 {p999 * 1e6:9.1f} us  "
+          f"max {latencies[-1] * 1000:7.2f} ms  "
+          f"剩余条目 {cache.get_stats()['total_items']}")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    expired_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    if not check_reset_expiry():
+        return 1
+    print(f"缓存条目 {size}，过期比例 {expired_ratio:.0%}")
+    measure("全量扫描", size, expired_ratio, full_scan_cleanup)
+    measure("增量清理", size, expired_ratio, incremental_cleanup)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
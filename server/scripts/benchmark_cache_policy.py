@@ -0,0 +1,106 @@
+"""缓存淘汰策略回放基准测试
+
+从 logs/app_logs_*.jsonl 中提取请求序列，映射为服务端会访问的缓存键，
+分别回放到LRU和W-TinyLFU策略的SyncMemoryCache中，对比命中率。
+
+用法（在server目录下运行）:
+    python scripts/benchmark_cache_policy.py [--sizes 16,32,64,128] [--noise 1.0]
+
+--noise 表示每个真实请求额外夹带的一次性键数量（模拟健康检查等只访问一次的键）。
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache_service import CacheService, SyncMemoryCache
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+
+
+def extract_keys(log_dir: str):
+    """把日志中的请求映射为缓存键序列"""
+    keygen = CacheService()
+    keys = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "app_logs_*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    log = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if log.get("method") == "OPTIONS":
+                    continue
+                try:
+                    body = json.loads(log.get("body") or "{}")
+                except (json.JSONDecodeError, TypeError):
+                    body = {}
+                if not isinstance(body, dict):
+                    body = {}
+
+                username = body.get("username")
+                password = body.get("password")
+                session_id = body.get("session_id")
+                if username and password:
+                    keys.append(keygen.generate_cache_key("auth_success", username, str(password)[:10]))
+                    keys.append(keygen.generate_cache_key("user", username))
+                elif session_id:
+                    keys.append(keygen.generate_cache_key("session", session_id))
+                    keys.append("user_count")
+                else:
+                    keys.append(keygen.generate_cache_key("request", log.get("path", ""), log.get("body", "")))
+    return keys
+
+
+def inject_noise(keys, ratio: float, seed: int = 42):
+    """按比例插入只出现一次的键"""
+    if ratio <= 0:
+        return keys
+    rng = random.Random(seed)
+    mixed = []
+    counter = 0
+    for key in keys:
+        mixed.append(key)
+        extra = int(ratio) + (1 if rng.random() < ratio - int(ratio) else 0)
+        for _ in range(extra):
+            counter += 1
+            mixed.append(f"__health_check__:{counter}")
+    return mixed
+
+
+def replay(keys, size: int, policy: str) -> float:
+    cache = SyncMemoryCache(max_size=size, default_ttl=0, policy=policy)
+    hits = 0
+    for key in keys:
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, True)
+    return hits / len(keys) if keys else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缓存淘汰策略命中率回放")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--sizes", default="16,32,64,128")
+    parser.add_argument("--noise", type=float, default=1.0)
+    args = parser.parse_args()
+
+    keys = inject_noise(extract_keys(args.log_dir), args.noise)
+    if not keys:
+        print("没有可回放的日志")
+        return
+    print(f"回放 {len(keys)} 次访问，{len(set(keys))} 个不同键（一次性键比例 {args.noise}）")
+    print(f"{'容量':>6} {'LRU命中率':>12} {'TinyLFU命中率':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        lru = replay(keys, size, "lru")
+        tinylfu = replay(keys, size, "tinylfu")
+        print(f"{size:>6} {lru:>12.2%} {tinylfu:>14.2%}")
+
+
+if __name__ == "__main__":
+    main()
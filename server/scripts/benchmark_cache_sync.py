@@ -0,0 +1,70 @@
+"""同步缓存装饰器开销基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_cache_sync.py [调用次数]
+
+对比未缓存的同步函数、cache_result同步前端（命中路径）以及
+直接访问SyncMemoryCache的单次调用耗时。
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache_service import cache_result, get_cache_service
+
+
+def plain_lookup(user_id):
+    return {"user_id": user_id, "name": f"user-{user_id}"}
+
+
+@cache_result("bench_user", ttl=600)
+def cached_lookup(user_id):
+    return {"user_id": user_id, "name": f"user-{user_id}"}
+
+
+def measure(label, func, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i % 100)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / iterations * 1e6:8.2f} us/调用")
+
+
+def measure_threads(func, iterations, threads=4):
+    def worker():
+        for i in range(iterations):
+            func(i % 100)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"{f'cache_result ({threads}线程)':<32} {elapsed / (iterations * threads) * 1e6:8.2f} us/调用")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    cache = get_cache_service()
+
+    # 预热，保证后续都走命中路径
+    for i in range(100):
+        cached_lookup(i)
+
+    key = cache.generate_cache_key("bench_user", 1)
+    measure("未缓存函数", plain_lookup, iterations)
+    measure("cache_result 同步命中", cached_lookup, iterations)
+    measure("SyncMemoryCache.get", lambda _: cache.sync_cache.get(key), iterations)
+    measure_threads(cached_lookup, iterations // 4)
+
+    stats = cache.get_stats()["metrics"]["namespaces"]["bench_user"]
+    print(f"命中率: {stats['hit_ratio']}, 平均get延迟: {stats['latency']['get']['avg_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""日志全量导出内存基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_log_export.py [--days 10 40 80] [--per-day 2000]
+
+在临时目录中生成若干天的已关闭日志（一半的天压缩为列式文件，其余保持JSONL），
+用tracemalloc测量 iter_logs(release_segments=True)（/api/logs/export使用的方式）导出
+全部日志时的内存峰值和导出后仍被日志服务持有的内存，并与走段索引缓存的普通遍历对照。
+导出的内存峰值应只取决于单天的数据量，不随导出的天数增长。
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_service import OptimizedLogService
+
+
+def generate(log_dir: str, days: int, per_day: int) -> datetime:
+    first_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    step = 86400 / per_day
+    for day in range(days):
+        start = first_day + timedelta(days=day)
+        with open(os.path.join(log_dir, f"app_logs_{start:%Y%m%d}_w1.jsonl"), "w", encoding="utf-8") as f:
+            for i in range(per_day):
+                f.write(json.dumps({
+                    "timestamp": (start + timedelta(seconds=i * step)).isoformat(),
+                    "level": "ERROR" if i % 50 == 0 else "INFO",
+                    "category": "API",
+                    "message": f"GET /api/items/{i % 500} 请求完成",
+                    "path": "/api/items",
+                    "status_code": 500 if i % 50 == 0 else 200,
+                    "seq": i + 1
+                }, ensure_ascii=False) + "\n")
+    return first_day
+
+
+def measure(service: OptimizedLogService, start_time: str, release: bool):
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    count = 0
+    for _ in service.iter_logs(start_time=start_time, release_segments=release):
+        count += 1
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return count, elapsed, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志全量导出内存基准测试")
+    parser.add_argument("--days", type=int, nargs="+", default=[10, 40, 80])
+    parser.add_argument("--per-day", type=int, default=2000)
+    args = parser.parse_args()
+
+    for days in args.days:
+        log_dir = tempfile.mkdtemp(prefix="xt_log_export_")
+        try:
+            first_day = generate(log_dir, days, args.per_day)
+            service = OptimizedLogService(log_dir=log_dir, autostart=False)
+            service.query_cache.enabled = False
+            service.scan_pool.min_days = days + 1  # 对照组也在本进程中读取
+            # 一半的天压缩为列式文件
+            service.compact_min_age = 0
+            for day in range(0, days, 2):
+                date_str = (first_day + timedelta(days=day)).strftime("%Y%m%d")
+                source = os.path.join(log_dir, f"app_logs_{date_str}_w1.jsonl")
+                service._compact_segment(os.path.join(log_dir, f"app_logs_{date_str}.col"), [source])
+            start_time = first_day.isoformat()
+
+            print(f"{days} 天 x {args.per_day} 条:")
+            for label, release in (("导出 release_segments=True", True), ("对照 使用段索引缓存", False)):
+                count, elapsed, peak, retained = measure(service, start_time, release)
+                print(f"  {label:<28} {count:>7} 条 {elapsed:6.2f}s  峰值 {peak / 1e6:7.1f} MB  "
+                      f"导出后仍持有 {retained / 1e6:7.1f} MB")
+                service.index_manager = type(service.index_manager)()  # 清空缓存，下一组从冷状态开始
+        finally:
+            shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""日志中间件开销基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_log_middleware.py [请求速率] [持续秒数]
+
+直接通过ASGI接口驱动一个最小应用，对比不带中间件、原BaseHTTPMiddleware实现
+和当前纯ASGI实现：
+1. 以固定速率（默认5000 req/s）测量单请求耗时
+2. 并发64个请求循环发送，测量最大吞吐量
+3. 流式响应的首个分块到达时间（BaseHTTPMiddleware会经过额外的任务和内存流转发）
+日志写入到临时目录，结束后输出写入线程的统计信息。
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# 日志服务默认目录是固定路径，切换到临时目录避免在仓库中创建文件
+WORK_DIR = tempfile.mkdtemp(prefix="xt_log_bench_")
+os.chdir(WORK_DIR)
+
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from middleware.logging_middleware import LoggingMiddleware
+from services.log_service import OptimizedLogService
+
+
+class BaseHTTPLoggingMiddleware(BaseHTTPMiddleware):
+    """原实现：BaseHTTPMiddleware + 预先读取请求体（仅用于对比）"""
+
+    def __init__(self, app, helper: LoggingMiddleware):
+        super().__init__(app)
+        self.helper = helper
+
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        request_data = {
+            "timestamp": datetime.now().isoformat(),
+            "client_ip": request.client.host,
+            "path": request.url.path,
+            "method": request.method,
+            "headers": self.helper._request_headers(request.headers),
+            "query_params": dict(request.query_params)
+        }
+        if request.method in ["POST", "PUT", "PATCH"]:
+            body = await request.body()
+            request_data["body"] = body.decode() if body else ""
+        response = await call_next(request)
+        log_entry = {
+            **request_data,
+            "status_code": response.status_code,
+            "processing_time_ms": round((time.time() - start_time) * 1000, 2),
+            "level": "info"
+        }
+        self.helper._store(log_entry)
+        return response
+
+
+async def check_session_expiry(request):
+    await request.body()
+    return JSONResponse({"valid": True, "remaining_seconds": 1200})
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(20):
+            yield f"data: {i}\n\n"
+            await asyncio.sleep(0.001)
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def build_app():
+    return Starlette(routes=[
+        Route("/auth/check_session_expiry", check_session_expiry, methods=["POST"]),
+        Route("/chat", stream, methods=["POST"])
+    ])
+
+
+def make_scope(path="/auth/check_session_expiry"):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost:8000"),
+            (b"content-type", b"application/json"),
+            (b"content-length", b"52"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+BODY = b'{"session_id":"f0389ba0-49ff-462d-ac78-8bc30d96c0f7"}'
+
+
+async def call(app, path="/auth/check_session_expiry", on_send=None):
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": BODY, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if on_send is not None:
+            on_send(message)
+
+    await app(make_scope(path), receive, send)
+
+
+async def run(label, app, rate, duration):
+    total = int(rate * duration)
+    interval = 1.0 / rate
+    latencies = []
+    start = time.perf_counter()
+    for i in range(total):
+        # 按固定速率发起请求，落后时不再等待
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        t0 = time.perf_counter()
+        await call(app)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{label:<16} 实际速率 {total / elapsed:8.0f} req/s  "
+          f"p50 {p50 * 1e6:7.1f} us  p99 {p99 * 1e6:8.1f} us  max {latencies[-1] * 1000:6.2f} ms")
+    return p50, p99
+
+
+async def throughput(label, app, total, concurrency=64):
+    """并发循环发送请求，返回每秒完成的请求数"""
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            await call(app)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    rate = total / (time.perf_counter() - start)
+    print(f"{label:<20} 吞吐量 {rate:8.0f} req/s")
+    return rate
+
+
+async def first_chunk(label, app, rounds=50):
+    """流式响应首个分块的到达时间"""
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        arrived = []
+
+        def on_send(message):
+            if message["type"] == "http.response.body" and not arrived:
+                arrived.append(time.perf_counter() - t0)
+
+        await call(app, "/chat", on_send)
+        samples.append(arrived[0])
+    samples.sort()
+    print(f"{label:<20} 流式首块 p50 {samples[len(samples) // 2] * 1e6:7.1f} us")
+
+
+async def main():
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    log_service = OptimizedLogService(log_dir=os.path.join(WORK_DIR, "logs"))
+    bare = build_app()
+    logged = LoggingMiddleware(build_app())
+    logged.log_service = log_service
+    legacy = BaseHTTPLoggingMiddleware(build_app(), logged)
+    apps = [("无中间件", bare), ("BaseHTTPMiddleware", legacy), ("纯ASGI中间件", logged)]
+
+    await run("预热", logged, rate, 0.5)
+    await run("预热", legacy, rate, 0.5)
+    results = {}
+    for label, app in apps:
+        results[label] = await run(label, app, rate, duration)
+    base_p50, base_p99 = results["无中间件"]
+    for label, _ in apps[1:]:
+        p50, p99 = results[label]
+        print(f"{label}开销: p50 {(p50 - base_p50) * 1e6:.1f} us, p99 {(p99 - base_p99) * 1e6:.1f} us")
+
+    print()
+    total = int(rate * duration)
+    rates = {label: await throughput(label, app, total) for label, app in apps}
+    print(f"吞吐量提升: {rates['纯ASGI中间件'] / rates['BaseHTTPMiddleware']:.2f}x")
+
+    print()
+    for label, app in apps:
+        await first_chunk(label, app)
+
+    log_service.shutdown()
+    print("写入线程统计:", log_service.writer.get_stats())
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.INFO)
+    asyncio.run(main())
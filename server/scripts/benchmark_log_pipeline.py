@@ -0,0 +1,81 @@
+"""请求日志管道回放
+
+用法（在server目录下运行）:
+    python scripts/benchmark_log_pipeline.py [--log-dir logs]
+
+把 logs/app_logs_*.jsonl 中的请求日志按原始时间顺序回放到按config.py配置的
+LogPipeline中，统计写入字节数的变化，并确认5xx日志全部保留、被合并的请求
+都计入了汇总日志的 repeat_count。
+
+旧日志中的 headers 字段实际是响应头（请求头被覆盖），回放时按响应头白名单处理。
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.log_pipeline import create_log_pipeline
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+
+
+def load_logs(log_dir: str):
+    logs = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "app_logs_*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    logs.append((len(line.encode("utf-8")), json.loads(line)))
+                except json.JSONDecodeError:
+                    continue
+    logs.sort(key=lambda item: item[1].get("timestamp", ""))
+    return logs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求日志管道回放")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    args = parser.parse_args()
+
+    pipeline = create_log_pipeline()
+
+    logs = load_logs(args.log_dir)
+    if not logs:
+        print("没有可回放的日志")
+        return
+
+    bytes_before = bytes_after = 0
+    errors_before = errors_after = 0
+    output = []
+    for size, log in logs:
+        bytes_before += size
+        if (log.get("status_code") or 0) >= 500:
+            errors_before += 1
+        entry = dict(log)
+        response_headers = pipeline.select_headers(entry.pop("headers", {}) or {}, pipeline.response_header_allowlist)
+        if response_headers:
+            entry["response_headers"] = response_headers
+        now = datetime.fromisoformat(log["timestamp"]).timestamp()
+        output.extend(pipeline.process(entry, now=now))
+    output.extend(pipeline.flush())
+
+    represented = 0
+    for entry in output:
+        bytes_after += len(json.dumps(entry, ensure_ascii=False).encode("utf-8")) + 1
+        # 汇总日志的首条请求已单独写入，汇总只代表窗口内的重复次数
+        represented += entry.get("repeat_count", 1)
+        if (entry.get("status_code") or 0) >= 500 and "repeat_count" not in entry:
+            errors_after += 1
+
+    print(f"回放 {len(logs)} 条请求日志 -> 写入 {len(output)} 条（代表 {represented} 次请求，其余被采样丢弃）")
+    print(f"日志字节 {bytes_before} -> {bytes_after}，减少 {1 - bytes_after / bytes_before:.1%}")
+    print(f"5xx日志 {errors_before} -> {errors_after}")
+    print(f"管道统计: {pipeline.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""日志查询结果缓存基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_log_query_cache.py [--logs 40000] [--refreshes 20]
+
+在临时目录中写入当天的日志，模拟仪表盘每次刷新：先保存一条 /api/logs 请求本身的
+访问日志（INFO，与查询不匹配）并等写入线程写入文件，再发出相同的 ERROR 查询。检查：
+- 不匹配的新日志不会使缓存结果失效（除第一次外每次刷新都命中）
+- 保存一条匹配的 ERROR 日志后结果立即失效，新日志出现在结果中
+输出未命中和命中时每次查询的耗时。
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_service import OptimizedLogService
+
+
+def make_entry(i: int, level: str = "INFO", path: str = "/api/items") -> dict:
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "level": level,
+        "category": "API",
+        "message": f"GET {path} 请求完成 {i}",
+        "path": path,
+        "method": "GET",
+        "status_code": 500 if level == "ERROR" else 200
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志查询结果缓存基准测试")
+    parser.add_argument("--logs", type=int, default=40000)
+    parser.add_argument("--refreshes", type=int, default=20)
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="xt_log_query_cache_")
+    try:
+        service = OptimizedLogService(log_dir=log_dir, autostart=False)
+        service.writer.max_queue_size = args.logs + 1
+        for i in range(args.logs):
+            service.save_log(make_entry(i, "ERROR" if i % 50 == 0 else "INFO"))
+        service.writer.flush()
+
+        query = dict(level="ERROR", start_time=datetime.utcnow().strftime("%Y-%m-%d"), limit=50)
+        timings = []
+        for i in range(args.refreshes):
+            # 仪表盘请求本身的访问日志，写入线程随后写入本进程的段
+            service.save_log(make_entry(args.logs + i, path="/api/logs"))
+            service.writer.flush()
+            started = time.perf_counter()
+            result = service.get_logs(**query)
+            timings.append(time.perf_counter() - started)
+        stats = service.query_cache.get_stats()
+        hits_ok = stats["hits"] == args.refreshes - 1
+        print(f"{args.logs} 条日志, 刷新 {args.refreshes} 次（每次之前保存一条不匹配的日志）: "
+              f"命中 {stats['hits']}, 未命中 {stats['misses']}")
+        print(f"  未命中 {timings[0] * 1000:.2f}ms, 命中平均 {sum(timings[1:]) / len(timings[1:]) * 1000:.3f}ms")
+
+        service.save_log(make_entry(args.logs + args.refreshes, "ERROR"))
+        fresh = service.get_logs(**query)
+        invalidated = fresh["total"] == result["total"] + 1 and service.query_cache.get_stats()["misses"] == 2
+        print(f"保存一条匹配的日志后: total {result['total']} -> {fresh['total']}, 结果已失效 {invalidated}")
+
+        ok = hits_ok and invalidated
+        print("通过" if ok else "失败")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
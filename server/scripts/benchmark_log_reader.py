@@ -0,0 +1,147 @@
+"""日志段字节级扫描基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_log_reader.py [--days 30] [--per-day 20000] [--gzip-days 3]
+
+在临时目录中生成一个月的合成JSONL日志（另将其中几天压缩为 .jsonl.gz），分别用
+逐行 json.loads 后过滤（原有读取方式）和 SegmentScanner（mmap + 字节级预过滤，
+gzip流式解压）执行几类典型查询，输出扫描速率（GB/s，按原始JSONL字节计）和
+实际解码的行数，并确认两种方式的结果相同。文件先完整读取一遍，测量的是页缓存命中时的速率。
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_reader import SegmentScanner, record_matches
+
+
+def generate(log_dir: str, days: int, per_day: int, gzip_days: int):
+    rng = random.Random(1)
+    first_day = datetime(2024, 1, 1)
+    step = 86400 / per_day
+    files = []
+    for day in range(days):
+        start = first_day + timedelta(days=day)
+        path = os.path.join(log_dir, f"app_logs_{start:%Y%m%d}_w1.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(per_day):
+                status_code = rng.choice((200, 200, 200, 200, 201, 304, 404)) if rng.random() > 0.01 else 500
+                f.write(json.dumps({
+                    "timestamp": (start + timedelta(seconds=i * step)).isoformat(),
+                    "level": "ERROR" if status_code == 500 else rng.choice(("INFO", "INFO", "INFO", "WARNING")),
+                    "category": "API",
+                    "message": f"{rng.choice(('GET', 'POST'))} /api/items/{rng.randint(1, 500)} 请求完成",
+                    "path": "/api/admin/audit" if rng.random() < 0.005 else
+                    rng.choice(("/api/items", "/api/chat", "/api/logs", "/api/session")),
+                    "method": rng.choice(("GET", "POST")),
+                    "status_code": status_code,
+                    "client_ip": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+                    "processing_time_ms": round(rng.random() * 200, 2),
+                    "seq": i + 1
+                }, ensure_ascii=False) + "\n")
+        if day >= days - gzip_days:
+            with open(path, "rb") as f_in, gzip.open(path + ".gz", "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(path)
+            path += ".gz"
+        files.append(path)
+    return files, first_day
+
+
+def raw_size(path: str) -> int:
+    if not path.endswith(".gz"):
+        return os.path.getsize(path)
+    size = 0
+    with gzip.open(path, "rb") as f:
+        while True:
+            chunk = f.read(1 << 22)
+            if not chunk:
+                return size
+            size += len(chunk)
+
+
+def line_by_line(files, filters):
+    """原有方式：逐行 strip + json.loads，再过滤"""
+    matched, decoded = [], 0
+    for path in files:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                decoded += 1
+                if record_matches(record, **filters):
+                    matched.append(record)
+    return matched, decoded
+
+
+def scanner(files, filters):
+    matched, decoded = [], 0
+    for path in files:
+        scan = SegmentScanner(**filters)
+        matched.extend(scan.scan_file(path))
+        decoded += scan.stats['candidates']
+    return matched, decoded
+
+
+def measure(label, files, filters, total_bytes):
+    results = []
+    for name, func in (("逐行解析", line_by_line), ("字节扫描", scanner)):
+        started = time.perf_counter()
+        matched, decoded = func(files, filters)
+        elapsed = time.perf_counter() - started
+        results.append(matched)
+        print(f"  {label:<22} {name}  {elapsed:7.2f}s  {total_bytes / elapsed / 1e9:6.3f} GB/s  "
+              f"解码 {decoded:>9} 行  命中 {len(matched):>8}")
+    print(f"  {'':<22} 结果一致 {results[0] == results[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志段字节级扫描基准测试")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--per-day", type=int, default=20000)
+    parser.add_argument("--gzip-days", type=int, default=3)
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="xt_log_reader_")
+    try:
+        files, first_day = generate(log_dir, args.days, args.per_day, args.gzip_days)
+        plain = [path for path in files if not path.endswith(".gz")]
+        archives = [path for path in files if path.endswith(".gz")]
+        plain_bytes = sum(raw_size(path) for path in plain)
+        archive_bytes = sum(raw_size(path) for path in archives)
+        print(f"{args.days} 天 x {args.per_day} 条日志, JSONL {plain_bytes / 1e6:.1f} MB, "
+              f"gzip {len(archives)} 个（解压后 {archive_bytes / 1e6:.1f} MB）")
+
+        day = first_day + timedelta(days=args.days // 2)
+        queries = [
+            ("全部记录", {}),
+            ("状态码500 + ERROR", {"status_code": 500, "level": "ERROR"}),
+            ("路径 /api/admin", {"path": "/api/admin"}),
+            ("单日时间范围", {"start_time": day.isoformat(), "end_time": (day + timedelta(days=1)).isoformat()}),
+        ]
+        print("JSONL段 (mmap):")
+        for label, filters in queries:
+            measure(label, plain, filters, plain_bytes)
+        if archives:
+            print("gzip归档 (流式解压):")
+            for label, filters in queries[:2]:
+                measure(label, archives, filters, archive_bytes)
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
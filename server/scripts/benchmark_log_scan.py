@@ -0,0 +1,91 @@
+"""多日日志并行扫描基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_log_scan.py [--days 8] [--per-day 50000] [--workers 0 1 2 4]
+
+在临时目录中生成若干天的JSONL日志（不带旁路索引，模拟冷查询），分别用不同的
+扫描进程数执行同一个跨多天的查询，对比冷查询（需要建索引、解析记录）和
+热查询（工作进程已缓存索引）的耗时，并确认各配置的结果完全相同。
+进程数超过CPU核数时按核数计。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_service import OptimizedLogService
+from services.log_scan import LogScanPool
+
+
+def generate(log_dir: str, days: int, per_day: int) -> str:
+    rng = random.Random(1)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    first_day = today - timedelta(days=days)
+    step = 86400 / per_day
+    for day in range(days):
+        start = first_day + timedelta(days=day)
+        path = os.path.join(log_dir, f"app_logs_{start:%Y%m%d}_w1.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(per_day):
+                f.write(json.dumps({
+                    "timestamp": (start + timedelta(seconds=i * step)).isoformat(),
+                    "level": rng.choice(("INFO", "INFO", "INFO", "WARNING", "ERROR")),
+                    "category": "API",
+                    "message": f"GET /api/items/{rng.randint(1, 500)}",
+                    "path": rng.choice(("/api/items", "/api/chat", "/api/logs", "/api/session")),
+                    "status_code": rng.choice((200, 200, 200, 404, 500)),
+                    "processing_time_ms": round(rng.random() * 200, 2),
+                    "seq": i + 1
+                }, ensure_ascii=False) + "\n")
+    return first_day.isoformat()
+
+
+def run(log_dir: str, workers: int, start_time: str):
+    service = OptimizedLogService(log_dir=log_dir, autostart=False)
+    service.query_cache.enabled = False
+    service.scan_pool = LogScanPool(workers=workers, min_days=2)
+    query = dict(start_time=start_time, status_code=500, level="ERROR", limit=50)
+    if workers:
+        # 预先启动工作进程，不把进程启动时间计入查询耗时
+        service.scan_pool.submit([], {}).result()
+    timings = []
+    for _ in range(2):
+        started = time.perf_counter()
+        result = service.get_logs(**query)
+        timings.append(time.perf_counter() - started)
+    service.scan_pool.shutdown()
+    return timings, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多日日志并行扫描基准测试")
+    parser.add_argument("--days", type=int, default=8)
+    parser.add_argument("--per-day", type=int, default=50000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="xt_log_scan_")
+    try:
+        start_time = generate(log_dir, args.days, args.per_day)
+        print(f"{args.days} 天 x {args.per_day} 条日志, CPU核数 {os.cpu_count()}")
+        baseline = None
+        for workers in args.workers:
+            (cold, warm), result = run(log_dir, workers, start_time)
+            label = "主进程顺序扫描" if workers == 0 else f"进程池 {min(workers, os.cpu_count() or 1)} 进程"
+            same = baseline is None or result == baseline
+            baseline = baseline or result
+            print(f"{label:<16} 冷查询 {cold * 1000:8.1f}ms  热查询 {warm * 1000:8.1f}ms  "
+                  f"命中 {result['total']} 条  结果一致 {same}")
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""会话查找基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_session_lookup.py [--sessions 100000] [--per-user 1] [--lookups 2000]
+
+在临时目录中创建会话服务，直接装入指定数量的会话（每个用户 --per-user 个），
+分别用原有的遍历全部用户查找和会话ID索引执行 validate_session、get_session、
+get_session_device_type、update_session_activity，输出每次调用的平均耗时，
+并确认两种方式的返回结果一致。最后测量创建、结束会话时维护索引的开销。
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.session_service import OptimizedSessionService
+
+
+class BenchmarkSessionService(OptimizedSessionService):
+    """不启动定期清理、不落盘的会话服务"""
+
+    def _start_cleanup_timer(self):
+        pass
+
+    def _mark_dirty(self):
+        self._dirty = True
+
+
+class LinearScanSessionService(BenchmarkSessionService):
+    """原有实现：遍历所有用户查找会话ID"""
+
+    def _find_session(self, session_id):
+        for username, user_data in self.active_sessions.items():
+            if 'sessions' in user_data and session_id in user_data['sessions']:
+                return username, user_data['sessions'][session_id]
+        return None
+
+
+def populate(service: OptimizedSessionService, sessions: int, per_user: int):
+    now = datetime.utcnow()
+    ids = []
+    for i in range(sessions):
+        username = f"user{i // per_user}"
+        session_id = str(uuid.UUID(int=random.getrandbits(128)))
+        user_sessions = service.active_sessions.setdefault(username, {'sessions': {}})['sessions']
+        user_sessions[session_id] = {
+            "expire_time": now + timedelta(minutes=30),
+            "created_at": now,
+            "last_activity": now,
+            "device_type": "desktop",
+            "ip": f"10.0.{i % 256}.{i // 256 % 256}"
+        }
+        ids.append(session_id)
+    service._rebuild_session_index()
+    return ids
+
+
+def measure(service, name: str, session_ids):
+    method = getattr(service, name)
+    started = time.perf_counter()
+    results = [method(session_id) for session_id in session_ids]
+    return (time.perf_counter() - started) / len(session_ids), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话查找基准测试")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--per-user", type=int, default=1)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="xt_session_")
+    try:
+        random.seed(1)
+        indexed = BenchmarkSessionService(os.path.join(work_dir, "indexed.json"), 30)
+        random.seed(1)
+        linear = LinearScanSessionService(os.path.join(work_dir, "linear.json"), 30)
+        random.seed(2)
+        session_ids = populate(indexed, args.sessions, args.per_user)
+        random.seed(2)
+        populate(linear, args.sessions, args.per_user)
+
+        rng = random.Random(3)
+        # 随机挑选已有的会话，另混入少量不存在的会话ID（最坏情况：遍历全部用户）
+        lookups = [rng.choice(session_ids) for _ in range(args.lookups)]
+        lookups += [str(uuid.uuid4()) for _ in range(max(1, args.lookups // 100))]
+        print(f"{args.sessions} 个会话, {len(indexed.active_sessions)} 个用户, 每项 {len(lookups)} 次调用")
+
+        for name in ("get_session", "get_session_device_type", "update_session_activity", "validate_session"):
+            linear_time, linear_results = measure(linear, name, lookups)
+            indexed_time, indexed_results = measure(indexed, name, lookups)
+            if name == "validate_session":
+                # 有效期按调用时间延长，只比较有效性和用户名
+                same = [(r["valid"], r.get("username")) for r in linear_results] == \
+                       [(r["valid"], r.get("username")) for r in indexed_results]
+            elif name == "get_session":
+                same = [r and r["username"] for r in linear_results] == [r and r["username"] for r in indexed_results]
+            else:
+                same = linear_results == indexed_results
+            print(f"  {name:<26} 遍历 {linear_time * 1e6:10.1f} us/次   索引 {indexed_time * 1e6:6.2f} us/次   "
+                  f"加速 {linear_time / indexed_time:8.0f}x   结果一致 {same}")
+
+        started = time.perf_counter()
+        created = [indexed.create_session(f"bench{i}") for i in range(1000)]
+        create_time = (time.perf_counter() - started) / len(created)
+        started = time.perf_counter()
+        for session_id in created:
+            indexed.end_session(session_id)
+        end_time = (time.perf_counter() - started) / len(created)
+        print(f"  创建会话 {create_time * 1e6:.1f} us/次, 结束会话 {end_time * 1e6:.1f} us/次, "
+              f"索引项数与会话数一致 {len(indexed._session_owners) == indexed._get_total_session_count()}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
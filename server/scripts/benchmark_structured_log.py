@@ -0,0 +1,134 @@
+"""结构化日志调用开销微基准测试
+
+用法（在server目录下运行）:
+    python scripts/benchmark_structured_log.py [--calls 100000]
+
+对比原有实现（@dataclass + asdict + 过滤空字段、每条 json.dumps）与当前实现
+（__slots__ 的 LogEntry 直接转换为字典、写入线程复用同一个编码器）：
+- 每次调用的耗时（微秒）
+- 每次调用的临时内存分配（tracemalloc统计的峰值增量，字节）
+- 单个条目对象占用的内存
+最后测量 save_structured_log 整个调用（不含写入线程的文件I/O）的耗时。
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_service import (
+    LogCategory, LogEntry, LogLevel, OptimizedLogService, _encode_log_line
+)
+
+
+@dataclass
+class DataclassLogEntry:
+    """原有实现"""
+    timestamp: str
+    level: str
+    category: str
+    message: str
+    path: Optional[str] = None
+    method: Optional[str] = None
+    status_code: Optional[int] = None
+    response_time: Optional[float] = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    error_code: Optional[str] = None
+    stack_trace: Optional[str] = None
+    extra_data: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+FIELDS = dict(path="/api/chat", method="POST", status_code=200, response_time=0.15,
+              user_id="12345", session_id="session_abc", ip_address="10.0.0.8",
+              extra_data={"model": "default", "tokens": 512})
+TIMESTAMP = datetime(2024, 1, 1).isoformat()
+
+
+def old_build():
+    return DataclassLogEntry(TIMESTAMP, "INFO", "API", "请求完成", **FIELDS).to_dict()
+
+
+def new_build():
+    return LogEntry(TIMESTAMP, "INFO", "API", "请求完成", **FIELDS).to_dict()
+
+
+def measure(label: str, func, calls: int):
+    func()
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    elapsed = time.perf_counter() - started
+
+    samples = min(calls, 2000)
+    tracemalloc.start()
+    total = 0
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    print(f"  {label:<34} {elapsed / calls * 1e6:7.2f} us/次  临时分配 {total / samples:8.0f} 字节/次")
+
+
+def object_size(factory) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory() for _ in range(1000)]
+    size = (tracemalloc.get_traced_memory()[0] - before) / len(objects)
+    tracemalloc.stop()
+    return round(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结构化日志调用开销微基准测试")
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+
+    print("构造条目并转换为字典:")
+    measure("@dataclass + asdict", old_build, args.calls)
+    measure("__slots__ LogEntry.to_dict", new_build, args.calls)
+
+    entry = new_build()
+    print("序列化一条日志:")
+    measure("json.dumps(ensure_ascii=False)", lambda: json.dumps(entry, ensure_ascii=False), args.calls)
+    measure("复用编码器", lambda: _encode_log_line(entry), args.calls)
+    assert json.dumps(entry, ensure_ascii=False) == _encode_log_line(entry)
+
+    print("单个条目对象（不含字段值）:")
+    print(f"  @dataclass   {object_size(lambda: DataclassLogEntry(TIMESTAMP, 'INFO', 'API', '请求完成', **FIELDS))} 字节")
+    print(f"  __slots__    {object_size(lambda: LogEntry(TIMESTAMP, 'INFO', 'API', '请求完成', **FIELDS))} 字节")
+
+    log_dir = tempfile.mkdtemp(prefix="xt_structured_log_")
+    try:
+        service = OptimizedLogService(log_dir=log_dir, autostart=False)
+        service.writer.max_queue_size = args.calls + 1
+        calls = min(args.calls, 20000)
+        started = time.perf_counter()
+        for _ in range(calls):
+            service.save_structured_log(LogLevel.INFO, LogCategory.API, "请求完成", **FIELDS)
+        elapsed = time.perf_counter() - started
+        print(f"save_structured_log 整个调用: {elapsed / calls * 1e6:.2f} us/次（{calls} 次，写入线程未启动）")
+        started = time.perf_counter()
+        service.writer.flush()
+        print(f"写入线程序列化并写入 {calls} 条: {(time.perf_counter() - started) * 1000:.1f}ms")
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""多进程日志写入压力测试
+
+用法（在server目录下运行）:
+    python scripts/stress_log_writers.py [每个进程的日志条数] [--writers 4] [--shared]
+
+启动多个写入进程（模拟多个uvicorn worker），每个进程用自己的日志服务实例
+向同一个临时日志目录写日志，请求体长度随机（最大约64KB，超过管道缓冲区大小），
+结束后检查：
+- 所有段文件的每一行都是完整的JSON（没有交错或截断的行）
+- 每个进程写入的日志一条不少、一条不重
+- 新的日志服务实例通过get_logs / iter_logs看到全部进程的日志，且按时间倒序
+- 不带时间范围的get_logs（/api/logs、/api/logs/recent的默认查询）正常返回，且按时间倒序
+
+--shared 模拟旧的写法：所有进程用缓冲的open(..., "a")追加同一个文件，作为对照
+（Linux本地文件系统上单次write()的追加是原子的，交错行主要出现在Windows和网络文件系统上）。
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_service import OptimizedLogService, log_sort_key
+
+
+def make_entry(writer_id: int, i: int, rng: random.Random) -> dict:
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "level": "INFO",
+        "category": "API",
+        "message": f"writer {writer_id} entry {i}",
+        "path": f"/api/stress/{writer_id}",
+        "writer": writer_id,
+        "n": i,
+        "body": "x" * rng.choice((10, 200, 4000, 65000))
+    }
+
+
+def run_writer(log_dir: str, writer_id: int, count: int, start_event):
+    rng = random.Random(writer_id)
+    service = OptimizedLogService(log_dir=log_dir, autostart=False)
+    service.writer.start()
+    start_event.wait()
+    for i in range(count):
+        service.save_log(make_entry(writer_id, i, rng))
+    service.writer.stop()
+
+
+def run_shared_writer(log_dir: str, writer_id: int, count: int, start_event):
+    """旧写法：缓冲写入同一个文件，每批多行"""
+    rng = random.Random(writer_id)
+    log_file = os.path.join(log_dir, f"app_logs_{datetime.utcnow():%Y%m%d}.jsonl")
+    start_event.wait()
+    batch = []
+    for i in range(count):
+        batch.append(make_entry(writer_id, i, rng))
+        if len(batch) == 50 or i == count - 1:
+            with open(log_file, "a", encoding="utf-8") as f:
+                for entry in batch:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            batch = []
+
+
+def check_lines(log_dir: str, writers: int, count: int) -> bool:
+    seen = {writer_id: set() for writer_id in range(writers)}
+    lines = broken = duplicates = 0
+    for path in sorted(glob.glob(os.path.join(log_dir, "app_logs_*.jsonl"))):
+        with open(path, "rb") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    broken += 1
+                    continue
+                key = entry["n"]
+                if key in seen[entry["writer"]]:
+                    duplicates += 1
+                seen[entry["writer"]].add(key)
+    missing = sum(count - len(keys) for keys in seen.values())
+    files = len(glob.glob(os.path.join(log_dir, "app_logs_*.jsonl")))
+    print(f"段文件 {files} 个, 行数 {lines}, 损坏行 {broken}, 重复 {duplicates}, 缺失 {missing}")
+    return broken == 0 and duplicates == 0 and missing == 0
+
+
+def check_unified_view(log_dir: str, writers: int, count: int) -> bool:
+    service = OptimizedLogService(log_dir=log_dir, autostart=False)
+    page = service.get_logs(start_time="2000-01-01T00:00:00", limit=20)
+    logs = list(service.iter_logs(start_time="2000-01-01T00:00:00"))
+    ordered = all(log_sort_key(a) >= log_sort_key(b) for a, b in zip(logs, logs[1:]))
+    per_writer = {writer_id: 0 for writer_id in range(writers)}
+    for log in logs:
+        per_writer[log["writer"]] += 1
+    print(f"get_logs total {page['total']}, iter_logs {len(logs)} 条, 倒序 {ordered}, 各进程 {per_writer}")
+    recent = service.get_logs(limit=20)["logs"]
+    recent_ordered = all(log_sort_key(a) >= log_sort_key(b) for a, b in zip(recent, recent[1:]))
+    print(f"不带时间范围的get_logs {len(recent)} 条, 倒序 {recent_ordered}")
+    return page["total"] == writers * count and len(logs) == writers * count and ordered and recent_ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程日志写入压力测试")
+    parser.add_argument("count", nargs="?", type=int, default=5000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--shared", action="store_true", help="对照：所有进程缓冲写入同一个文件")
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="xt_log_stress_")
+    ctx = multiprocessing.get_context("spawn")
+    start_event = ctx.Event()
+    target = run_shared_writer if args.shared else run_writer
+    processes = [
+        ctx.Process(target=target, args=(log_dir, writer_id, args.count, start_event))
+        for writer_id in range(args.writers)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        time.sleep(1)  # 等所有进程完成初始化后同时开始写入
+        started = time.perf_counter()
+        start_event.set()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        total = args.writers * args.count
+        print(f"{args.writers} 个进程写入 {total} 条日志, 耗时 {elapsed:.2f}s ({total / elapsed:.0f} 条/秒)")
+
+        ok = check_lines(log_dir, args.writers, args.count)
+        if not args.shared:
+            ok = check_unified_view(log_dir, args.writers, args.count) and ok
+        print("通过" if ok else "失败")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""内存缓存的淘汰/准入策略
+
+SyncMemoryCache只负责存储键值和过期时间，键的排列顺序和淘汰对象由策略决定：
+- LRUPolicy: 最近最少使用淘汰（默认，与之前行为一致）
+- TinyLFUPolicy: W-TinyLFU，基于Count-Min Sketch的频率准入，
+  避免一次性访问的键（健康检查、带密码片段的认证键等）冲掉热点数据
+
+策略对象不加锁，由调用方（SyncMemoryCache）在持有锁时调用。
+"""
+from collections import OrderedDict
+from typing import List, Optional
+
+
+class LRUPolicy:
+    """最近最少使用淘汰策略"""
+
+    name = "lru"
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+
+    def on_access(self, key: str, hit: bool):
+        """记录一次访问（命中或未命中）"""
+        if hit:
+            self._order.move_to_end(key)
+
+    def on_insert(self, key: str) -> List[str]:
+        """记录新键插入，返回需要淘汰的键"""
+        self._order[key] = None
+        victims = []
+        while len(self._order) > self.capacity:
+            victim, _ = self._order.popitem(last=False)
+            victims.append(victim)
+        return victims
+
+    def on_remove(self, key: str):
+        """记录键被删除或过期"""
+        self._order.pop(key, None)
+
+    def evict_one(self) -> Optional[str]:
+        """选出一个淘汰对象（用于内存预算淘汰）"""
+        if not self._order:
+            return None
+        victim, _ = self._order.popitem(last=False)
+        return victim
+
+    def clear(self):
+        self._order.clear()
+
+
+class CountMinSketch:
+    """4位风格的Count-Min Sketch，用于估算键的访问频率
+
+    计数达到上限后不再增长；累计采样数达到阈值时所有计数减半，
+    使频率估算随时间衰减，适应访问模式的变化。
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+    # 每行使用不同的奇数乘子扰动哈希
+    _SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5)
+
+    def __init__(self, capacity: int):
+        width = 1
+        while width < max(16, capacity * 4):
+            width <<= 1
+        self._mask = width - 1
+        self._table = [[0] * width for _ in range(self.DEPTH)]
+        self._sample_size = max(10, capacity * 10)
+        self._additions = 0
+
+    def _indexes(self, key: str):
+        h = hash(key)
+        for seed in self._SEEDS:
+            yield ((h * seed) >> 17) & self._mask
+
+    def increment(self, key: str):
+        added = False
+        for row, index in zip(self._table, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+                added = True
+        if added:
+            self._additions += 1
+            if self._additions >= self._sample_size:
+                self._reset()
+
+    def frequency(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._table, self._indexes(key)))
+
+    def _reset(self):
+        """计数整体减半（老化）"""
+        for row in self._table:
+            for i, value in enumerate(row):
+                if value:
+                    row[i] = value >> 1
+        self._additions //= 2
+
+
+class TinyLFUPolicy:
+    """W-TinyLFU策略
+
+    新键先进入容量约1%的窗口LRU；被挤出窗口的候选键与主区（分段LRU：
+    试用区+保护区）中的淘汰对象比较访问频率，频率更高者留下。
+    """
+
+    name = "tinylfu"
+
+    def __init__(self, capacity: int, window_ratio: float = 0.01, protected_ratio: float = 0.8):
+        self.capacity = max(1, capacity)
+        self.window_capacity = max(1, int(self.capacity * window_ratio))
+        self.main_capacity = max(0, self.capacity - self.window_capacity)
+        self.protected_capacity = int(self.main_capacity * protected_ratio)
+        self._window: "OrderedDict[str, None]" = OrderedDict()
+        self._probation: "OrderedDict[str, None]" = OrderedDict()
+        self._protected: "OrderedDict[str, None]" = OrderedDict()
+        self._sketch = CountMinSketch(self.capacity)
+
+    def on_access(self, key: str, hit: bool):
+        """记录一次访问（命中或未命中）"""
+        self._sketch.increment(key)
+        if not hit:
+            return
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        elif key in self._probation:
+            # 试用区的键再次命中后晋升到保护区
+            del self._probation[key]
+            self._protected[key] = None
+            if len(self._protected) > self.protected_capacity:
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = None
+
+    def on_insert(self, key: str) -> List[str]:
+        """记录新键插入，返回需要淘汰的键（可能包含被拒绝的新键本身）"""
+        self._window[key] = None
+        if len(self._window) <= self.window_capacity:
+            return []
+
+        candidate, _ = self._window.popitem(last=False)
+        if len(self._probation) + len(self._protected) < self.main_capacity:
+            self._probation[candidate] = None
+            return []
+
+        victim_queue = self._probation if self._probation else self._protected
+        if not victim_queue:
+            return [candidate]
+        victim = next(iter(victim_queue))
+        if self._sketch.frequency(candidate) > self._sketch.frequency(victim):
+            del victim_queue[victim]
+            self._probation[candidate] = None
+            return [victim]
+        return [candidate]
+
+    def on_remove(self, key: str):
+        """记录键被删除或过期"""
+        for queue in (self._window, self._probation, self._protected):
+            if key in queue:
+                del queue[key]
+                return
+
+    def evict_one(self) -> Optional[str]:
+        """选出一个淘汰对象（用于内存预算淘汰）"""
+        for queue in (self._probation, self._window, self._protected):
+            if queue:
+                victim, _ = queue.popitem(last=False)
+                return victim
+        return None
+
+    def clear(self):
+        self._window.clear()
+        self._probation.clear()
+        self._protected.clear()
+
+
+EVICTION_POLICIES = {
+    LRUPolicy.name: LRUPolicy,
+    TinyLFUPolicy.name: TinyLFUPolicy,
+}
+
+
+def create_policy(name: str, capacity: int):
+    """按名称创建淘汰策略"""
+    try:
+        return EVICTION_POLICIES[name.lower()](capacity)
+    except KeyError:
+        raise ValueError(f"未知的缓存淘汰策略: {name}，可选值: {', '.join(EVICTION_POLICIES)}")
@@ -1,84 +1,335 @@
 import asyncio
 import json
 import logging
-from typing import Optional, Any, Dict, List
-from datetime import datetime, timedelta
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+import functools
+from typing import Optional, Any, Dict, List, Tuple
 import hashlib
+import heapq
 from contextlib import asynccontextmanager
+from config import (
+    DEFAULT_CACHE_TTL, MEMORY_CACHE_MAX_SIZE, MEMORY_CACHE_MAX_BYTES, MEMORY_CACHE_POLICY,
+    SHARED_MEMORY_CACHE_PATH, SHARED_MEMORY_CACHE_SLOTS, SHARED_MEMORY_CACHE_SLOT_SIZE
+)
+from services.cache_policy import create_policy
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
-class MemoryCache:
-    """内存缓存实现，用于本地缓存"""
+def cache_namespace(key: str) -> str:
+    """从缓存键中提取命名空间（generate_cache_key生成的前缀）"""
+    return key.split(":", 1)[0]
+
+class CacheMetrics:
+    """缓存指标收集器
+
+    计数器按线程分片存储：每个线程只写自己的分片，热路径上不加锁，
+    读取统计时再汇总所有分片。
+    """
+
+    # 延迟直方图桶上限（秒），与Prometheus的le标签对应
+    LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+    EVICTION_CAUSES = ('lru', 'ttl', 'size', 'rejected')
+    # 命名空间数量上限，防止任意键导致标签基数爆炸
+    MAX_NAMESPACES = 100
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[str, Any]] = []
+        self._registry_lock = threading.Lock()  # 仅在线程首次记录时使用
+        self._namespaces = set()
+        self._started_at = time.time()
+
+    def _shard(self) -> Dict[str, Any]:
+        """获取当前线程的计数分片"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {'counters': defaultdict(int), 'latency': {}}
+            with self._registry_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _namespace(self, key: str) -> str:
+        namespace = cache_namespace(key)
+        if namespace in self._namespaces:
+            return namespace
+        if len(self._namespaces) >= self.MAX_NAMESPACES:
+            return 'other'
+        self._namespaces.add(namespace)
+        return namespace
+
+    def incr(self, event: str, key: str = "", amount: int = 1):
+        """增加事件计数（hits/misses/sets/deletes/errors）"""
+        self._shard()['counters'][(event, self._namespace(key))] += amount
+
+    def record_eviction(self, cause: str, key: str = ""):
+        """记录淘汰事件，cause为lru/ttl/size/rejected之一（rejected：新键未被淘汰策略准入）"""
+        self._shard()['counters'][(f"evictions_{cause}", self._namespace(key))] += 1
+
+    def observe(self, operation: str, key: str, seconds: float):
+        """记录一次操作的耗时"""
+        latency = self._shard()['latency']
+        series = (self._namespace(key), operation)
+        histogram = latency.get(series)
+        if histogram is None:
+            # [各桶计数..., +Inf桶计数, 总耗时]
+            histogram = [0] * (len(self.LATENCY_BUCKETS) + 1) + [0.0]
+            latency[series] = histogram
+        histogram[bisect_left(self.LATENCY_BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+    @staticmethod
+    def _copy_items(mapping: Dict) -> List[Tuple[Any, Any]]:
+        """复制其他线程可能正在写入的字典"""
+        while True:
+            try:
+                return list(mapping.items())
+            except RuntimeError:
+                continue
+
+    def _collect(self) -> Tuple[Dict[Tuple[str, str], int], Dict[Tuple[str, str], List[float]]]:
+        """汇总所有线程分片"""
+        counters: Dict[Tuple[str, str], int] = defaultdict(int)
+        latency: Dict[Tuple[str, str], List[float]] = {}
+        with self._registry_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for series, value in self._copy_items(shard['counters']):
+                counters[series] += value
+            for series, histogram in self._copy_items(shard['latency']):
+                merged = latency.setdefault(series, [0] * (len(self.LATENCY_BUCKETS) + 1) + [0.0])
+                for i, value in enumerate(list(histogram)):
+                    merged[i] += value
+        return counters, latency
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取指标快照"""
+        counters, latency = self._collect()
+        namespaces: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0, 'errors': 0,
+            'evictions': {cause: 0 for cause in self.EVICTION_CAUSES},
+            'latency': {}
+        })
+        for (event, namespace), value in counters.items():
+            if event.startswith('evictions_'):
+                namespaces[namespace]['evictions'][event[len('evictions_'):]] += value
+            else:
+                namespaces[namespace][event] = namespaces[namespace].get(event, 0) + value
+        for (namespace, operation), histogram in latency.items():
+            count = sum(histogram[:-1])
+            namespaces[namespace]['latency'][operation] = {
+                'count': count,
+                'avg_ms': round(histogram[-1] / count * 1000, 4) if count else 0,
+                'buckets': {
+                    f"le_{bound}": sum(histogram[:i + 1])
+                    for i, bound in enumerate(self.LATENCY_BUCKETS)
+                }
+            }
+
+        totals = {'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0, 'errors': 0}
+        evictions = {cause: 0 for cause in self.EVICTION_CAUSES}
+        for data in namespaces.values():
+            for name in totals:
+                totals[name] += data[name]
+            for cause in evictions:
+                evictions[cause] += data['evictions'][cause]
+            lookups = data['hits'] + data['misses']
+            data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else 0
+
+        lookups = totals['hits'] + totals['misses']
+        return {
+            **totals,
+            'hit_ratio': round(totals['hits'] / lookups, 4) if lookups else 0,
+            'evictions': evictions,
+            'uptime_seconds': round(time.time() - self._started_at, 1),
+            'namespaces': dict(namespaces)
+        }
+
+    def render_prometheus(self, extra_gauges: Optional[Dict[str, float]] = None) -> str:
+        """以Prometheus文本格式导出指标"""
+        counters, latency = self._collect()
+        lines = []
+        families = (
+            ('hits', 'cache_hits_total', '缓存命中次数'),
+            ('misses', 'cache_misses_total', '缓存未命中次数'),
+            ('sets', 'cache_sets_total', '缓存写入次数'),
+            ('deletes', 'cache_deletes_total', '缓存删除次数'),
+            ('errors', 'cache_errors_total', '缓存操作错误次数'),
+        )
+        for event, metric, help_text in families:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for (name, namespace), value in sorted(counters.items()):
+                if name == event:
+                    lines.append(f'{metric}{{namespace="{namespace}"}} {value}')
+
+        lines.append("# HELP cache_evictions_total 缓存淘汰次数（按原因）")
+        lines.append("# TYPE cache_evictions_total counter")
+        for (name, namespace), value in sorted(counters.items()):
+            if name.startswith('evictions_'):
+                cause = name[len('evictions_'):]
+                lines.append(f'cache_evictions_total{{namespace="{namespace}",cause="{cause}"}} {value}')
+
+        lines.append("# HELP cache_operation_seconds 缓存操作耗时")
+        lines.append("# TYPE cache_operation_seconds histogram")
+        for (namespace, operation), histogram in sorted(latency.items()):
+            labels = f'namespace="{namespace}",operation="{operation}"'
+            cumulative = 0
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                cumulative += histogram[i]
+                lines.append(f'cache_operation_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += histogram[len(self.LATENCY_BUCKETS)]
+            lines.append(f'cache_operation_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'cache_operation_seconds_sum{{{labels}}} {histogram[-1]}')
+            lines.append(f'cache_operation_seconds_count{{{labels}}} {cumulative}')
+
+        for name, value in (extra_gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+def _estimate_size(value: Any) -> int:
+    """估算缓存值占用的字节数（按序列化后的长度计算）"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+class SyncMemoryCache:
+    """线程安全的同步内存缓存
+
+    供同步代码（同步FastAPI处理函数、定时器线程）直接使用，不依赖事件循环；
+    异步的MemoryCache也基于它实现，两者的键和TTL语义完全一致。
+
+    过期采用增量方式：按过期时间把键分到秒级时间桶中，每次操作顺带清理
+    少量已到期桶里的键，定期任务也只遍历到期的桶，清理开销与过期项数量
+    成正比，而不是与缓存大小成正比。
+    """
     
-    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
+    EXPIRY_BUCKET_SECONDS = 1  # 过期索引时间桶粒度
+    EXPIRE_PER_OPERATION = 4   # 每次读写顺带清理的过期项上限
+    
+    def __init__(self, max_size: int = 1000, default_ttl: int = 3600,
+                 max_memory_bytes: int = 0, metrics: Optional[CacheMetrics] = None,
+                 policy: str = "lru"):
         self.max_size = max_size
         self.default_ttl = default_ttl
+        self.max_memory_bytes = max_memory_bytes  # 0表示不限制
+        self.metrics = metrics or CacheMetrics()
+        # 键的访问顺序与淘汰对象由策略维护（lru / tinylfu）
+        self.policy = create_policy(policy, max_size)
         self._cache: Dict[str, Dict[str, Any]] = {}
-        self._access_times: Dict[str, datetime] = {}
-        self._lock = asyncio.Lock()
+        self._memory_bytes = 0  # 已缓存值的估算大小
+        # 过期索引：时间桶编号 -> 该桶内的键；堆中保存桶编号（可能含已清空的桶）
+        self._expiry_buckets: Dict[int, set] = {}
+        self._expiry_heap: List[int] = []
+        self._lock = threading.Lock()
     
-    async def get(self, key: str) -> Optional[Any]:
+    def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
-        async with self._lock:
-            if key not in self._cache:
+        now = time.time()
+        with self._lock:
+            self._expire_due(now, self.EXPIRE_PER_OPERATION)
+            cache_item = self._cache.get(key)
+            if cache_item is None:
+                self.policy.on_access(key, hit=False)
                 return None
             
-            cache_item = self._cache[key]
-            
             # 检查是否过期
-            if cache_item['expires_at'] and datetime.now() > cache_item['expires_at']:
-                await self._remove_key(key)
+            if cache_item['expires_at'] and now > cache_item['expires_at']:
+                self._remove_key(key)
+                self.metrics.record_eviction('ttl', key)
+                self.policy.on_access(key, hit=False)
                 return None
             
-            # 更新访问时间
-            self._access_times[key] = datetime.now()
+            # 更新访问顺序/频率
+            self.policy.on_access(key, hit=True)
             return cache_item['value']
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """设置缓存值"""
-        async with self._lock:
-            # 如果缓存已满，清理最久未访问的项
-            if len(self._cache) >= self.max_size and key not in self._cache:
-                await self._evict_lru()
+        size = _estimate_size(value)
+        now = time.time()
+        with self._lock:
+            self._expire_due(now, self.EXPIRE_PER_OPERATION)
+            if self.max_memory_bytes and size > self.max_memory_bytes:
+                # 单个值超过内存预算，直接拒绝
+                self._remove_key(key)
+                self.metrics.record_eviction('size', key)
+                return False
             
             expires_at = None
             if ttl is not None:
-                expires_at = datetime.now() + timedelta(seconds=ttl)
+                expires_at = now + ttl
             elif self.default_ttl > 0:
-                expires_at = datetime.now() + timedelta(seconds=self.default_ttl)
+                expires_at = now + self.default_ttl
             
+            previous = self._cache.get(key)
+            if previous is not None:
+                # 先移除旧的过期索引：新旧过期时间落在同一个桶时，后移除会删掉新索引
+                self._memory_bytes -= previous['size']
+                self._unindex_expiry(key, previous['expires_at'])
             self._cache[key] = {
                 'value': value,
                 'expires_at': expires_at,
-                'created_at': datetime.now()
+                'created_at': now,
+                'size': size
             }
-            self._access_times[key] = datetime.now()
+            self._memory_bytes += size
+            self._index_expiry(key, expires_at)
+            
+            if previous is not None:
+                # 更新已有键，保留其在策略中的位置
+                self.policy.on_access(key, hit=True)
+            else:
+                # 由策略决定容量淘汰对象（TinyLFU下可能拒绝新键本身，单独计为rejected）
+                for victim in self.policy.on_insert(key):
+                    self._drop(victim, 'rejected' if victim == key else 'lru')
+                if key not in self._cache:
+                    # 新键未被准入，写入没有生效
+                    return False
+
+            # 超出内存预算时按策略顺序淘汰
+            while self.max_memory_bytes and self._memory_bytes > self.max_memory_bytes and self._cache:
+                victim = self.policy.evict_one()
+                if victim is None:
+                    break
+                self._drop(victim, 'size')
             
             logger.debug(f"缓存设置成功: {key}")
             return True
     
-    async def delete(self, key: str) -> bool:
+    def delete(self, key: str) -> bool:
         """删除缓存项"""
-        async with self._lock:
-            return await self._remove_key(key)
+        with self._lock:
+            return self._remove_key(key)
     
-    async def clear(self) -> bool:
+    def clear(self) -> bool:
         """清空所有缓存"""
-        async with self._lock:
+        with self._lock:
             self._cache.clear()
-            self._access_times.clear()
+            self.policy.clear()
+            self._expiry_buckets.clear()
+            self._expiry_heap.clear()
+            self._memory_bytes = 0
             logger.info("内存缓存已清空")
             return True
     
-    async def exists(self, key: str) -> bool:
+    def exists(self, key: str) -> bool:
         """检查键是否存在"""
-        return await self.get(key) is not None
+        return self.get(key) is not None
     
-    async def keys(self, pattern: str = "*") -> List[str]:
+    def keys(self, pattern: str = "*") -> List[str]:
         """获取所有键（简单模式匹配）"""
-        async with self._lock:
+        with self._lock:
             if pattern == "*":
                 return list(self._cache.keys())
             
@@ -86,40 +337,76 @@ class MemoryCache:
             import fnmatch
             return [key for key in self._cache.keys() if fnmatch.fnmatch(key, pattern)]
     
-    async def _remove_key(self, key: str) -> bool:
-        """内部方法：移除键"""
-        if key in self._cache:
-            del self._cache[key]
-            if key in self._access_times:
-                del self._access_times[key]
-            return True
-        return False
+    def _remove_key(self, key: str) -> bool:
+        """内部方法：移除键（调用方需持有锁）"""
+        cache_item = self._cache.pop(key, None)
+        if cache_item is None:
+            return False
+        self._memory_bytes -= cache_item['size']
+        self._unindex_expiry(key, cache_item['expires_at'])
+        self.policy.on_remove(key)
+        return True
+    
+    def _drop(self, key: str, cause: str):
+        """移除策略已选出的淘汰对象（调用方需持有锁）"""
+        cache_item = self._cache.pop(key, None)
+        if cache_item is not None:
+            self._memory_bytes -= cache_item['size']
+            self._unindex_expiry(key, cache_item['expires_at'])
+        self.metrics.record_eviction(cause, key)
+        logger.debug(f"缓存淘汰({cause}): {key}")
     
-    async def _evict_lru(self):
-        """清理最久未访问的项"""
-        if not self._access_times:
+    def _index_expiry(self, key: str, expires_at: Optional[float]):
+        """把键加入过期索引（调用方需持有锁）"""
+        if not expires_at:
             return
-        
-        # 找到最久未访问的键
-        oldest_key = min(self._access_times.keys(), key=lambda k: self._access_times[k])
-        await self._remove_key(oldest_key)
-        logger.debug(f"LRU清理: {oldest_key}")
-    
-    async def cleanup_expired(self):
-        """清理过期的缓存项"""
-        async with self._lock:
-            now = datetime.now()
-            expired_keys = []
-            
-            for key, cache_item in self._cache.items():
-                if cache_item['expires_at'] and now > cache_item['expires_at']:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                await self._remove_key(key)
-            
-            if expired_keys:
-                logger.info(f"清理了 {len(expired_keys)} 个过期缓存项")
+        bucket_id = int(expires_at // self.EXPIRY_BUCKET_SECONDS)
+        bucket = self._expiry_buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self._expiry_buckets[bucket_id] = set()
+            heapq.heappush(self._expiry_heap, bucket_id)
+        bucket.add(key)
+    
+    def _unindex_expiry(self, key: str, expires_at: Optional[float]):
+        """把键移出过期索引（调用方需持有锁）"""
+        if not expires_at:
+            return
+        bucket_id = int(expires_at // self.EXPIRY_BUCKET_SECONDS)
+        bucket = self._expiry_buckets.get(bucket_id)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._expiry_buckets[bucket_id]
+    
+    def _expire_due(self, now: float, limit: float) -> int:
+        """清理已完全到期的时间桶中的键，最多limit个（调用方需持有锁）"""
+        current_bucket = int(now // self.EXPIRY_BUCKET_SECONDS)
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0] < current_bucket and removed < limit:
+            bucket_id = heap[0]
+            bucket = self._expiry_buckets.get(bucket_id)
+            while bucket and removed < limit:
+                key = bucket.pop()
+                self._remove_key(key)
+                self.metrics.record_eviction('ttl', key)
+                removed += 1
+            if not bucket:
+                self._expiry_buckets.pop(bucket_id, None)
+                heapq.heappop(heap)
+        return removed
+    
+    def cleanup_expired(self, limit: Optional[int] = None) -> int:
+        """清理过期的缓存项，返回清理数量
+
+        只访问已到期的时间桶；limit限制单次清理数量，便于调用方分批执行、
+        在批次之间释放锁。
+        """
+        with self._lock:
+            removed = self._expire_due(time.time(), limit if limit is not None else float('inf'))
+        if removed:
+            logger.debug(f"清理了 {removed} 个过期缓存项")
+        return removed
     
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
@@ -127,17 +414,85 @@ class MemoryCache:
             'total_items': len(self._cache),
             'max_size': self.max_size,
             'default_ttl': self.default_ttl,
-            'memory_usage_estimate': len(str(self._cache))  # 简单估算
+            'eviction_policy': self.policy.name,
+            'max_memory_bytes': self.max_memory_bytes,
+            'memory_usage_estimate': self._memory_bytes
         }
 
+class MemoryCache:
+    """内存缓存实现，用于本地缓存
+
+    异步接口，底层委托给SyncMemoryCache（或接口相同的SharedMemoryCache）。
+    临界区内没有await，因此持有锁的时间极短，不会阻塞事件循环。
+    """
+    
+    def __init__(self, max_size: int = 1000, default_ttl: int = 3600,
+                 max_memory_bytes: int = 0, metrics: Optional[CacheMetrics] = None,
+                 policy: str = "lru", store=None):
+        self.store = store or SyncMemoryCache(max_size, default_ttl, max_memory_bytes, metrics, policy)
+    
+    @property
+    def max_size(self) -> int:
+        return self.store.max_size
+    
+    @property
+    def default_ttl(self) -> int:
+        return self.store.default_ttl
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存值"""
+        return self.store.get(key)
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """设置缓存值"""
+        return self.store.set(key, value, ttl)
+    
+    async def delete(self, key: str) -> bool:
+        """删除缓存项"""
+        return self.store.delete(key)
+    
+    async def clear(self) -> bool:
+        """清空所有缓存"""
+        return self.store.clear()
+    
+    async def exists(self, key: str) -> bool:
+        """检查键是否存在"""
+        return self.store.exists(key)
+    
+    async def keys(self, pattern: str = "*") -> List[str]:
+        """获取所有键（简单模式匹配）"""
+        return self.store.keys(pattern)
+    
+    async def cleanup_expired(self, limit: Optional[int] = None) -> int:
+        """清理过期的缓存项，返回清理数量"""
+        return self.store.cleanup_expired(limit)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return self.store.get_stats()
+
 class CacheService:
     """缓存服务类，提供统一的缓存接口"""
     
-    def __init__(self, use_redis: bool = False, redis_url: str = "redis://localhost:6379"):
+    CLEANUP_INTERVAL_SECONDS = 10  # 后台过期清理间隔
+    CLEANUP_BATCH_SIZE = 256       # 后台过期清理每批数量
+    
+    def __init__(self, use_redis: bool = False, redis_url: str = "redis://localhost:6379",
+                 use_shared_memory: bool = False):
         self.use_redis = use_redis
         self.redis_url = redis_url
+        self.use_shared_memory = use_shared_memory and not use_redis
         self._redis_client = None
-        self._memory_cache = MemoryCache()
+        self.metrics = CacheMetrics()
+        self._memory_cache = MemoryCache(
+            max_size=MEMORY_CACHE_MAX_SIZE,
+            default_ttl=DEFAULT_CACHE_TTL,
+            max_memory_bytes=MEMORY_CACHE_MAX_BYTES,
+            metrics=self.metrics,
+            policy=MEMORY_CACHE_POLICY
+        )
+        # Redis模式下同步代码无法访问Redis，使用独立的进程内缓存层
+        self._local_sync_cache: Optional[SyncMemoryCache] = None
         self._cleanup_task = None
         
     async def initialize(self):
@@ -156,8 +511,25 @@ class CacheService:
                 logger.warning(f"Redis连接失败，使用内存缓存: {e}")
                 self.use_redis = False
         
+        if not self.use_redis and self.use_shared_memory:
+            try:
+                from services.shared_cache import SharedMemoryCache
+                store = SharedMemoryCache(
+                    path=SHARED_MEMORY_CACHE_PATH or None,
+                    slots=SHARED_MEMORY_CACHE_SLOTS,
+                    slot_size=SHARED_MEMORY_CACHE_SLOT_SIZE,
+                    default_ttl=DEFAULT_CACHE_TTL,
+                    metrics=self.metrics
+                )
+                self._memory_cache = MemoryCache(store=store)
+                logger.info(f"使用共享内存缓存: {store.path}")
+            except Exception as e:
+                logger.warning(f"共享内存缓存初始化失败，使用内存缓存: {e}")
+                self.use_shared_memory = False
+        
         if not self.use_redis:
-            logger.info("使用内存缓存")
+            if not self.use_shared_memory:
+                logger.info("使用内存缓存")
             # 启动清理任务
             self._cleanup_task = asyncio.create_task(self._periodic_cleanup())
     
@@ -172,53 +544,81 @@ class CacheService:
         
         if self._redis_client:
             await self._redis_client.close()
+        
+        if self.use_shared_memory:
+            self._memory_cache.store.close()
     
     async def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
+        start = time.perf_counter()
         try:
             if self.use_redis and self._redis_client:
                 value = await self._redis_client.get(key)
                 if value is not None:
-                    return json.loads(value)
-                return None
+                    value = json.loads(value)
             else:
-                return await self._memory_cache.get(key)
+                value = await self._memory_cache.get(key)
+            self.metrics.incr('hits' if value is not None else 'misses', key)
+            return value
         except Exception as e:
+            self.metrics.incr('errors', key)
             logger.error(f"缓存获取失败 {key}: {e}")
             return None
+        finally:
+            self.metrics.observe('get', key, time.perf_counter() - start)
     
     async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """设置缓存值"""
+        start = time.perf_counter()
         try:
             if self.use_redis and self._redis_client:
+                # 同步层中的旧值会在整个TTL内遮住新值，写入前先失效
+                if self._local_sync_cache is not None:
+                    self._local_sync_cache.delete(key)
                 serialized_value = json.dumps(value, ensure_ascii=False)
                 if ttl is not None:
                     await self._redis_client.setex(key, ttl, serialized_value)
                 else:
                     await self._redis_client.set(key, serialized_value)
-                return True
+                stored = True
             else:
-                return await self._memory_cache.set(key, value, ttl)
+                stored = await self._memory_cache.set(key, value, ttl)
+            # 未被准入或超出内存预算的写入不计入sets（已计入对应原因的淘汰）
+            if stored:
+                self.metrics.incr('sets', key)
+            return stored
         except Exception as e:
+            self.metrics.incr('errors', key)
             logger.error(f"缓存设置失败 {key}: {e}")
             return False
+        finally:
+            self.metrics.observe('set', key, time.perf_counter() - start)
     
     async def delete(self, key: str) -> bool:
         """删除缓存项"""
+        start = time.perf_counter()
         try:
+            self.metrics.incr('deletes', key)
             if self.use_redis and self._redis_client:
+                if self._local_sync_cache is not None:
+                    self._local_sync_cache.delete(key)
                 result = await self._redis_client.delete(key)
                 return result > 0
             else:
                 return await self._memory_cache.delete(key)
         except Exception as e:
+            self.metrics.incr('errors', key)
             logger.error(f"缓存删除失败 {key}: {e}")
             return False
+        finally:
+            self.metrics.observe('delete', key, time.perf_counter() - start)
     
     async def clear(self) -> bool:
         """清空所有缓存"""
         try:
             if self.use_redis and self._redis_client:
+                if self._local_sync_cache is not None:
+                    self._local_sync_cache.clear()
                 await self._redis_client.flushdb()
                 return True
             else:
@@ -249,6 +649,63 @@ class CacheService:
             logger.error(f"缓存键列表获取失败: {e}")
             return []
     
+    @property
+    def sync_cache(self) -> SyncMemoryCache:
+        """同步缓存层
+
+        内存模式下与异步接口共享同一个存储；Redis模式下为进程内独立缓存。
+        """
+        if not self.use_redis:
+            return self._memory_cache.store
+        if self._local_sync_cache is None:
+            self._local_sync_cache = SyncMemoryCache(
+                max_size=MEMORY_CACHE_MAX_SIZE,
+                default_ttl=DEFAULT_CACHE_TTL,
+                max_memory_bytes=MEMORY_CACHE_MAX_BYTES,
+                metrics=self.metrics,
+                policy=MEMORY_CACHE_POLICY
+            )
+        return self._local_sync_cache
+    
+    def get_sync(self, key: str) -> Optional[Any]:
+        """同步获取缓存值（不经过事件循环）"""
+        start = time.perf_counter()
+        try:
+            value = self.sync_cache.get(key)
+            self.metrics.incr('hits' if value is not None else 'misses', key)
+            return value
+        except Exception as e:
+            self.metrics.incr('errors', key)
+            logger.error(f"同步缓存获取失败 {key}: {e}")
+            return None
+        finally:
+            self.metrics.observe('get', key, time.perf_counter() - start)
+    
+    def set_sync(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """同步设置缓存值（不经过事件循环）"""
+        start = time.perf_counter()
+        try:
+            stored = self.sync_cache.set(key, value, ttl)
+            if stored:
+                self.metrics.incr('sets', key)
+            return stored
+        except Exception as e:
+            self.metrics.incr('errors', key)
+            logger.error(f"同步缓存设置失败 {key}: {e}")
+            return False
+        finally:
+            self.metrics.observe('set', key, time.perf_counter() - start)
+    
+    def delete_sync(self, key: str) -> bool:
+        """同步删除缓存项（不经过事件循环）"""
+        try:
+            self.metrics.incr('deletes', key)
+            return self.sync_cache.delete(key)
+        except Exception as e:
+            self.metrics.incr('errors', key)
+            logger.error(f"同步缓存删除失败 {key}: {e}")
+            return False
+    
     def generate_cache_key(self, prefix: str, *args, **kwargs) -> str:
         """生成缓存键"""
         # 创建一个包含所有参数的字符串
@@ -294,12 +751,30 @@ class CacheService:
             raise
     
     async def _periodic_cleanup(self):
-        """定期清理过期缓存（仅内存缓存）"""
+        """定期清理过期缓存（仅本地缓存层）
+
+        读写操作已顺带增量清理过期项，这里只负责回收长时间无人访问的过期项。
+        每批最多清理CLEANUP_BATCH_SIZE个，批次之间让出事件循环。
+        """
         while True:
             try:
-                await asyncio.sleep(300)  # 每5分钟清理一次
+                await asyncio.sleep(self.CLEANUP_INTERVAL_SECONDS)
                 if not self.use_redis:
-                    await self._memory_cache.cleanup_expired()
+                    store = self._memory_cache.store
+                elif self._local_sync_cache is not None:
+                    store = self._local_sync_cache
+                else:
+                    continue
+                
+                total = 0
+                while True:
+                    removed = store.cleanup_expired(self.CLEANUP_BATCH_SIZE)
+                    total += removed
+                    if removed < self.CLEANUP_BATCH_SIZE:
+                        break
+                    await asyncio.sleep(0)
+                if total:
+                    logger.info(f"清理了 {total} 个过期缓存项")
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -308,23 +783,40 @@ class CacheService:
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
         stats = {
-            'cache_type': 'redis' if self.use_redis else 'memory',
+            'cache_type': 'redis' if self.use_redis else ('shared_memory' if self.use_shared_memory else 'memory'),
             'redis_connected': self._redis_client is not None if self.use_redis else False
         }
         
         if not self.use_redis:
             stats.update(self._memory_cache.get_stats())
+        elif self._local_sync_cache is not None:
+            stats['sync_tier'] = self._local_sync_cache.get_stats()
         
+        stats['metrics'] = self.metrics.snapshot()
         return stats
+    
+    def render_prometheus(self) -> str:
+        """以Prometheus文本格式导出缓存指标"""
+        gauges = {}
+        if not self.use_redis:
+            memory_stats = self._memory_cache.get_stats()
+            gauges['cache_items'] = memory_stats['total_items']
+            gauges['cache_max_items'] = memory_stats['max_size']
+            gauges['cache_memory_bytes'] = memory_stats['memory_usage_estimate']
+        return self.metrics.render_prometheus(gauges)
 
 # 全局缓存服务实例
 _cache_service: Optional[CacheService] = None
 
+_cache_service_lock = threading.Lock()
+
 def get_cache_service() -> CacheService:
     """获取缓存服务实例"""
     global _cache_service
     if _cache_service is None:
-        _cache_service = CacheService()
+        with _cache_service_lock:
+            if _cache_service is None:
+                _cache_service = CacheService()
     return _cache_service
 
 @asynccontextmanager
@@ -339,8 +831,13 @@ async def cache_context():
 
 # 缓存装饰器
 def cache_result(key_prefix: str, ttl: Optional[int] = None):
-    """缓存函数结果的装饰器"""
+    """缓存函数结果的装饰器
+
+    异步函数使用CacheService的异步接口；同步函数使用线程安全的同步缓存层，
+    不会触碰事件循环，可用于同步FastAPI处理函数和定时器线程。
+    """
     def decorator(func):
+        @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
             cache_service = get_cache_service()
             
@@ -354,10 +851,7 @@ def cache_result(key_prefix: str, ttl: Optional[int] = None):
                 return cached_result
             
             # 执行函数
-            if asyncio.iscoroutinefunction(func):
-                result = await func(*args, **kwargs)
-            else:
-                result = func(*args, **kwargs)
+            result = await func(*args, **kwargs)
             
             # 缓存结果
             await cache_service.set(cache_key, result, ttl)
@@ -365,10 +859,22 @@ def cache_result(key_prefix: str, ttl: Optional[int] = None):
             
             return result
         
+        @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            # 对于同步函数，需要在事件循环中运行
-            loop = asyncio.get_event_loop()
-            return loop.run_until_complete(async_wrapper(*args, **kwargs))
+            cache_service = get_cache_service()
+            cache_key = cache_service.generate_cache_key(key_prefix, *args, **kwargs)
+            
+            cached_result = cache_service.get_sync(cache_key)
+            if cached_result is not None:
+                logger.debug(f"缓存命中: {cache_key}")
+                return cached_result
+            
+            result = func(*args, **kwargs)
+            
+            cache_service.set_sync(cache_key, result, ttl)
+            logger.debug(f"缓存设置: {cache_key}")
+            
+            return result
         
         if asyncio.iscoroutinefunction(func):
             return async_wrapper
@@ -378,10 +884,11 @@ def cache_result(key_prefix: str, ttl: Optional[int] = None):
     return decorator
 
 # 初始化缓存服务
-async def init_cache_service(use_redis: bool = False, redis_url: str = "redis://localhost:6379"):
+async def init_cache_service(use_redis: bool = False, redis_url: str = "redis://localhost:6379",
+                             use_shared_memory: bool = False):
     """初始化缓存服务"""
     global _cache_service
-    _cache_service = CacheService(use_redis=use_redis, redis_url=redis_url)
+    _cache_service = CacheService(use_redis=use_redis, redis_url=redis_url, use_shared_memory=use_shared_memory)
     await _cache_service.initialize()
     logger.info("缓存服务初始化完成")
 
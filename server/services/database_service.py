@@ -10,7 +10,7 @@ from config import (
     DATABASE_HOST_PORT, DATABASE_NAME, DATABASE_MAX_RETRIES, 
     BCRYPT_WORK_FACTOR
 )
-from services.cache_service import get_cache_service, cache_result
+from services.cache_service import get_cache_service
 
 # 设置日志
 logger = logging.getLogger(__name__)
@@ -83,6 +83,16 @@ class DatabaseConnectionPool:
             async with self._lock:
                 self._created_connections -= 1
     
+    def get_stats(self) -> dict:
+        """获取连接池状态（in_use为已借出未归还的连接数）"""
+        idle = self._pool.qsize()
+        return {
+            "max_connections": self.max_connections,
+            "created": self._created_connections,
+            "idle": idle,
+            "in_use": max(0, self._created_connections - idle)
+        }
+    
     async def close_all(self):
         """关闭所有连接"""
         while not self._pool.empty():
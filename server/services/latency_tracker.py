@@ -0,0 +1,190 @@
+"""按路由的响应时间分位数
+
+每个请求的处理时间按（路由模板, 状态码类别）计入当前小时的DDSketch，
+报告p50 / p90 / p99 / p999。路由使用匹配到的路由模板（如 /api/logs/{id}），
+避免路径参数导致的基数膨胀；路由数超过上限后其余计入"other"。
+
+多worker部署时，每个进程定期把自己的草图写入 latency_w{pid}.json，查询时合并
+本进程内存中的草图和其他进程的文件（DDSketch按桶相加即可合并，结果与单进程
+统计全部样本相同）。超过保留时长的小时桶和文件会被删除。
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.quantile_sketch import DDSketch
+
+logger = logging.getLogger("latency_tracker")
+
+QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999))
+OTHER_ROUTE = "other"
+
+_Key = Tuple[str, str]
+
+
+def status_class(status_code: int) -> str:
+    """状态码类别，如 2xx、5xx"""
+    return f"{int(status_code) // 100}xx"
+
+
+class LatencyTracker:
+    """按小时分桶的每路由响应时间草图"""
+
+    def __init__(self, directory: str, file_prefix: str = "latency_w",
+                 retention_hours: int = 24, max_routes: int = 200):
+        self.directory = directory
+        self.file_prefix = file_prefix
+        self.retention_hours = retention_hours
+        self.max_routes = max_routes
+        self.path = os.path.join(directory, f"{file_prefix}{os.getpid()}.json")
+        self._started = time.time()
+        self._hours: Dict[int, Dict[_Key, DDSketch]] = {}
+        self._routes = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    # ---- 记录 ----
+
+    def record(self, route: str, status_code: int, latency_ms: float, now: Optional[float] = None):
+        """计入一个请求的处理时间（毫秒）"""
+        hour = int((time.time() if now is None else now) // 3600)
+        with self._lock:
+            if route not in self._routes:
+                if len(self._routes) >= self.max_routes:
+                    route = OTHER_ROUTE
+                else:
+                    self._routes.add(route)
+            sketches = self._hours.get(hour)
+            if sketches is None:
+                sketches = self._hours[hour] = {}
+                self._expire(hour)
+            key = (route, status_class(status_code))
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = DDSketch()
+            sketch.add(latency_ms)
+            self._dirty = True
+
+    def _expire(self, current_hour: int):
+        """删除超过保留时长的小时桶（调用方需持有锁）"""
+        for hour in [h for h in self._hours if h <= current_hour - self.retention_hours]:
+            del self._hours[hour]
+
+    # ---- 跨进程合并 ----
+
+    def save(self):
+        """把本进程的草图写入文件，并删除其他进程过期的文件"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "pid": os.getpid(),
+                "started": self._started,
+                "updated": time.time(),
+                "hours": {
+                    str(hour): [
+                        {"route": route, "status_class": cls, "sketch": sketch.to_dict()}
+                        for (route, cls), sketch in sketches.items()
+                    ]
+                    for hour, sketches in self._hours.items()
+                }
+            }
+            self._dirty = False
+        try:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"保存响应时间草图 {self.path} 失败: {e}")
+        self._remove_stale_files()
+
+    def _peer_files(self) -> List[str]:
+        pattern = os.path.join(glob.escape(self.directory), f"{self.file_prefix}*.json")
+        return [path for path in glob.glob(pattern) if os.path.abspath(path) != os.path.abspath(self.path)]
+
+    def _remove_stale_files(self):
+        cutoff = time.time() - self.retention_hours * 3600
+        for path in self._peer_files():
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _merge_peers(self, since_hour: int, merged: Dict[_Key, DDSketch]) -> int:
+        """合并其他进程文件中的草图，返回合并的文件数"""
+        sources = 0
+        for path in self._peer_files():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"读取响应时间草图 {path} 失败: {e}")
+                continue
+            sources += 1
+            for hour, items in data.get("hours", {}).items():
+                if int(hour) < since_hour:
+                    continue
+                for item in items:
+                    key = (item["route"], item["status_class"])
+                    self._merge_into(merged, key, DDSketch.from_dict(item["sketch"]))
+        return sources
+
+    @staticmethod
+    def _merge_into(merged: Dict[_Key, DDSketch], key: _Key, sketch: DDSketch):
+        target = merged.get(key)
+        if target is None:
+            target = merged[key] = DDSketch(sketch.relative_accuracy)
+        target.merge(sketch)
+
+    # ---- 查询 ----
+
+    def query(self, hours: int = 1, route: Optional[str] = None,
+              include_peers: bool = True) -> Dict[str, Any]:
+        """最近hours小时（按整点小时桶，含当前小时）内各路由、状态码类别的分位数"""
+        hours = max(1, min(hours, self.retention_hours))
+        since_hour = int(time.time() // 3600) - hours + 1
+        merged: Dict[_Key, DDSketch] = {}
+        with self._lock:
+            for hour, sketches in self._hours.items():
+                if hour < since_hour:
+                    continue
+                for key, sketch in sketches.items():
+                    self._merge_into(merged, key, sketch)
+        sources = 1 + (self._merge_peers(since_hour, merged) if include_peers else 0)
+
+        routes = []
+        for (route_name, cls), sketch in merged.items():
+            if route and route not in route_name:
+                continue
+            summary = {
+                "route": route_name,
+                "status_class": cls,
+                "count": sketch.count,
+                "avg": sketch.avg,
+                "max": sketch.max
+            }
+            for name, q in QUANTILES:
+                summary[name] = sketch.quantile(q)
+            routes.append(summary)
+        routes.sort(key=lambda item: item["count"], reverse=True)
+        return {"hours": hours, "workers": sources, "routes": routes}
+
+    def overall(self, hours: int = 1) -> Dict[str, Any]:
+        """本进程全部路由合并后的分位数"""
+        since_hour = int(time.time() // 3600) - hours + 1
+        total = DDSketch()
+        with self._lock:
+            for hour, sketches in self._hours.items():
+                if hour >= since_hour:
+                    for sketch in sketches.values():
+                        total.merge(sketch)
+        result = {"count": total.count, "avg": total.avg}
+        for name, q in QUANTILES:
+            result[name] = total.quantile(q)
+        return result
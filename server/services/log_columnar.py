@@ -0,0 +1,268 @@
+"""列式日志段
+
+已关闭（非当天）的JSONL日志文件由压缩任务转换为列式文件（如 app_logs_20250810.col）：
+- 记录按(时间戳, 序号)排序后按列存储，每列单独zlib压缩
+- 低基数列（path、level、client_ip、method、status_code等）做字典编码，
+  只存储字典和定长编码数组
+- 其他列（时间戳、请求体、请求头等）以JSON数组存储
+- 某列只在部分记录中出现时，额外存储一个存在位图，还原时保持原记录的字段集合
+
+文件布局（类似Parquet，元数据在文件尾）：
+    魔数 | 列块... | 元数据(JSON) | 元数据长度(uint32) | 魔数
+
+查询只解压用到的列：时间范围在已排序的时间戳列上二分查找，字段条件先在字典上
+求出匹配的编码，再扫描编码数组；只有最终命中的行才会还原为完整记录。
+"""
+import json
+import os
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+COLUMNAR_SUFFIX = ".col"
+COLUMNAR_VERSION = 1
+
+_MAGIC = b"XTCOL001"
+_TRAILER = struct.Struct("<I")
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+_COMPRESS_LEVEL = 9
+
+
+def log_sort_key(log: Dict[str, Any]) -> Tuple[str, int]:
+    """日志的全序键：(时间戳, 序号)，旧日志没有序号时按0处理"""
+    return (log.get("timestamp", ""), log.get("seq") or 0)
+
+
+def _code_type(size: int) -> str:
+    if size <= 0xFF:
+        return "B"
+    if size <= 0xFFFF:
+        return "H"
+    return "I"
+
+
+def _use_dictionary(values: List[Any]) -> bool:
+    """全部为标量且基数较低的列使用字典编码"""
+    distinct = set()
+    limit = max(16, len(values) // 4)
+    for value in values:
+        if not isinstance(value, _SCALAR_TYPES):
+            return False
+        distinct.add((type(value).__name__, value))
+        if len(distinct) > limit:
+            return False
+    return True
+
+
+def write_columnar(path: str, records: Iterable[Dict[str, Any]]) -> int:
+    """把记录写成列式文件（先写临时文件再原子替换），返回记录数"""
+    # 与分页游标使用同一个排序键，多个worker的段合并后同一时间戳的记录按序号排列
+    rows = sorted(records, key=log_sort_key)
+    names: Dict[str, None] = {}
+    for record in rows:
+        for name in record:
+            names.setdefault(name, None)
+
+    blocks: List[bytes] = []
+    columns = []
+    offset = len(_MAGIC)
+    for name in names:
+        values = []
+        presence = bytearray(len(rows))
+        for i, record in enumerate(rows):
+            if name in record:
+                presence[i] = 1
+                values.append(record[name])
+            else:
+                values.append(None)
+        meta: Dict[str, Any] = {"name": name}
+        if _use_dictionary(values):
+            dictionary: List[Any] = []
+            positions: Dict[Tuple[str, Any], int] = {}
+            codes = array(_code_type(len(values)))
+            for value in values:
+                key = (type(value).__name__, value)
+                code = positions.get(key)
+                if code is None:
+                    code = positions[key] = len(dictionary)
+                    dictionary.append(value)
+                codes.append(code)
+            codes = array(_code_type(len(dictionary)), codes)
+            payload = zlib.compress(codes.tobytes(), _COMPRESS_LEVEL)
+            meta.update(encoding="dict", dictionary=dictionary, code_type=codes.typecode)
+        else:
+            data = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            payload = zlib.compress(data, _COMPRESS_LEVEL)
+            meta["encoding"] = "json"
+        meta.update(offset=offset, length=len(payload))
+        blocks.append(payload)
+        offset += len(payload)
+
+        if not all(presence):
+            bitmap = zlib.compress(bytes(presence), _COMPRESS_LEVEL)
+            meta.update(presence_offset=offset, presence_length=len(bitmap))
+            blocks.append(bitmap)
+            offset += len(bitmap)
+        columns.append(meta)
+
+    footer = json.dumps({
+        "version": COLUMNAR_VERSION,
+        "rows": len(rows),
+        "columns": columns
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_MAGIC)
+        for block in blocks:
+            f.write(block)
+        f.write(footer)
+        f.write(_TRAILER.pack(len(footer)))
+        f.write(_MAGIC)
+    os.replace(temp_path, path)
+    return len(rows)
+
+
+class ColumnarSegment:
+    """只读列式日志段，查询接口与SegmentIndex一致"""
+
+    def __init__(self, path: str):
+        self.segment_path = path
+        self._columns: Dict[str, Dict[str, Any]] = {}
+        self._decoded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"不是列式日志文件: {path}")
+            f.seek(-(_TRAILER.size + len(_MAGIC)), os.SEEK_END)
+            trailer = f.read(_TRAILER.size + len(_MAGIC))
+            if trailer[_TRAILER.size:] != _MAGIC:
+                raise ValueError(f"列式日志文件不完整: {path}")
+            footer_length = _TRAILER.unpack(trailer[:_TRAILER.size])[0]
+            f.seek(-(_TRAILER.size + len(_MAGIC) + footer_length), os.SEEK_END)
+            footer = json.loads(f.read(footer_length))
+        if footer.get("version") != COLUMNAR_VERSION:
+            raise ValueError(f"不支持的列式日志版本: {footer.get('version')}")
+        self.row_count: int = footer["rows"]
+        for meta in footer["columns"]:
+            self._columns[meta["name"]] = meta
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self._columns)
+
+    # ---- 列读取 ----
+
+    def _read_block(self, offset: int, length: int) -> bytes:
+        with open(self.segment_path, "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length))
+
+    def _load(self, name: str) -> Tuple[Optional[List[Any]], Any, Optional[bytes]]:
+        """解压一列，返回(字典, 编码数组或值列表, 存在位图)"""
+        with self._lock:
+            cached = self._decoded.get(name)
+            if cached is not None:
+                return cached
+            meta = self._columns[name]
+            raw = self._read_block(meta["offset"], meta["length"])
+            if meta["encoding"] == "dict":
+                codes = array(meta["code_type"])
+                codes.frombytes(raw)
+                decoded = (meta["dictionary"], codes, None)
+            else:
+                decoded = (None, json.loads(raw), None)
+            if "presence_offset" in meta:
+                decoded = decoded[:2] + (self._read_block(meta["presence_offset"], meta["presence_length"]),)
+            self._decoded[name] = decoded
+            return decoded
+
+    def column(self, name: str) -> List[Any]:
+        """读取一整列的值（缺失记为None）"""
+        if name not in self._columns:
+            return [None] * self.row_count
+        dictionary, values, _ = self._load(name)
+        if dictionary is None:
+            return values
+        return [dictionary[code] for code in values]
+
+    def _match_codes(self, name: str, predicate) -> set:
+        """返回满足条件的行号集合；字典列先对字典求值，再扫描编码数组"""
+        if name not in self._columns:
+            return set()
+        dictionary, values, presence = self._load(name)
+        if dictionary is None:
+            rows = {row for row, value in enumerate(values) if predicate(value)}
+        else:
+            codes = {code for code, value in enumerate(dictionary) if predicate(value)}
+            rows = {row for row, code in enumerate(values) if code in codes}
+        if presence is not None:
+            rows = {row for row in rows if presence[row]}
+        return rows
+
+    # ---- 查询（与SegmentIndex相同的接口） ----
+
+    def time_range(self, start_time: Optional[str] = None, end_time: Optional[str] = None) -> range:
+        """时间范围内的行号区间（记录已按时间戳排序）"""
+        timestamps = self.column("timestamp")
+        lo = bisect_left(timestamps, start_time) if start_time else 0
+        hi = bisect_right(timestamps, end_time) if end_time else len(timestamps)
+        return range(lo, hi)
+
+    def query(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+              level: Optional[str] = None, category: Optional[str] = None,
+              path: Optional[str] = None, status_code: Optional[int] = None) -> List[int]:
+        """返回匹配的行号，按时间戳倒序"""
+        window = self.time_range(start_time, end_time)
+        result: Optional[set] = None
+        conditions = []
+        if level:
+            level = level.upper()
+            conditions.append(("level", lambda value: str(value).upper() == level))
+        if category:
+            conditions.append(("category", lambda value: value == category))
+        if status_code is not None:
+            conditions.append(("status_code", lambda value: value == status_code))
+        if path:
+            conditions.append(("path", lambda value: isinstance(value, str) and path in value))
+        for name, predicate in conditions:
+            rows = self._match_codes(name, predicate)
+            result = rows if result is None else result & rows
+            if not result:
+                return []
+        if result is None:
+            return list(reversed(window))
+        return sorted((row for row in result if row in window), reverse=True)
+
+    def read_rows(self, rows: List[int]) -> List[Dict[str, Any]]:
+        """还原指定行的完整记录"""
+        if not rows:
+            return []
+        records: List[Dict[str, Any]] = [{} for _ in rows]
+        for name in self._columns:
+            dictionary, values, presence = self._load(name)
+            for record, row in zip(records, rows):
+                if presence is not None and not presence[row]:
+                    continue
+                value = values[row]
+                record[name] = value if dictionary is None else dictionary[value]
+        return records
+
+    def records(self) -> List[Dict[str, Any]]:
+        """还原全部记录"""
+        return self.read_rows(list(range(self.row_count)))
+
+    def release(self):
+        """释放已解压的列，下次查询时重新读取"""
+        with self._lock:
+            self._decoded.clear()
+
+    def refresh(self) -> bool:
+        """列式段只读，无需刷新"""
+        return False
+
+    def save(self):
+        """列式段只读，无需持久化索引"""
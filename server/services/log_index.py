@@ -0,0 +1,305 @@
+"""日志段索引
+
+每个JSONL日志段文件（如 app_logs_20250811.jsonl）对应一个旁路索引文件
+（app_logs_20250811.jsonl.idx），记录：
+- 每行的字节偏移和长度
+- 按时间戳排序的行号（用于时间范围二分查找）
+- level / category / path / status_code 的倒排表（值 -> 行号列表）
+
+日志段只追加不修改，因此索引可以增量维护：刷新时只解析上次索引位置之后
+新写入的完整行。查询先在索引上求出匹配行号，再按偏移只读取这些行。
+"""
+import base64
+import json
+import logging
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from services.log_columnar import COLUMNAR_SUFFIX, ColumnarSegment
+
+logger = logging.getLogger("log_index")
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 2
+INDEXED_FIELDS = ("level", "category", "path", "status_code")
+
+
+def _pack(values: array) -> str:
+    """数组以原始字节的base64形式保存，加载时无需逐个解析数字"""
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _unpack(typecode: str, data: str) -> array:
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+    return values
+
+
+def normalize_field(field: str, value: Any) -> str:
+    """索引键的规范化形式（级别不区分大小写）"""
+    if field == "level":
+        return str(value).upper()
+    return str(value)
+
+
+class SegmentIndex:
+    """单个日志段文件的索引"""
+
+    def __init__(self, segment_path: str):
+        self.segment_path = segment_path
+        self.index_path = segment_path + INDEX_SUFFIX
+        self.indexed_size = 0  # 已索引的字节数
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.timestamps: List[str] = []
+        # 按时间戳排序的(时间戳, 行号)，日志基本按时间追加，插入点通常在末尾
+        self._sorted_times: List[str] = []
+        self._sorted_rows: List[int] = []
+        self.postings: Dict[str, Dict[str, array]] = {field: {} for field in INDEXED_FIELDS}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self) -> int:
+        return len(self.offsets)
+
+    # ---- 构建 ----
+
+    def _add_row(self, offset: int, length: int, record: Dict[str, Any]):
+        row = len(self.offsets)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        timestamp = str(record.get("timestamp", ""))
+        self.timestamps.append(timestamp)
+        position = bisect_right(self._sorted_times, timestamp)
+        self._sorted_times.insert(position, timestamp)
+        self._sorted_rows.insert(position, row)
+        for field in INDEXED_FIELDS:
+            value = record.get(field)
+            if value is None:
+                continue
+            values = self.postings[field]
+            key = normalize_field(field, value)
+            rows = values.get(key)
+            if rows is None:
+                rows = values[key] = array("I")
+            rows.append(row)
+
+    def refresh(self) -> bool:
+        """索引段文件中新追加的完整行，返回是否有新内容"""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.segment_path)
+            except OSError:
+                return False
+            if size < self.indexed_size:
+                # 文件被截断或替换，重建索引
+                logger.warning(f"日志段 {self.segment_path} 变小，重建索引")
+                self.__init__(self.segment_path)
+            if size == self.indexed_size:
+                return False
+
+            with open(self.segment_path, "rb") as f:
+                f.seek(self.indexed_size)
+                data = f.read(size - self.indexed_size)
+
+            offset = self.indexed_size
+            end = data.rfind(b"\n") + 1  # 只索引完整行
+            position = 0
+            while position < end:
+                newline = data.index(b"\n", position)
+                line = data[position:newline]
+                if line.strip():
+                    try:
+                        self._add_row(offset + position, len(line), json.loads(line))
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        pass
+                position = newline + 1
+            self.indexed_size = offset + end
+            self.dirty = self.dirty or end > 0
+            return end > 0
+
+    # ---- 查询 ----
+
+    def _time_rows(self, start_time: Optional[str], end_time: Optional[str]) -> List[int]:
+        lo = bisect_left(self._sorted_times, start_time) if start_time else 0
+        hi = bisect_right(self._sorted_times, end_time) if end_time else len(self._sorted_times)
+        return self._sorted_rows[lo:hi]
+
+    def query(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+              level: Optional[str] = None, category: Optional[str] = None,
+              path: Optional[str] = None, status_code: Optional[int] = None) -> List[int]:
+        """返回匹配的行号，按时间戳倒序"""
+        with self._lock:
+            candidates: List[Iterable[int]] = []
+            if level:
+                candidates.append(self.postings["level"].get(normalize_field("level", level), ()))
+            if category:
+                candidates.append(self.postings["category"].get(category, ()))
+            if status_code is not None:
+                candidates.append(self.postings["status_code"].get(str(status_code), ()))
+            if path:
+                # 路径按子串匹配：合并所有包含该子串的路径的倒排表
+                matched = set()
+                for value, rows in self.postings["path"].items():
+                    if path in value:
+                        matched.update(rows)
+                candidates.append(matched)
+
+            if not candidates:
+                rows = self._time_rows(start_time, end_time)
+                rows.reverse()
+                return rows
+
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for other in candidates[1:]:
+                if not result:
+                    break
+                result.intersection_update(other)
+
+            timestamps = self.timestamps
+            if start_time or end_time:
+                result = {
+                    row for row in result
+                    if (not start_time or timestamps[row] >= start_time)
+                    and (not end_time or timestamps[row] <= end_time)
+                }
+            return sorted(result, key=lambda row: (timestamps[row], row), reverse=True)
+
+    def read_rows(self, rows: List[int]) -> List[Dict[str, Any]]:
+        """按行号读取日志记录（按偏移定位，只读取需要的行）"""
+        records = []
+        if not rows:
+            return records
+        with open(self.segment_path, "rb") as f:
+            for row in rows:
+                f.seek(self.offsets[row])
+                try:
+                    records.append(json.loads(f.read(self.lengths[row])))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+        return records
+
+    # ---- 持久化 ----
+
+    def save(self):
+        """把索引写入旁路文件（先写临时文件再原子替换）"""
+        with self._lock:
+            if not self.dirty:
+                return
+            data = {
+                "version": INDEX_VERSION,
+                "indexed_size": self.indexed_size,
+                "offsets": _pack(self.offsets),
+                "lengths": _pack(self.lengths),
+                "timestamps": self.timestamps,
+                "time_order": _pack(array("I", self._sorted_rows)),
+                "postings": {
+                    field: {value: _pack(rows) for value, rows in values.items()}
+                    for field, values in self.postings.items()
+                }
+            }
+            # 多个worker可能同时持久化同一段的索引，临时文件按进程区分
+            temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.index_path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, segment_path: str) -> "SegmentIndex":
+        """加载旁路索引（不存在或损坏时新建），并索引新增内容"""
+        index = cls(segment_path)
+        if os.path.exists(index.index_path):
+            try:
+                with open(index.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION and data["indexed_size"] <= os.path.getsize(segment_path):
+                    index.indexed_size = data["indexed_size"]
+                    index.offsets = _unpack("Q", data["offsets"])
+                    index.lengths = _unpack("I", data["lengths"])
+                    index.timestamps = data["timestamps"]
+                    index._sorted_rows = _unpack("I", data["time_order"]).tolist()
+                    index._sorted_times = [index.timestamps[row] for row in index._sorted_rows]
+                    index.postings = {
+                        field: {value: _unpack("I", rows) for value, rows in data["postings"].get(field, {}).items()}
+                        for field in INDEXED_FIELDS
+                    }
+            except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+                logger.warning(f"日志索引 {index.index_path} 无效，重建: {e}")
+                index = cls(segment_path)
+        index.refresh()
+        return index
+
+
+class LogIndexManager:
+    """管理各日志段索引的加载、缓存与持久化"""
+
+    def __init__(self, max_cached: int = 64):
+        self.max_cached = max_cached
+        self._indexes: "OrderedDict[str, SegmentIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, segment_path: str, cache: bool = True) -> Union[SegmentIndex, ColumnarSegment]:
+        """获取最新的段索引（列式段自带列数据，直接作为索引使用）
+
+        cache为False时（全量导出、重建统计等一次性遍历），不在缓存中的索引加载后不放入缓存，
+        用完即可回收；新建的旁路索引仍会持久化。
+        """
+        with self._lock:
+            index = self._indexes.get(segment_path)
+            if index is not None:
+                self._indexes.move_to_end(segment_path)
+        if index is None:
+            if segment_path.endswith(COLUMNAR_SUFFIX):
+                index = ColumnarSegment(segment_path)
+            else:
+                index = SegmentIndex.load(segment_path)
+            if not cache:
+                if isinstance(index, SegmentIndex):
+                    self._save_quietly(index)
+                return index
+            with self._lock:
+                self._indexes[segment_path] = index
+                while len(self._indexes) > self.max_cached:
+                    _, evicted = self._indexes.popitem(last=False)
+                    self._save_quietly(evicted)
+        else:
+            index.refresh()
+        return index
+
+    def is_cached(self, segment_path: str) -> bool:
+        """段索引是否已在内存中"""
+        with self._lock:
+            return segment_path in self._indexes
+
+    def forget(self, segment_path: str):
+        """段文件被删除或替换时丢弃其索引"""
+        with self._lock:
+            self._indexes.pop(segment_path, None)
+        index_path = segment_path + INDEX_SUFFIX
+        if os.path.exists(index_path):
+            try:
+                os.remove(index_path)
+            except OSError as e:
+                logger.error(f"删除日志索引 {index_path} 失败: {e}")
+
+    def save_all(self):
+        """持久化所有有变更的索引"""
+        with self._lock:
+            indexes = list(self._indexes.values())
+        for index in indexes:
+            self._save_quietly(index)
+
+    @staticmethod
+    def _save_quietly(index: SegmentIndex):
+        try:
+            if os.path.exists(index.segment_path):
+                index.save()
+        except Exception as e:
+            logger.error(f"保存日志索引 {index.index_path} 失败: {e}")
@@ -0,0 +1,66 @@
+"""日志查询结果缓存
+
+仪表盘会反复发出相同的 /api/logs 查询。结果按（规范化后的查询参数, 段版本）缓存在
+SyncMemoryCache 中，命中时不再加载、过滤和排序日志：
+- 段版本是查询时间范围内各日志段的（文件名, 大小, 修改时间），段被追加、轮转或
+  压缩后版本随之变化，旧结果不再被命中，由LRU淘汰
+- 查询范围涉及当天时，版本中不含本进程写入中的段，改为包含内存缓存中与查询匹配的
+  日志（新日志即使尚未写入文件也会使结果失效，不匹配的新日志不影响）；这类结果最多保留 live_ttl 秒
+- 只涉及已关闭（早于今天）段的结果不过期
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from services.cache_service import SyncMemoryCache
+
+logger = logging.getLogger("log_query_cache")
+
+
+class LogQueryCache:
+    """按查询参数和段版本缓存日志查询结果"""
+
+    def __init__(self, max_entries: int = 256, max_memory_bytes: int = 0, live_ttl: int = 300,
+                 enabled: bool = True):
+        self.enabled = enabled
+        self.live_ttl = live_ttl
+        self.store = SyncMemoryCache(max_size=max_entries, default_ttl=0, max_memory_bytes=max_memory_bytes)
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def make_key(kind: str, params: Dict[str, Any], version: Any) -> str:
+        """由查询类型、参数（忽略空值）和段版本生成缓存键"""
+        normalized = {name: value for name, value in params.items() if value is not None and value != ""}
+        raw = json.dumps([kind, normalized, version], sort_keys=True, separators=(",", ":"),
+                         ensure_ascii=False, default=str)
+        return "log_query:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回缓存结果的浅拷贝（调用方可以在结果上添加字段）"""
+        if not self.enabled:
+            return None
+        result = self.store.get(key)
+        if result is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return dict(result)
+
+    def set(self, key: str, result: Dict[str, Any], live: bool):
+        if self.enabled:
+            self.store.set(key, dict(result), ttl=self.live_ttl if live else None)
+
+    def clear(self):
+        self.store.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats['hits'] + self.stats['misses']
+        store_stats = self.store.get_stats()
+        return {
+            **self.stats,
+            'hit_rate': self.stats['hits'] / total if total else 0.0,
+            'entries': store_stats['total_items'],
+            'memory_usage_estimate': store_stats['memory_usage_estimate'],
+            'enabled': self.enabled
+        }
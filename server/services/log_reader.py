@@ -0,0 +1,199 @@
+"""JSONL日志段的字节级扫描
+
+没有段索引的日志文件（尚未压缩的已关闭JSONL段、旧版本的 .jsonl.gz 归档）不值得为
+一次查询先解析全部记录建索引。扫描器直接在原始字节上查找查询条件对应的标记，
+只有通过预过滤的行才调用 json.loads：
+- JSONL段用mmap映射，预过滤的正则直接作用于映射区，不复制整个文件
+- 条件中最有区分度的标记（状态码、级别、分类、路径、检索词）在整个映射区中查找，
+  命中后再确定所在的行，不匹配的行不会被逐行处理
+- 时间范围比较行中 "timestamp" 的原始字节（ISO格式按字节序即按时间序）
+- .gz 归档通过流式解压按块扫描，不在内存中展开整个文件
+
+字节级条件只是必要条件（嵌套字段中的同名键也可能命中），解码后仍按与get_logs
+相同的语义精确过滤；字段值含非ASCII字符时不做该字段的预过滤（旧文件可能按\\u转义写入）。
+"""
+import gzip
+import json
+import mmap
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.log_search import SearchQuery
+
+GZIP_CHUNK_SIZE = 4 * 1024 * 1024
+
+_TIMESTAMP_RE = re.compile(rb'"timestamp": ?"([^"]*)"')
+
+
+def record_matches(record: Dict[str, Any], start_time=None, end_time=None, level=None, category=None,
+                   path=None, status_code=None, query: Optional[SearchQuery] = None) -> bool:
+    """一条日志是否满足查询条件（级别不区分大小写，路径按子串匹配）"""
+    timestamp = record.get("timestamp", "")
+    if start_time and timestamp < start_time:
+        return False
+    if end_time and timestamp > end_time:
+        return False
+    if level and str(record.get("level", "")).upper() != level.upper():
+        return False
+    if category and record.get("category", "") != category:
+        return False
+    if path and path not in record.get("path", ""):
+        return False
+    if status_code is not None and record.get("status_code") != status_code:
+        return False
+    if query is not None and not query.matches(record):
+        return False
+    return True
+
+
+def _json_fragment(value: str) -> Optional[bytes]:
+    """字段值在JSON行中的字节形式；含非ASCII字符时返回None（不做预过滤）"""
+    if not value.isascii():
+        return None
+    return json.dumps(value)[1:-1].encode("ascii")
+
+
+class SegmentScanner:
+    """按查询条件扫描未建索引的JSONL（或gzip压缩的JSONL）文件"""
+
+    def __init__(self, start_time=None, end_time=None, level=None, category=None, path=None,
+                 status_code=None, query: Optional[SearchQuery] = None):
+        self.filters = {
+            "start_time": start_time, "end_time": end_time, "level": level,
+            "category": category, "path": path, "status_code": status_code, "query": query
+        }
+        self._start = start_time.encode("ascii") if start_time else None
+        self._end = end_time.encode("ascii") if end_time else None
+        self.stats = {'bytes': 0, 'candidates': 0, 'matched': 0}
+
+        # 预过滤条件，按区分度从高到低排列，第一个作为全文查找的锚点
+        patterns = []
+        if status_code is not None:
+            patterns.append(re.compile(rb'"status_code": ?' + str(int(status_code)).encode() + rb'[,}]'))
+        if level:
+            patterns.append(re.compile(rb'"level": ?"' + re.escape(level.encode("ascii", "ignore")) + rb'"',
+                                       re.IGNORECASE))
+        if category and _json_fragment(category) is not None:
+            patterns.append(re.compile(rb'"category": ?"' + re.escape(_json_fragment(category)) + rb'"'))
+        if path and _json_fragment(path) is not None:
+            patterns.append(re.compile(re.escape(_json_fragment(path))))
+        if query is not None and len(query.groups) == 1:
+            # 只有一组条件时，每个必须出现的英文检索词都必须出现在行中
+            for tokens in query.groups[0][0]:
+                for token in tokens:
+                    if token.isascii():
+                        patterns.append(re.compile(re.escape(token.encode("ascii")), re.IGNORECASE))
+        self._patterns = patterns
+        self._exact = any(value is not None and value != "" for value in self.filters.values())
+
+    # ---- 预过滤 ----
+
+    def _time_ok(self, buf, start: int, end: int) -> bool:
+        if self._start is None and self._end is None:
+            return True
+        found = False
+        for match in _TIMESTAMP_RE.finditer(buf, start, end):
+            found = True
+            timestamp = match.group(1)
+            if (self._start is None or timestamp >= self._start) and (self._end is None or timestamp <= self._end):
+                return True
+        # 没有时间戳标记（非默认格式）时交给精确过滤
+        return not found
+
+    def _candidates(self, buf, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """产出[start, end)中通过预过滤的行的(起点, 终点)"""
+        if not self._patterns:
+            position = start
+            while position < end:
+                newline = buf.find(b"\n", position, end)
+                if newline == -1:
+                    newline = end
+                if newline > position and self._time_ok(buf, position, newline):
+                    yield position, newline
+                position = newline + 1
+            return
+
+        anchor, others = self._patterns[0], self._patterns[1:]
+        position = start
+        while position < end:
+            match = anchor.search(buf, position, end)
+            if match is None:
+                return
+            line_start = buf.rfind(b"\n", start, match.start()) + 1 or start
+            line_end = buf.find(b"\n", match.end(), end)
+            if line_end == -1:
+                line_end = end
+            if all(pattern.search(buf, line_start, line_end) for pattern in others) \
+                    and self._time_ok(buf, line_start, line_end):
+                yield line_start, line_end
+            position = line_end + 1
+
+    def _decode(self, buf, start: int, end: int) -> Iterator[Dict[str, Any]]:
+        if not self._exact:
+            # 没有任何条件（如列式压缩读取全部记录）：整块解码后按行切分，不逐行查找边界
+            for line in buf[start:end].decode("utf-8", "replace").split("\n"):
+                if not line.strip():
+                    continue
+                self.stats['candidates'] += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    self.stats['matched'] += 1
+                    yield record
+            return
+        for line_start, line_end in self._candidates(buf, start, end):
+            self.stats['candidates'] += 1
+            try:
+                record = json.loads(buf[line_start:line_end].decode("utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if isinstance(record, dict) and record_matches(record, **self.filters):
+                self.stats['matched'] += 1
+                yield record
+
+    # ---- 文件读取 ----
+
+    def scan_file(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """按文件顺序产出匹配的记录（只处理以换行结尾的完整行）"""
+        if file_path.endswith(".gz"):
+            yield from self._scan_gzip(file_path)
+            return
+        with open(file_path, "rb") as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # 空文件
+        with mapped:
+            end = mapped.rfind(b"\n")
+            if end == -1:
+                return
+            self.stats['bytes'] += end + 1
+            yield from self._decode(mapped, 0, end)
+
+    def _scan_gzip(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        with gzip.open(file_path, "rb") as f:
+            pending = b""
+            while True:
+                chunk = f.read(GZIP_CHUNK_SIZE)
+                if not chunk:
+                    break
+                buf = pending + chunk if pending else chunk
+                end = buf.rfind(b"\n")
+                if end == -1:
+                    pending = buf
+                    continue
+                self.stats['bytes'] += end + 1
+                yield from self._decode(buf, 0, end)
+                pending = buf[end + 1:]
+            if pending.strip():
+                self.stats['bytes'] += len(pending)
+                yield from self._decode(pending, 0, len(pending))
+
+
+def scan_records(file_path: str, start_time=None, end_time=None, level=None, category=None,
+                 path=None, status_code=None, query: Optional[SearchQuery] = None) -> List[Dict[str, Any]]:
+    """扫描一个未建索引的段文件，返回匹配的记录（文件顺序）"""
+    scanner = SegmentScanner(start_time, end_time, level, category, path, status_code, query)
+    return list(scanner.scan_file(file_path))
@@ -0,0 +1,135 @@
+"""日志保留策略
+
+保留规则在 config.LOG_RETENTION_POLICIES 中声明，按顺序匹配，第一条匹配的规则
+决定一条日志保留多久，未匹配任何规则的日志保留 LOG_RETENTION_DEFAULT_DAYS 天：
+- level / category: 列表，省略表示不限（级别不区分大小写）
+- path: 路径前缀列表，省略表示不限
+- keep_days: 日志日期距今达到该天数后删除
+- sample_after_days / sample_rate: 距今达到该天数后只按采样率保留
+
+日志的天数按文件名中的日期计算，与文件修改时间无关。采样按(时间戳, 序号)的哈希
+决定，结果确定：重复执行保留任务不会在已采样的日志上再次采样。
+"""
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+@dataclass
+class RetentionRule:
+    """一条保留规则"""
+    name: str
+    keep_days: int
+    levels: Optional[frozenset] = None
+    categories: Optional[frozenset] = None
+    paths: Optional[tuple] = None
+    sample_after_days: Optional[int] = None
+    sample_rate: float = 1.0
+
+    def matches(self, level: Any, category: Any, path: Any) -> bool:
+        if self.levels is not None and str(level or "").upper() not in self.levels:
+            return False
+        if self.categories is not None and category not in self.categories:
+            return False
+        if self.paths is not None and not (isinstance(path, str) and path.startswith(self.paths)):
+            return False
+        return True
+
+    def keeps(self, age_days: int, timestamp: Any, seq: Any) -> bool:
+        """距今age_days天的一条日志是否保留"""
+        if age_days >= self.keep_days:
+            return False
+        if self.sample_after_days is not None and age_days >= self.sample_after_days:
+            return sample_hash(timestamp, seq) < self.sample_rate
+        return True
+
+
+def sample_hash(timestamp: Any, seq: Any) -> float:
+    """日志在[0, 1)上的确定性哈希值，用于采样"""
+    return zlib.crc32(f"{timestamp}|{seq or 0}".encode("utf-8")) / 0x100000000
+
+
+class RetentionPolicy:
+    """按顺序匹配的保留规则"""
+
+    def __init__(self, rules: Sequence[RetentionRule], default_days: int = 30):
+        self.rules = list(rules)
+        self.default_days = default_days
+
+    @classmethod
+    def from_config(cls, policies: Iterable[Dict[str, Any]], default_days: int) -> "RetentionPolicy":
+        """由配置创建，配置无效时抛出ValueError"""
+        if default_days < 1:
+            raise ValueError(f"默认保留天数必须大于0: {default_days}")
+        rules = []
+        for i, policy in enumerate(policies):
+            name = policy.get("name") or f"rule{i + 1}"
+            unknown = set(policy) - {"name", "level", "category", "path", "keep_days",
+                                     "sample_after_days", "sample_rate"}
+            if unknown:
+                raise ValueError(f"保留规则 {name} 包含未知的字段: {', '.join(sorted(unknown))}")
+            keep_days = policy.get("keep_days")
+            if not isinstance(keep_days, int) or keep_days < 1:
+                raise ValueError(f"保留规则 {name} 的 keep_days 必须是正整数")
+            sample_after_days = policy.get("sample_after_days")
+            sample_rate = policy.get("sample_rate", 1.0)
+            if sample_after_days is not None and (not isinstance(sample_after_days, int) or sample_after_days < 0):
+                raise ValueError(f"保留规则 {name} 的 sample_after_days 必须是非负整数")
+            if not 0 <= sample_rate <= 1:
+                raise ValueError(f"保留规则 {name} 的 sample_rate 必须在0到1之间")
+            rules.append(RetentionRule(
+                name=name,
+                keep_days=keep_days,
+                levels=frozenset(str(level).upper() for level in policy["level"]) if "level" in policy else None,
+                categories=frozenset(policy["category"]) if "category" in policy else None,
+                paths=tuple(policy["path"]) if "path" in policy else None,
+                sample_after_days=sample_after_days,
+                sample_rate=sample_rate
+            ))
+        return cls(rules, default_days)
+
+    @property
+    def max_days(self) -> int:
+        """任何日志的最长保留天数，超过该天数的整天文件直接删除"""
+        return max([self.default_days] + [rule.keep_days for rule in self.rules])
+
+    def rule_for(self, level: Any, category: Any, path: Any) -> Optional[RetentionRule]:
+        for rule in self.rules:
+            if rule.matches(level, category, path):
+                return rule
+        return None
+
+    def _keeps(self, age_days: int, level, category, path, timestamp, seq) -> bool:
+        rule = self.rule_for(level, category, path)
+        if rule is None:
+            return age_days < self.default_days
+        return rule.keeps(age_days, timestamp, seq)
+
+    def active(self, age_days: int) -> bool:
+        """距今age_days天的日志是否有规则生效（否则全部保留，无需读取记录）"""
+        return age_days >= min([self.default_days] + [rule.keep_days for rule in self.rules]
+                               + [rule.sample_after_days for rule in self.rules if rule.sample_after_days is not None])
+
+    def kept_rows(self, age_days: int, columns: Dict[str, List[Any]], row_count: int) -> List[int]:
+        """按列（level、category、path、timestamp、seq）判断一段日志中保留的行号"""
+        levels, categories, paths = columns["level"], columns["category"], columns["path"]
+        timestamps, seqs = columns["timestamp"], columns["seq"]
+        return [
+            row for row in range(row_count)
+            if self._keeps(age_days, levels[row], categories[row], paths[row], timestamps[row], seqs[row])
+        ]
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """规则列表（用于服务统计）"""
+        return [
+            {
+                "name": rule.name,
+                "keep_days": rule.keep_days,
+                "level": sorted(rule.levels) if rule.levels is not None else None,
+                "category": sorted(rule.categories) if rule.categories is not None else None,
+                "path": list(rule.paths) if rule.paths is not None else None,
+                "sample_after_days": rule.sample_after_days,
+                "sample_rate": rule.sample_rate
+            }
+            for rule in self.rules
+        ] + [{"name": "default", "keep_days": self.default_days}]
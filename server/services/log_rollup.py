@@ -0,0 +1,375 @@
+"""日志统计预聚合（rollup）
+
+save_log时增量更新每分钟和每小时两级统计桶：总数、按级别/分类/路径/状态码的计数，
+以及响应时间的DDSketch。每个进程只统计自己保存的日志，按天持久化为
+rollup_YYYYMMDD_w{pid}.json（与日志文件放在同一目录），查询时合并本进程内存中的
+统计和其他进程的文件（与LatencyTracker相同，计数和草图按桶相加即可合并）。
+
+已关闭（早于今天）的某天没有任何统计文件时，查询在锁外从原始日志重建一次，结果写入
+rollup_YYYYMMDD.json（内容只取决于原始日志，多个进程重复重建也相同）。当天不重建：
+其他worker尚未保存的统计也在原始日志中，重建会重复计数。
+
+查询任意时间范围时，整点小时用小时桶、首尾不足一小时的部分用分钟桶，合并的桶数
+与时间跨度成正比（30天约720个小时桶），不再扫描原始日志。
+"""
+import glob
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from services.quantile_sketch import DDSketch
+
+logger = logging.getLogger("log_rollup")
+
+ROLLUP_VERSION = 1
+MAX_PATHS_PER_BUCKET = 100  # 每个桶最多单独统计的路径数，其余计入other
+MINUTE_FORMAT = "%Y-%m-%dT%H:%M"
+HOUR_FORMAT = "%Y-%m-%dT%H"
+
+
+def _parse_time(value) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _entry_fields(entry: Dict[str, Any]) -> tuple:
+    """提取参与统计的字段：(级别, 分类, 路径, 状态码, 响应时间毫秒)"""
+    latency = entry.get("processing_time_ms")
+    if latency is None:
+        latency = entry.get("response_time")
+    return (
+        str(entry.get("level", "UNKNOWN")).upper(),
+        entry.get("category"),
+        entry.get("path"),
+        entry.get("status_code"),
+        latency if isinstance(latency, (int, float)) else None
+    )
+
+
+class RollupBucket:
+    """一个时间桶内的统计"""
+
+    __slots__ = ("count", "level", "category", "path", "status", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.level: Dict[str, int] = {}
+        self.category: Dict[str, int] = {}
+        self.path: Dict[str, int] = {}
+        self.status: Dict[str, int] = {}
+        self.latency = DDSketch()
+
+    @staticmethod
+    def _incr(counter: Dict[str, int], key: str, count: int = 1):
+        counter[key] = counter.get(key, 0) + count
+
+    def add(self, level: str, category: Optional[str], path: Optional[str],
+            status: Optional[int], latency: Optional[float]):
+        self.count += 1
+        self._incr(self.level, level)
+        if category:
+            self._incr(self.category, category)
+        if path:
+            if path not in self.path and len(self.path) >= MAX_PATHS_PER_BUCKET:
+                path = "other"
+            self._incr(self.path, path)
+        if status is not None:
+            self._incr(self.status, str(status))
+        if latency is not None:
+            self.latency.add(latency)
+
+    def merge(self, other: "RollupBucket"):
+        self.count += other.count
+        for name in ("level", "category", "path", "status"):
+            counter = getattr(self, name)
+            for key, count in getattr(other, name).items():
+                self._incr(counter, key, count)
+        self.latency.merge(other.latency)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "level": self.level,
+            "category": self.category,
+            "path": self.path,
+            "status": self.status,
+            "latency": self.latency.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RollupBucket":
+        bucket = cls()
+        bucket.count = data.get("count", 0)
+        bucket.level = data.get("level", {})
+        bucket.category = data.get("category", {})
+        bucket.path = data.get("path", {})
+        bucket.status = data.get("status", {})
+        bucket.latency = DDSketch.from_dict(data.get("latency", {}))
+        return bucket
+
+    def summary(self, top_paths: int = 10) -> Dict[str, Any]:
+        """汇总为接口返回的统计信息"""
+        latency = self.latency
+        return {
+            "total_count": self.count,
+            "info_count": self.level.get("INFO", 0),
+            "warning_count": self.level.get("WARNING", 0),
+            "error_count": self.level.get("ERROR", 0) + self.level.get("CRITICAL", 0),
+            "by_level": dict(self.level),
+            "by_category": dict(self.category),
+            "by_status": dict(sorted(self.status.items())),
+            "top_paths": [
+                {"path": path, "count": count}
+                for path, count in sorted(self.path.items(), key=lambda item: item[1], reverse=True)[:top_paths]
+            ],
+            "response_time_ms": {
+                "count": latency.count,
+                "avg": latency.avg,
+                "p50": latency.quantile(0.5),
+                "p90": latency.quantile(0.9),
+                "p99": latency.quantile(0.99),
+                "max": latency.max
+            }
+        }
+
+
+class _DayRollup:
+    """一天内的分钟桶和小时桶"""
+
+    __slots__ = ("minutes", "hours", "dirty")
+
+    def __init__(self):
+        self.minutes: Dict[str, RollupBucket] = {}
+        self.hours: Dict[str, RollupBucket] = {}
+        self.dirty = False
+
+
+class LogRollup:
+    """按分钟/小时增量维护的日志统计"""
+
+    def __init__(self, directory: str, file_prefix: str = "rollup_",
+                 backfill: Optional[Callable[[str], Iterable[Dict[str, Any]]]] = None,
+                 max_cached_days: int = 45):
+        """
+        backfill: 已关闭的某天没有统计文件时，用于从原始日志重建的回调（参数为YYYYMMDD）
+        """
+        self.directory = directory
+        self.file_prefix = file_prefix
+        self.backfill = backfill
+        self.max_cached_days = max_cached_days
+        self._days: "OrderedDict[str, _DayRollup]" = OrderedDict()  # 本进程的统计
+        # 其他进程（及重建）的统计文件：路径 -> ((大小, 修改时间), 统计)，文件变化后重新加载
+        self._files: "OrderedDict[str, tuple]" = OrderedDict()
+        self._empty_days = set()  # 已重建过但没有原始日志的天
+        self._lock = threading.Lock()
+
+    # ---- 写入 ----
+
+    def add(self, entry: Dict[str, Any]):
+        """把一条日志计入本进程的统计（不读取原始日志）"""
+        timestamp = str(entry.get("timestamp", ""))
+        if len(timestamp) < 16:
+            return
+        args = _entry_fields(entry)
+        with self._lock:
+            day = self._day(timestamp[:10].replace('-', ''))
+            self._add_to_day(day, timestamp, args)
+
+    @staticmethod
+    def _add_to_day(day: _DayRollup, timestamp: str, args: tuple):
+        for buckets, key in ((day.minutes, timestamp[:16]), (day.hours, timestamp[:13])):
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = RollupBucket()
+            bucket.add(*args)
+        day.dirty = True
+
+    def _day(self, date_str: str) -> _DayRollup:
+        """获取本进程某天的统计（调用方需持有锁）
+
+        只在该天此前被LRU淘汰过时才读取本进程的统计文件，保证淘汰后再写入不会覆盖已保存的统计。
+        """
+        day = self._days.get(date_str)
+        if day is not None:
+            self._days.move_to_end(date_str)
+            return day
+
+        day = self._load(self._file_path(date_str)) or _DayRollup()
+        self._days[date_str] = day
+        while len(self._days) > self.max_cached_days:
+            evicted_date, evicted = self._days.popitem(last=False)
+            self._save_day(evicted_date, evicted)
+        return day
+
+    def _rebuild(self, date_str: str) -> Optional[_DayRollup]:
+        """从原始日志重建已关闭的一天的统计并写入文件（不持有锁）"""
+        day = _DayRollup()
+        try:
+            count = 0
+            for entry in self.backfill(date_str):
+                timestamp = str(entry.get("timestamp", ""))
+                if len(timestamp) < 16:
+                    continue
+                self._add_to_day(day, timestamp, _entry_fields(entry))
+                count += 1
+        except Exception as e:
+            logger.error(f"重建 {date_str} 的统计失败: {e}")
+            return None
+        if not count:
+            with self._lock:
+                self._empty_days.add(date_str)
+            return None
+        logger.info(f"从原始日志重建 {date_str} 的统计: {count} 条")
+        self._write(self._rebuilt_path(date_str), day)
+        return day
+
+    # ---- 查询 ----
+
+    @staticmethod
+    def _iter_buckets(start: datetime, end: datetime, days: Dict[str, List[_DayRollup]]) -> Iterator[RollupBucket]:
+        """按[start, end)遍历覆盖该范围的桶：整点小时用小时桶，其余用分钟桶"""
+        current = start.replace(second=0, microsecond=0)
+        while current < end:
+            sources = days.get(current.strftime("%Y%m%d"), ())
+            if current.minute == 0 and current + timedelta(hours=1) <= end:
+                key, buckets_of, step = current.strftime(HOUR_FORMAT), "hours", timedelta(hours=1)
+            else:
+                key, buckets_of, step = current.strftime(MINUTE_FORMAT), "minutes", timedelta(minutes=1)
+            for day in sources:
+                bucket = getattr(day, buckets_of).get(key)
+                if bucket is not None:
+                    yield bucket
+            current += step
+
+    def _peer_days(self, date_strs: List[str]) -> Dict[str, List[_DayRollup]]:
+        """其他进程（及重建）的统计文件，缺少统计的已关闭天在这里重建（不持有锁）"""
+        with self._lock:
+            own = set(self._days)
+            empty = set(self._empty_days)
+        # 日志时间戳可能来自本地时钟（中间件）或UTC（服务内部），两个时钟都过了零点的天才算关闭
+        closed_before = min(datetime.now(), datetime.utcnow()).strftime("%Y%m%d")
+        own_suffix = f"_w{os.getpid()}.json"
+        days: Dict[str, List[_DayRollup]] = {}
+        for date_str in date_strs:
+            pattern = os.path.join(glob.escape(self.directory), f"{self.file_prefix}{date_str}*.json")
+            paths = sorted(glob.glob(pattern))
+            sources = []
+            for path in paths:
+                if date_str in own and path.endswith(own_suffix):
+                    continue  # 本进程的统计以内存为准
+                day = self._cached_file(path)
+                if day is not None:
+                    sources.append(day)
+            if not paths and date_str not in own and date_str not in empty \
+                    and date_str < closed_before and self.backfill is not None:
+                day = self._rebuild(date_str)
+                if day is not None:
+                    sources.append(day)
+            days[date_str] = sources
+        return days
+
+    def _cached_file(self, path: str) -> Optional[_DayRollup]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == signature:
+                self._files.move_to_end(path)
+                return cached[1]
+        day = self._load(path)
+        if day is not None:
+            with self._lock:
+                self._files[path] = (signature, day)
+                while len(self._files) > self.max_cached_days * 4:
+                    self._files.popitem(last=False)
+        return day
+
+    def query(self, start_time=None, end_time=None) -> Dict[str, Any]:
+        """统计时间范围内的日志（默认最近24小时，结束时间所在的分钟也包含在内）"""
+        # 默认结束时间取两个时钟中较晚的一个，本地时钟和UTC时间戳的最新日志都包含在内
+        end = _parse_time(end_time) if end_time else max(datetime.now(), datetime.utcnow())
+        start = _parse_time(start_time) if start_time else end - timedelta(hours=24)
+        end = end.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        date_strs = []
+        current = datetime(start.year, start.month, start.day)
+        while current < end:
+            date_strs.append(current.strftime("%Y%m%d"))
+            current += timedelta(days=1)
+        days = self._peer_days(date_strs)
+
+        total = RollupBucket()
+        buckets = 0
+        with self._lock:
+            for date_str in date_strs:
+                day = self._days.get(date_str)
+                if day is not None:
+                    days[date_str].append(day)
+            for bucket in self._iter_buckets(start, end, days):
+                total.merge(bucket)
+                buckets += 1
+
+        summary = total.summary()
+        summary["time_range"] = {"start": start.isoformat(), "end": end.isoformat()}
+        summary["buckets_merged"] = buckets
+        return summary
+
+    # ---- 持久化 ----
+
+    def _file_path(self, date_str: str) -> str:
+        """本进程某天的统计文件"""
+        return os.path.join(self.directory, f"{self.file_prefix}{date_str}_w{os.getpid()}.json")
+
+    def _rebuilt_path(self, date_str: str) -> str:
+        """从原始日志重建的统计文件（也是旧版本单文件统计的文件名）"""
+        return os.path.join(self.directory, f"{self.file_prefix}{date_str}.json")
+
+    def _load(self, path: str) -> Optional[_DayRollup]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != ROLLUP_VERSION:
+                return None
+            day = _DayRollup()
+            day.minutes = {key: RollupBucket.from_dict(value) for key, value in data["minutes"].items()}
+            day.hours = {key: RollupBucket.from_dict(value) for key, value in data["hours"].items()}
+            return day
+        except Exception as e:
+            logger.error(f"加载统计文件 {path} 失败: {e}")
+            return None
+
+    def _write(self, path: str, day: _DayRollup) -> bool:
+        try:
+            data = {
+                "version": ROLLUP_VERSION,
+                "minutes": {key: bucket.to_dict() for key, bucket in day.minutes.items()},
+                "hours": {key: bucket.to_dict() for key, bucket in day.hours.items()}
+            }
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.error(f"保存统计文件 {path} 失败: {e}")
+            return False
+
+    def _save_day(self, date_str: str, day: _DayRollup):
+        if day.dirty and self._write(self._file_path(date_str), day):
+            day.dirty = False
+
+    def save(self):
+        """持久化本进程所有有变更的统计"""
+        with self._lock:
+            for date_str, day in list(self._days.items()):
+                self._save_day(date_str, day)
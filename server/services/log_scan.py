@@ -0,0 +1,181 @@
+"""多日日志并行扫描
+
+跨多天的冷查询需要加载（或重建）每个段的索引并解析匹配的记录，单线程执行时
+耗时与天数成正比。已关闭（早于今天）的日志段内容不再变化，查询时按天交给进程池：
+工作进程在各自的段索引上完成时间、级别、路径、状态码和全文检索过滤，只把匹配的
+记录按(时间戳, 序号)倒序返回，主进程对各天的结果做k路归并。
+
+当天写入中的段仍在主进程中查询（主进程的索引已是最新的），扫描全程不持有日志服务的锁。
+gzip归档和还没有索引的已关闭JSONL段直接用字节级扫描器（log_reader）读取，不为一次查询建索引。
+进程池使用spawn方式启动（不复制主进程中的写入线程和锁），首次使用时创建；
+spawn会在工作进程中重新执行主模块，app.py在这种情况下（__mp_main__）不创建应用，
+工作进程启动后不使用继承的信号处理。进程池不可用时退回到主进程中顺序扫描。
+"""
+import heapq
+import logging
+import multiprocessing
+import os
+import re
+import signal
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from services.log_columnar import COLUMNAR_SUFFIX, ColumnarSegment, log_sort_key
+from services.log_index import INDEX_SUFFIX, SegmentIndex
+from services.log_reader import scan_records
+from services.log_search import SearchQuery, SegmentSearchIndex
+
+logger = logging.getLogger("log_scan")
+
+
+# 每个worker进程写自己的日志段：app_logs_YYYYMMDD_w{pid}.jsonl（轮转后追加 _N）
+WORKER_SEGMENT_RE = re.compile(r"_w(\d+)(?:_\d+)?\.jsonl$")
+
+
+def should_scan(path: str, closed: bool, indexed: bool) -> bool:
+    """该段是否直接字节级扫描而不使用段索引
+
+    gzip归档没有段索引；已关闭的JSONL段还没有索引时，为一次查询解析全部记录建索引
+    不划算（该段不久后会被列式压缩替换）。
+    """
+    if path.endswith(".gz"):
+        return True
+    return closed and path.endswith(".jsonl") and not indexed and not os.path.exists(path + INDEX_SUFFIX)
+
+
+def scan_unindexed(path: str, filters: Dict[str, Any],
+                   query: Optional[SearchQuery] = None) -> List[Dict[str, Any]]:
+    """字节级扫描一个段，返回按(时间戳, 序号)倒序排列的匹配日志"""
+    records = scan_records(path, query=query, **filters)
+    records.sort(key=log_sort_key, reverse=True)
+    return records
+
+
+# ---- 工作进程 ----
+
+_MAX_CACHED_SEGMENTS = 64
+# 段路径 -> (文件签名, 段索引, 检索倒排表)；签名变化（追加、列式文件被重写）时重新加载
+_segments: "OrderedDict[str, list]" = OrderedDict()
+
+
+def _segment_index(path: str):
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _segments.get(path)
+    if cached is not None:
+        _segments.move_to_end(path)
+        if cached[0] == signature:
+            return cached
+        if not path.endswith(COLUMNAR_SUFFIX):
+            # JSONL段只追加，补建新增的行即可
+            cached[1].refresh()
+            cached[0] = signature
+            return cached
+    index = ColumnarSegment(path) if path.endswith(COLUMNAR_SUFFIX) else SegmentIndex.load(path)
+    cached = _segments[path] = [signature, index, None]
+    while len(_segments) > _MAX_CACHED_SEGMENTS:
+        _segments.popitem(last=False)
+    return cached
+
+
+def scan_segments(segments: List[str], filters: Dict[str, Any],
+                  query: Optional[SearchQuery] = None) -> List[Dict[str, Any]]:
+    """扫描同一天的多个段，返回按(时间戳, 序号)倒序排列的匹配日志（在工作进程中执行）"""
+    streams = []
+    for path in segments:
+        try:
+            if should_scan(path, True, path in _segments):
+                streams.append(scan_unindexed(path, filters, query))
+                continue
+            cached = _segment_index(path)
+            index = cached[1]
+            rows = index.query(**filters)
+            if query is not None and rows:
+                if cached[2] is None:
+                    cached[2] = SegmentSearchIndex.load(path, index)
+                else:
+                    cached[2].refresh(index)
+                matched = cached[2].search(query)
+                rows = [row for row in rows if row in matched]
+            streams.append(index.read_rows(rows))
+        except Exception as e:
+            logger.error(f"扫描日志文件 {path} 失败: {e}")
+    return list(heapq.merge(*streams, key=log_sort_key, reverse=True))
+
+
+def _init_worker():
+    """工作进程初始化：不使用从主模块继承的信号处理（主进程的处理函数会执行应用的清理逻辑）
+
+    Ctrl+C 会发给整个进程组，工作进程忽略SIGINT，由主进程关闭进程池；SIGTERM恢复默认行为。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+# ---- 主进程 ----
+
+class LogScanPool:
+    """按天分发段扫描任务的进程池"""
+
+    def __init__(self, workers: int = 4, min_days: int = 2):
+        self.workers = min(workers, os.cpu_count() or 1)
+        self.min_days = min_days
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._disabled = self.workers <= 0
+        self.stats = {'tasks': 0, 'fallbacks': 0}
+
+    def worth_using(self, days: int) -> bool:
+        """已关闭的天数达到阈值时才使用进程池（单天查询的进程间传输开销不划算）"""
+        return not self._disabled and days >= self.min_days
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self._executor is None and not self._disabled:
+            try:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+                logger.info(f"日志扫描进程池已创建，进程数 {self.workers}")
+            except (OSError, ValueError) as e:
+                logger.error(f"创建日志扫描进程池失败，改为顺序扫描: {e}")
+                self._disabled = True
+        return self._executor
+
+    def submit(self, segments: List[str], filters: Dict[str, Any],
+               query: Optional[SearchQuery] = None) -> Future:
+        """提交一天的扫描任务；进程池不可用时在当前进程中执行"""
+        executor = self._get_executor()
+        if executor is not None:
+            try:
+                self.stats['tasks'] += 1
+                return executor.submit(scan_segments, segments, filters, query)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # 下次提交时重新创建进程池
+                logger.error(f"日志扫描进程池不可用，本次改为顺序扫描: {e}")
+                self._executor = None
+        self.stats['fallbacks'] += 1
+        future: Future = Future()
+        future.set_result(scan_segments(segments, filters, query))
+        return future
+
+    def result(self, future: Future, segments: List[str], filters: Dict[str, Any],
+               query: Optional[SearchQuery] = None) -> List[Dict[str, Any]]:
+        """取出任务结果；工作进程异常退出时在当前进程中重新扫描"""
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"日志扫描工作进程异常退出，改为顺序扫描: {e}")
+            self._executor = None
+            self.stats['fallbacks'] += 1
+            return scan_segments(segments, filters, query)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'workers': self.workers, 'running': self._executor is not None}
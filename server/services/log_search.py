@@ -0,0 +1,294 @@
+"""日志全文检索
+
+对每个日志段的 message / error / body 字段分词，建立 词 -> 行号 的倒排表，
+保存在旁路文件（app_logs_YYYYMMDD_w{pid}.jsonl.fts、app_logs_YYYYMMDD.col.fts）中。
+行号与段索引（SegmentIndex / ColumnarSegment）一致，检索结果直接与时间、级别、
+路径等条件的行号求交集，再按偏移只读取命中的记录。
+
+日志段只追加，写入中的段在查询时只为新增的行补建倒排表；段关闭（列式压缩）时
+立即为新的列式段建好倒排表并持久化。
+
+分词：英文、数字按单词切分并转为小写，中文按相邻两字切分（如"用户登录"切为
+"用户"、"户登"、"登录"），查询词用同样的方式切分后要求全部出现。
+
+查询语法：
+- 空格分隔的词必须同时出现：``timeout admin``
+- ``OR`` 连接多组条件：``timeout OR 超时``
+- ``-词`` 或 ``NOT 词`` 排除：``error -healthcheck``
+- 双引号内视为一个词组：``"connection reset"``
+"""
+import json
+import logging
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+from services.log_index import _pack, _unpack
+
+logger = logging.getLogger("log_search")
+
+SEARCH_SUFFIX = ".fts"
+SEARCH_VERSION = 1
+SEARCH_FIELDS = ("message", "error", "body")
+MAX_TOKEN_LENGTH = 64
+
+_TOKEN_RE = re.compile(r"[0-9a-z_]+|[\u4e00-\u9fff]+")
+_QUERY_RE = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切分为检索词（英文数字按单词，中文按相邻两字）"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if word[0] < "\u4e00":
+            if len(word) <= MAX_TOKEN_LENGTH:
+                tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def field_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return json.dumps(value, ensure_ascii=False)
+
+
+def entry_tokens(entry: Dict[str, Any]) -> Set[str]:
+    """一条日志中全部可检索的词"""
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        tokens.update(tokenize(field_text(entry.get(field))))
+    return tokens
+
+
+class SearchQuery:
+    """解析后的检索条件：多组（必须出现的词, 排除的词），组之间为OR"""
+
+    def __init__(self, groups: List[tuple]):
+        self.groups = groups
+
+    @classmethod
+    def parse(cls, text: str) -> "SearchQuery":
+        """解析查询字符串，格式错误时抛出ValueError"""
+        groups = []
+        include: List[List[str]] = []
+        exclude: List[List[str]] = []
+        negate_next = False
+        for match in _QUERY_RE.finditer(text or ""):
+            if match.group(3) == "OR":
+                groups.append((include, exclude))
+                include, exclude = [], []
+                continue
+            if match.group(3) == "NOT":
+                negate_next = True
+                continue
+            if match.group(2) is not None:
+                negated, term = bool(match.group(1)), match.group(2)
+            else:
+                term = match.group(3)
+                negated = term.startswith("-") and len(term) > 1
+                if negated:
+                    term = term[1:]
+            tokens = tokenize(term)
+            if tokens:
+                (exclude if negated or negate_next else include).append(tokens)
+            negate_next = False
+        groups.append((include, exclude))
+
+        groups = [group for group in groups if group[0] or group[1]]
+        if not groups:
+            raise ValueError(f"检索条件中没有可检索的词: {text}")
+        for include, _ in groups:
+            if not include:
+                raise ValueError("检索条件的每一组至少需要一个不带排除符号的词")
+        return cls(groups)
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        """判断一条日志是否满足条件（用于内存缓存中的日志）"""
+        tokens = entry_tokens(entry)
+        return self.evaluate(lambda token: {0} if token in tokens else set()) == {0}
+
+    def evaluate(self, lookup: Callable[[str], Iterable[int]]) -> Set[int]:
+        """在倒排表上求值，lookup返回某个词出现的行号"""
+        result: Set[int] = set()
+        for include, exclude in self.groups:
+            terms = [token for tokens in include for token in tokens]
+            postings = sorted((lookup(token) for token in terms), key=len)
+            rows = set(postings[0])
+            for other in postings[1:]:
+                if not rows:
+                    break
+                rows.intersection_update(other)
+            for tokens in exclude:
+                # 排除的词组：所有词都出现才排除
+                if not rows:
+                    break
+                excluded = set(lookup(tokens[0]))
+                for token in tokens[1:]:
+                    excluded.intersection_update(lookup(token))
+                rows.difference_update(excluded)
+            result.update(rows)
+        return result
+
+
+class SegmentSearchIndex:
+    """单个日志段的倒排表"""
+
+    def __init__(self, segment_path: str):
+        self.segment_path = segment_path
+        self.index_path = segment_path + SEARCH_SUFFIX
+        self.indexed_rows = 0
+        self.postings: Dict[str, array] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def _add(self, row: int, texts: Iterable[Any]):
+        tokens = set()
+        for text in texts:
+            tokens.update(tokenize(field_text(text)))
+        for token in tokens:
+            rows = self.postings.get(token)
+            if rows is None:
+                rows = self.postings[token] = array("I")
+            rows.append(row)
+
+    def refresh(self, index, chunk_size: int = 512) -> bool:
+        """为段索引中新增的行补建倒排表，返回是否有新内容"""
+        with self._lock:
+            row_count = index.row_count
+            if row_count < self.indexed_rows:
+                # 段被替换，重建
+                self.__init__(self.segment_path)
+            if row_count == self.indexed_rows:
+                return False
+            start = self.indexed_rows
+            if hasattr(index, "column"):
+                # 列式段只解压检索字段所在的列
+                columns = [index.column(field) for field in SEARCH_FIELDS]
+                for row in range(start, row_count):
+                    self._add(row, (column[row] for column in columns))
+            else:
+                for chunk_start in range(start, row_count, chunk_size):
+                    rows = list(range(chunk_start, min(chunk_start + chunk_size, row_count)))
+                    records = index.read_rows(rows)
+                    if len(records) != len(rows):
+                        records = [(index.read_rows([row]) or [{}])[0] for row in rows]
+                    for row, record in zip(rows, records):
+                        self._add(row, (record.get(field) for field in SEARCH_FIELDS))
+            self.indexed_rows = row_count
+            self.dirty = True
+            return True
+
+    def search(self, query: SearchQuery) -> Set[int]:
+        """返回满足检索条件的行号"""
+        with self._lock:
+            return query.evaluate(lambda token: self.postings.get(token, ()))
+
+    def save(self):
+        """把倒排表写入旁路文件（先写临时文件再原子替换）"""
+        with self._lock:
+            if not self.dirty:
+                return
+            data = {
+                "version": SEARCH_VERSION,
+                "indexed_rows": self.indexed_rows,
+                "postings": {token: _pack(rows) for token, rows in self.postings.items()}
+            }
+            temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.index_path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, segment_path: str, index) -> "SegmentSearchIndex":
+        """加载旁路倒排表（不存在、损坏或与段不一致时新建），并补建新增的行"""
+        search_index = cls(segment_path)
+        if os.path.exists(search_index.index_path):
+            try:
+                with open(search_index.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == SEARCH_VERSION and data["indexed_rows"] <= index.row_count:
+                    search_index.indexed_rows = data["indexed_rows"]
+                    search_index.postings = {
+                        token: _unpack("I", rows) for token, rows in data["postings"].items()
+                    }
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"检索索引 {search_index.index_path} 无效，重建: {e}")
+                search_index = cls(segment_path)
+        search_index.refresh(index)
+        return search_index
+
+
+class LogSearchIndexManager:
+    """管理各日志段倒排表的加载、缓存与持久化"""
+
+    def __init__(self, max_cached: int = 32):
+        self.max_cached = max_cached
+        self._indexes: "OrderedDict[str, SegmentSearchIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, segment_path: str, index) -> SegmentSearchIndex:
+        """获取与段索引同步的倒排表"""
+        with self._lock:
+            search_index = self._indexes.get(segment_path)
+            if search_index is not None:
+                self._indexes.move_to_end(segment_path)
+        if search_index is None:
+            search_index = SegmentSearchIndex.load(segment_path, index)
+            with self._lock:
+                self._indexes[segment_path] = search_index
+                while len(self._indexes) > self.max_cached:
+                    _, evicted = self._indexes.popitem(last=False)
+                    self._save_quietly(evicted)
+        else:
+            search_index.refresh(index)
+        return search_index
+
+    def filter_rows(self, segment_path: str, index, query: SearchQuery, rows: List[int]) -> List[int]:
+        """从段索引的查询结果中保留满足检索条件的行（保持原有顺序）"""
+        if not rows:
+            return rows
+        matched = self.get(segment_path, index).search(query)
+        return [row for row in rows if row in matched]
+
+    def build(self, segment_path: str, index):
+        """段关闭时立即建好倒排表并持久化"""
+        self._save_quietly(self.get(segment_path, index))
+
+    def forget(self, segment_path: str):
+        """段文件被删除或替换时丢弃其倒排表"""
+        with self._lock:
+            self._indexes.pop(segment_path, None)
+        index_path = segment_path + SEARCH_SUFFIX
+        if os.path.exists(index_path):
+            try:
+                os.remove(index_path)
+            except OSError as e:
+                logger.error(f"删除检索索引 {index_path} 失败: {e}")
+
+    def save_all(self):
+        """持久化所有有变更的倒排表"""
+        with self._lock:
+            indexes = list(self._indexes.values())
+        for search_index in indexes:
+            self._save_quietly(search_index)
+
+    @staticmethod
+    def _save_quietly(search_index: SegmentSearchIndex):
+        try:
+            if os.path.exists(search_index.segment_path):
+                search_index.save()
+        except Exception as e:
+            logger.error(f"保存检索索引 {search_index.index_path} 失败: {e}")
@@ -1,18 +1,43 @@
+import atexit
+import base64
+import heapq
+import itertools
 import json
 import os
 import time
 import asyncio
-import gzip
+import glob
 import threading
 import logging
+import shutil
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Iterator, Tuple, Union
 from threading import Lock, Timer
 from collections import defaultdict, deque
 from dataclasses import dataclass, asdict
 from enum import Enum
-import aiofiles
-import psutil
+from config import (
+    LOG_DIR,
+    LOG_QUEUE_MAX_SIZE, LOG_QUEUE_FULL_POLICY, LOG_QUEUE_SAMPLE_RATE,
+    LOG_TAIL_MAX_SUBSCRIBERS, LOG_TAIL_QUEUE_SIZE,
+    LOG_QUERY_CACHE_ENABLED, LOG_QUERY_CACHE_SIZE, LOG_QUERY_CACHE_MAX_BYTES, LOG_QUERY_CACHE_LIVE_TTL,
+    LOG_SCAN_WORKERS, LOG_SCAN_PARALLEL_MIN_DAYS,
+    LOG_RETENTION_POLICIES, LOG_RETENTION_DEFAULT_DAYS, LOG_DISK_BUDGET_BYTES, LOG_DISK_MIN_FREE_BYTES
+)
+from services.log_writer import LogWriter
+from services.log_index import INDEX_SUFFIX, LogIndexManager
+from services.log_columnar import COLUMNAR_SUFFIX, ColumnarSegment, write_columnar
+from services.log_search import SEARCH_SUFFIX, LogSearchIndexManager, SearchQuery
+from services.log_query_cache import LogQueryCache
+from services.log_scan import LogScanPool, WORKER_SEGMENT_RE, log_sort_key, scan_unindexed, should_scan
+from services.log_reader import SegmentScanner, record_matches
+from services.log_retention import RetentionPolicy
+from services.log_rollup import LogRollup
+from services.log_tail import LogTailHub
+from services.latency_tracker import LatencyTracker
+from services.metrics_service import get_metrics_collector
+from services.timeseries_store import TimeSeriesStore
+from utils.file_lock import InterProcessLock
 
 # 配置日志记录器
 logging.basicConfig(
@@ -21,6 +46,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("log_service")
 
+# 相对的日志目录按server目录解析，与启动时的工作目录无关
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 class LogLevel(Enum):
     """日志级别枚举"""
     DEBUG = "DEBUG"
@@ -41,28 +69,46 @@ class LogCategory(Enum):
     PERFORMANCE = "PERFORMANCE"
     SECURITY = "SECURITY"
 
-@dataclass
 class LogEntry:
-    """结构化日志条目"""
-    timestamp: str
-    level: str
-    category: str
-    message: str
-    path: Optional[str] = None
-    method: Optional[str] = None
-    status_code: Optional[int] = None
-    response_time: Optional[float] = None
-    user_id: Optional[str] = None
-    session_id: Optional[str] = None
-    ip_address: Optional[str] = None
-    user_agent: Optional[str] = None
-    error_code: Optional[str] = None
-    stack_trace: Optional[str] = None
-    extra_data: Optional[Dict[str, Any]] = None
-    
+    """结构化日志条目（固定字段，不为每个实例分配__dict__）"""
+
+    __slots__ = ("timestamp", "level", "category", "message", "path", "method", "status_code",
+                 "response_time", "user_id", "session_id", "ip_address", "user_agent", "error_code",
+                 "stack_trace", "extra_data")
+
+    def __init__(self, timestamp: str, level: str, category: str, message: str,
+                 path: Optional[str] = None, method: Optional[str] = None, status_code: Optional[int] = None,
+                 response_time: Optional[float] = None, user_id: Optional[str] = None,
+                 session_id: Optional[str] = None, ip_address: Optional[str] = None,
+                 user_agent: Optional[str] = None, error_code: Optional[str] = None,
+                 stack_trace: Optional[str] = None, extra_data: Optional[Dict[str, Any]] = None):
+        self.timestamp = timestamp
+        self.level = level
+        self.category = category
+        self.message = message
+        self.path = path
+        self.method = method
+        self.status_code = status_code
+        self.response_time = response_time
+        self.user_id = user_id
+        self.session_id = session_id
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.error_code = error_code
+        self.stack_trace = stack_trace
+        self.extra_data = extra_data
+
+    def __repr__(self) -> str:
+        return f"LogEntry({self.to_dict()!r})"
+
     def to_dict(self) -> Dict[str, Any]:
-        """转换为字典格式"""
-        return {k: v for k, v in asdict(self).items() if v is not None}
+        """转换为字典格式（省略空字段；直接读取各字段，不做asdict的递归深拷贝）"""
+        entry = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is not None:
+                entry[name] = value
+        return entry
 
 @dataclass
 class PerformanceMetrics:
@@ -76,10 +122,36 @@ class PerformanceMetrics:
     avg_response_time: float
     timestamp: str
 
+# 写入线程复用同一个编码器（json.dumps带参数时每次调用都会新建JSONEncoder）；
+# 无法序列化的值按str写入，不会让整批写入失败
+_encode_log_line = json.JSONEncoder(ensure_ascii=False, check_circular=False, default=str).encode
+
+
+def encode_log_cursor(log: Dict[str, Any]) -> str:
+    """把日志的排序键编码为不透明的分页游标"""
+    data = json.dumps(list(log_sort_key(log)), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_log_cursor(cursor: str) -> Tuple[str, int]:
+    """解析分页游标，格式错误时抛出ValueError"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, seq = json.loads(data)
+        if not isinstance(timestamp, str) or not isinstance(seq, int):
+            raise ValueError
+        return timestamp, seq
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+
 class OptimizedLogService:
-    def __init__(self):
+    def __init__(self, log_dir: Optional[str] = None, autostart: bool = True):
+        """
+        autostart: 是否立即启动写入线程和定时任务；应用使用的单例由启动事件调用start()
+        """
         # 基础配置
-        self.log_dir = "d:/Xrak/XT-test/server/logs"
+        self.log_dir = os.path.join(SERVER_DIR, log_dir or LOG_DIR)
         os.makedirs(self.log_dir, exist_ok=True)
         self.log_file_prefix = "app_logs_"
         self.performance_file_prefix = "performance_"
@@ -89,50 +161,112 @@ class OptimizedLogService:
         self.flush_interval = 5  # 刷新间隔（秒）
         self.max_cache_size = 2000  # 缓存大小
         self.max_file_size = 50 * 1024 * 1024  # 50MB文件大小限制
-        self.retention_days = 30  # 日志保留天数
+        self.disk_budget_bytes = LOG_DISK_BUDGET_BYTES  # 日志目录磁盘预算
+        self.disk_min_free_bytes = LOG_DISK_MIN_FREE_BYTES  # 磁盘至少保留的可用空间
+        self.compact_interval = 3600  # 列式压缩检查间隔（秒）
+        self.compact_min_age = 600  # 文件最后修改后至少经过多久才压缩（秒）
         
         # 内存数据结构
         self.log_cache = deque(maxlen=self.max_cache_size)
-        self.pending_logs = []
+        self._seq = itertools.count(1)  # 日志序号，与时间戳一起构成分页游标的排序键
+        # 时间戳晚于该值的日志全部在缓存中（服务启动前或已被挤出缓存的日志只在文件中）
+        self._cache_floor = min(datetime.now(), datetime.utcnow()).isoformat()
         self.performance_cache = deque(maxlen=100)
         
+        # 后台写入线程：请求路径只入队，序列化和文件I/O在写入线程中批量完成
+        self.writer = LogWriter(
+            self._write_batch,
+            max_queue_size=LOG_QUEUE_MAX_SIZE,
+            full_policy=LOG_QUEUE_FULL_POLICY,
+            sample_rate=LOG_QUEUE_SAMPLE_RATE,
+            batch_size=self.batch_size,
+            flush_interval=self.flush_interval
+        )
+        
+        # 多worker共用日志目录时，压缩和清理任务通过文件锁互斥
+        self._maintenance_lock = InterProcessLock(os.path.join(self.log_dir, ".maintenance.lock"))
+        
+        # 声明式保留策略（按级别、分类、路径决定保留天数和采样）与磁盘预算
+        self.retention = RetentionPolicy.from_config(LOG_RETENTION_POLICIES, LOG_RETENTION_DEFAULT_DAYS)
+        self.retention_stats = {'rows_dropped': 0, 'days_deleted': 0, 'budget_evictions': 0, 'dropped_over_budget': 0}
+        self._disk_usage = self._directory_size()  # 日志目录占用的估计值（预算检查时重新统计，写入时累加）
+        self._over_budget = False  # 删除全部已关闭的日志后仍超出预算，只写入WARNING及以上级别
+        self._budget_check_pending = False
+        
+        # 日志段索引（按偏移定位记录，查询不再逐行解析整个文件）
+        self.index_manager = LogIndexManager()
+        
+        # 全文检索倒排表（message/error/body分词，行号与段索引一致）
+        self.search_index = LogSearchIndexManager()
+        
+        # 多日冷查询按天并行扫描已关闭的段（进程池首次使用时创建）
+        self.scan_pool = LogScanPool(workers=LOG_SCAN_WORKERS, min_days=LOG_SCAN_PARALLEL_MIN_DAYS)
+        
+        # 查询结果缓存（按查询参数和段版本缓存get_logs/get_logs_page的结果）
+        self.query_cache = LogQueryCache(
+            max_entries=LOG_QUERY_CACHE_SIZE,
+            max_memory_bytes=LOG_QUERY_CACHE_MAX_BYTES,
+            live_ttl=LOG_QUERY_CACHE_LIVE_TTL,
+            enabled=LOG_QUERY_CACHE_ENABLED
+        )
+        
+        # 按分钟/小时预聚合的日志统计，/api/logs/stats直接合并统计桶
+        self.rollup = LogRollup(self.log_dir, backfill=self._iter_day_records)
+        
+        # 按路由、状态码类别的响应时间分位数（多worker通过文件合并）
+        self.latency = LatencyTracker(self.log_dir)
+        
+        # 日志实时推送（WebSocket订阅者按条件接收新日志）
+        self.tail = LogTailHub(max_subscribers=LOG_TAIL_MAX_SUBSCRIBERS, max_queue_size=LOG_TAIL_QUEUE_SIZE)
+        
+        # 系统指标采集器（按分辨率采样，性能监控任务每分钟汇总一次）
+        self.system_metrics = get_metrics_collector()
+        
+        # 性能指标时序存储（raw/1m/1h三级精度，替代逐行解析performance_*.jsonl）
+        self.perf_store = TimeSeriesStore(self.log_dir)
+        
         # 性能监控指标
         self.metrics = {
             'total_logs': 0,
             'logs_per_level': defaultdict(int),
             'logs_per_category': defaultdict(int),
-            'avg_response_times': deque(maxlen=1000),
-            'error_rates': deque(maxlen=100),
-            'request_counts': deque(maxlen=100)
+            'error_rates': deque(maxlen=100)
         }
         
         # 线程安全
         self.lock = Lock()
-        self.flush_timer: Optional[Timer] = None
+        self._timers: Dict[str, Timer] = {}
+        self._shutdown_hooks: List = []
+        self._started = False
         self._shutdown = False
         
-        # 启动定期任务
-        self._start_flush_timer()
-        self._start_performance_monitor()
-        self._start_cleanup_timer()
+        if autostart:
+            self.start()
         
         logger.info("优化日志服务已初始化")
 
-    def _start_flush_timer(self):
-        """启动定期刷新定时器"""
-        def flush_task():
-            if not self._shutdown:
-                try:
-                    self._flush_pending_logs()
-                except Exception as e:
-                    logger.error(f"定期刷新任务失败: {e}")
-                finally:
-                    if not self._shutdown:
-                        self.flush_timer = Timer(self.flush_interval, flush_task)
-                        self.flush_timer.start()
-        
-        self.flush_timer = Timer(self.flush_interval, flush_task)
-        self.flush_timer.start()
+    def start(self):
+        """启动写入线程和定期任务（重复调用无效）"""
+        with self.lock:
+            if self._started or self._shutdown:
+                return
+            self._started = True
+        self.writer.start()
+        if self.perf_store.is_empty:
+            self._import_legacy_performance()
+        self.system_metrics.disk_path = self.log_dir
+        self.system_metrics.start()
+        # 未经过应用关闭事件退出时（如脚本直接使用）仍保证写完队列
+        atexit.register(self.shutdown)
+        self._start_performance_monitor()
+        self._start_cleanup_timer()
+        self._start_compaction_timer()
+        self._start_rollup_timer()
+        logger.info("日志服务已启动")
+
+    def add_shutdown_hook(self, hook):
+        """注册关闭前执行的回调（在写入线程停止之前执行，可继续调用save_log）"""
+        self._shutdown_hooks.append(hook)
 
     def _start_performance_monitor(self):
         """启动性能监控"""
@@ -144,47 +278,81 @@ class OptimizedLogService:
                     logger.error(f"性能监控任务失败: {e}")
                 finally:
                     if not self._shutdown:
-                        Timer(60, monitor_task).start()  # 每分钟收集一次
+                        self._schedule('monitor', 60, monitor_task)  # 每分钟收集一次
         
-        Timer(60, monitor_task).start()
+        self._schedule('monitor', 60, monitor_task)
 
     def _start_cleanup_timer(self):
         """启动清理定时器"""
         def cleanup_task():
             if not self._shutdown:
                 try:
-                    self._cleanup_old_logs()
-                    self._rotate_large_files()
+                    self.apply_retention()
+                    self.index_manager.save_all()
+                    self.search_index.save_all()
+                    self.perf_store.prune()
                 except Exception as e:
                     logger.error(f"清理任务失败: {e}")
                 finally:
                     if not self._shutdown:
-                        Timer(24 * 3600, cleanup_task).start()  # 每天执行一次
+                        self._schedule('cleanup', 24 * 3600, cleanup_task)  # 每天执行一次
+        
+        self._schedule('cleanup', 300, cleanup_task)  # 启动五分钟后先执行一次
+    
+    def _start_compaction_timer(self):
+        """启动列式压缩定时器"""
+        def compaction_task():
+            if not self._shutdown:
+                try:
+                    self.compact_closed_segments()
+                    self.enforce_disk_budget()
+                except Exception as e:
+                    logger.error(f"列式压缩任务失败: {e}")
+                finally:
+                    if not self._shutdown:
+                        self._schedule('compaction', self.compact_interval, compaction_task)
+        
+        self._schedule('compaction', 60, compaction_task)  # 启动一分钟后先执行一次
+    
+    def _start_rollup_timer(self):
+        """启动统计持久化定时器"""
+        def rollup_task():
+            if not self._shutdown:
+                try:
+                    self.rollup.save()
+                    self.latency.save()
+                except Exception as e:
+                    logger.error(f"保存日志统计失败: {e}")
+                finally:
+                    if not self._shutdown:
+                        self._schedule('rollup', 60, rollup_task)  # 每分钟持久化一次
         
-        Timer(24 * 3600, cleanup_task).start()
+        self._schedule('rollup', 60, rollup_task)
+    
+    def _schedule(self, name: str, interval: float, task):
+        """调度定时任务并记录句柄，关闭时统一取消"""
+        timer = Timer(interval, task)
+        timer.daemon = True
+        self._timers[name] = timer
+        timer.start()
 
     def _collect_performance_metrics(self):
-        """收集性能指标"""
+        """汇总最近一分钟的系统指标样本"""
         try:
-            # 系统性能指标
-            cpu_usage = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage(self.log_dir)
-            
-            # 应用性能指标
-            with self.lock:
-                request_count = sum(self.metrics['request_counts']) if self.metrics['request_counts'] else 0
-                error_count = sum(self.metrics['error_rates']) if self.metrics['error_rates'] else 0
-                avg_response_time = sum(self.metrics['avg_response_times']) / len(self.metrics['avg_response_times']) if self.metrics['avg_response_times'] else 0
+            summary = self.system_metrics.summarize(60)
+            if summary is None:
+                # 采集线程未运行时直接采样一次（非阻塞）
+                self.system_metrics.sample()
+                summary = self.system_metrics.summarize(self.system_metrics.resolution)
             
             metrics = PerformanceMetrics(
-                cpu_usage=cpu_usage,
-                memory_usage=memory.percent,
-                disk_usage=disk.percent,
-                active_connections=0,  # 需要从其他服务获取
-                request_count=request_count,
-                error_count=error_count,
-                avg_response_time=avg_response_time,
+                cpu_usage=summary['cpu_percent'],
+                memory_usage=summary['memory_percent'],
+                disk_usage=summary['disk_percent'] or 0.0,
+                active_connections=summary['active_connections'],
+                request_count=summary['requests'],
+                error_count=summary['errors'],
+                avg_response_time=summary['avg_response_time_ms'],
                 timestamp=datetime.utcnow().isoformat()
             )
             
@@ -195,19 +363,35 @@ class OptimizedLogService:
             logger.error(f"收集性能指标失败: {e}")
 
     def _save_performance_metrics(self, metrics: PerformanceMetrics):
-        """保存性能指标"""
+        """保存性能指标到时序存储"""
         try:
-            today = datetime.now().strftime("%Y%m%d")
-            perf_file = os.path.join(self.log_dir, f"{self.performance_file_prefix}{today}.jsonl")
-            
-            with open(perf_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(asdict(metrics), ensure_ascii=False) + "\n")
-                
+            self.perf_store.add(metrics.timestamp, asdict(metrics))
         except Exception as e:
             logger.error(f"保存性能指标失败: {e}")
 
-    def save_log(self, log_entry: Dict[str, Any]):
-        """保存日志条目（优化版本）"""
+    def _import_legacy_performance(self):
+        """把旧版本写入的performance_*.jsonl/.col导入时序存储（存储为空时执行一次）"""
+        try:
+            end_time = datetime.utcnow()
+            start_time = end_time - timedelta(days=365)
+            metrics = self._load_performance_from_files(start_time, end_time)
+            metrics.sort(key=lambda m: m.timestamp)
+            count = self.perf_store.import_samples((m.timestamp, asdict(m)) for m in metrics)
+            if count:
+                self.perf_store.prune()
+                logger.info(f"已导入 {count} 条历史性能指标（丢弃重复 {len(metrics) - count} 条）")
+        except Exception as e:
+            logger.error(f"导入历史性能指标失败: {e}")
+
+    def save_log(self, log_entry: Union[Dict[str, Any], LogEntry], record_stats: bool = True):
+        """保存日志条目（优化版本）
+
+        record_stats为False时不计入分钟/小时统计（调用方已通过record_stats单独计入）；
+        LogEntry在这里转换为字典，序列化由写入线程完成
+        """
+        if isinstance(log_entry, LogEntry):
+            log_entry = log_entry.to_dict()
+        
         # 标准化日志条目
         if isinstance(log_entry, dict):
             # 确保必要字段存在
@@ -217,195 +401,462 @@ class OptimizedLogService:
                 log_entry['level'] = LogLevel.INFO.value
             if 'category' not in log_entry:
                 log_entry['category'] = LogCategory.SYSTEM.value
+            if 'seq' not in log_entry:
+                log_entry['seq'] = next(self._seq)
         
+        level = log_entry.get('level', 'UNKNOWN')
         with self.lock:
-            # 添加到缓存
+            # 添加到缓存（缓存已满时最旧的一条被挤出，记录缓存覆盖的起点）
+            if len(self.log_cache) == self.log_cache.maxlen:
+                evicted = str(self.log_cache[0].get('timestamp', ''))
+                if evicted > self._cache_floor:
+                    self._cache_floor = evicted
             self.log_cache.append(log_entry)
             
-            # 添加到待写入队列
-            self.pending_logs.append(log_entry)
-            
             # 更新统计指标
             self.metrics['total_logs'] += 1
             self.metrics['logs_per_level'][log_entry.get('level', 'UNKNOWN')] += 1
             self.metrics['logs_per_category'][log_entry.get('category', 'UNKNOWN')] += 1
             
-            # 记录响应时间
-            if 'response_time' in log_entry and log_entry['response_time'] is not None:
-                self.metrics['avg_response_times'].append(log_entry['response_time'])
-            
             # 记录错误
-            if log_entry.get('level') in ['ERROR', 'CRITICAL']:
+            if level in ['ERROR', 'CRITICAL']:
                 self.metrics['error_rates'].append(1)
-            
-            # 如果达到批量大小，立即刷新
-            if len(self.pending_logs) >= self.batch_size:
-                self._flush_pending_logs()
+        
+        # 增量更新分钟/小时统计
+        if record_stats:
+            self.rollup.add(log_entry)
+        
+        # 推送给实时订阅者（没有订阅者时直接返回）
+        self.tail.publish(log_entry)
+        
+        # 交给写入线程，达到批量大小时由写入线程立即组提交
+        self.writer.put(log_entry, important=str(level).upper() in ('ERROR', 'CRITICAL'))
+
+    def record_stats(self, log_entry: Dict[str, Any]):
+        """只把日志计入分钟/小时统计而不写入（用于被采样或合并掉的请求日志）"""
+        self.rollup.add(log_entry)
 
     def save_structured_log(self, level: LogLevel, category: LogCategory, message: str, **kwargs):
         """保存结构化日志"""
-        log_entry = LogEntry(
-            timestamp=datetime.utcnow().isoformat(),
-            level=level.value,
-            category=category.value,
-            message=message,
-            **kwargs
-        )
-        self.save_log(log_entry.to_dict())
+        self.save_log(LogEntry(datetime.utcnow().isoformat(), level.value, category.value, message, **kwargs))
 
-    def _flush_pending_logs(self):
-        """刷新待写入的日志"""
-        with self.lock:
-            if not self.pending_logs:
-                return
-            
-            logs_to_write = self.pending_logs.copy()
-            self.pending_logs.clear()
+    def _worker_segment(self, date: str) -> str:
+        """本进程某天写入中的日志段（按写入时的pid命名，fork出的worker各写各的文件）"""
+        return os.path.join(self.log_dir, f"{self.log_file_prefix}{date}_w{os.getpid()}.jsonl")
+
+    def _is_peer_segment(self, file_path: str) -> bool:
+        """是否为其他worker进程写入的日志段（包括其轮转段）"""
+        match = WORKER_SEGMENT_RE.search(os.path.basename(file_path))
+        return match is not None and int(match.group(1)) != os.getpid()
+
+    def _write_batch(self, logs_to_write: List[Dict]):
+        """写入一批日志（在写入线程中执行，按日期分组，每个文件一次写入）
+
+        多worker部署时每个进程只追加自己的段文件，不同进程的写入不会交错；
+        每批用O_APPEND一次写入完整的行，读取方（段索引）只索引以换行结尾的完整行。
+        段超过大小上限时在本批写完后封存（重命名为编号段），下一批写入新的段。
+        """
+        if self._over_budget:
+            # 删除全部已关闭的日志后仍超出磁盘预算：只写入WARNING及以上级别
+            kept = [log for log in logs_to_write
+                    if str(log.get('level', '')).upper() in ('WARNING', 'ERROR', 'CRITICAL')]
+            self.retention_stats['dropped_over_budget'] += len(logs_to_write) - len(kept)
+            logs_to_write = kept
         
-        try:
-            # 按日期分组
-            logs_by_date = defaultdict(list)
-            for log in logs_to_write:
-                timestamp = log.get('timestamp', datetime.utcnow().isoformat())
-                date = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).strftime("%Y%m%d")
-                logs_by_date[date].append(log)
-            
-            # 批量写入每个日期的日志
-            for date, logs in logs_by_date.items():
-                log_file = os.path.join(self.log_dir, f"{self.log_file_prefix}{date}.jsonl")
-                
-                with open(log_file, "a", encoding="utf-8") as f:
-                    for log in logs:
-                        f.write(json.dumps(log, ensure_ascii=False) + "\n")
-            
-            logger.debug(f"批量写入 {len(logs_to_write)} 条日志")
-            
-        except Exception as e:
-            logger.error(f"批量写入日志失败: {e}")
-            # 如果写入失败，将日志重新加入队列
-            with self.lock:
-                self.pending_logs.extend(logs_to_write)
+        # 按日期分组并序列化（每条日志只在这里序列化一次）
+        lines_by_date = defaultdict(list)
+        for log in logs_to_write:
+            timestamp = log.get('timestamp') or datetime.utcnow().isoformat()
+            date = timestamp[:10].replace('-', '')
+            lines_by_date[date].append(_encode_log_line(log))
+        
+        # 组提交：每个日期文件只打开并写入一次
+        for date, lines in lines_by_date.items():
+            segment = self._worker_segment(date)
+            data = memoryview(("\n".join(lines) + "\n").encode("utf-8"))
+            self._disk_usage += len(data)
+            fd = os.open(segment, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                while data:
+                    data = data[os.write(fd, data):]
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size > self.max_file_size:
+                self._seal_segment(segment)
+        
+        if self._disk_usage > self.disk_budget_bytes:
+            self._request_budget_check()
+        logger.debug(f"批量写入 {len(logs_to_write)} 条日志")
 
-    async def _async_flush_logs(self, logs_to_write: List[Dict]):
-        """异步刷新日志"""
+    def _seal_segment(self, file_path: str):
+        """把写满的段重命名为编号段（在写入线程中两批写入之间执行，不会改名正在写入的文件）
+
+        只有本进程写入自己的段；封存失败（如Windows上文件正被读取）时下一批写入后重试。
+        """
         try:
-            # 按日期分组
-            logs_by_date = defaultdict(list)
-            for log in logs_to_write:
-                timestamp = log.get('timestamp', datetime.utcnow().isoformat())
-                date = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).strftime("%Y%m%d")
-                logs_by_date[date].append(log)
-            
-            # 异步批量写入
-            for date, logs in logs_by_date.items():
-                log_file = os.path.join(self.log_dir, f"{self.log_file_prefix}{date}.jsonl")
-                
-                async with aiofiles.open(log_file, "a", encoding="utf-8") as f:
-                    for log in logs:
-                        await f.write(json.dumps(log, ensure_ascii=False) + "\n")
-            
-            logger.debug(f"异步批量写入 {len(logs_to_write)} 条日志")
-            
-        except Exception as e:
-            logger.error(f"异步批量写入日志失败: {e}")
+            base = file_path[:-len('.jsonl')]
+            number = 1
+            while os.path.exists(f"{base}_{number}.jsonl"):
+                number += 1
+            os.replace(file_path, f"{base}_{number}.jsonl")
+            self._forget_segment(file_path)
+            logger.info(f"封存日志段: {os.path.basename(file_path)} -> {os.path.basename(base)}_{number}.jsonl")
+        except OSError as e:
+            logger.error(f"封存日志段 {file_path} 失败: {e}")
 
-    def get_logs(self, start_time=None, end_time=None, level=None, category=None, path=None, limit=100, offset=0):
-        """查询日志（优化版本）"""
+    def _request_budget_check(self):
+        """写入量超出磁盘预算估计值时在后台线程中检查预算（不阻塞写入线程）"""
+        if self._over_budget or self._budget_check_pending:
+            return
+        self._budget_check_pending = True
+
+        def check():
+            try:
+                self.enforce_disk_budget()
+            except Exception as e:
+                logger.error(f"检查日志磁盘预算失败: {e}")
+            finally:
+                self._budget_check_pending = False
+
+        threading.Thread(target=check, name="log-budget", daemon=True).start()
+
+    def get_logs(self, start_time=None, end_time=None, level=None, category=None, path=None,
+                 limit=100, offset=0, status_code=None, q=None):
+        """查询日志（相同的查询在段版本不变时直接返回缓存结果）"""
+        params = self._query_params(start_time=start_time, end_time=end_time, level=level, category=category,
+                                    path=path, status_code=status_code, q=q, limit=limit, offset=offset)
+        live, version = self._query_version(start_time, end_time, level, category, path, status_code, q)
+        key = self.query_cache.make_key("logs", params, version)
+        result = self.query_cache.get(key)
+        if result is None:
+            result = self._get_logs(start_time, end_time, level, category, path, limit, offset, status_code, q)
+            self.query_cache.set(key, result, live)
+        return result
+
+    def _get_logs(self, start_time=None, end_time=None, level=None, category=None, path=None,
+                  limit=100, offset=0, status_code=None, q=None):
+        """查询日志（优化版本）
+
+        内存缓存只在锁内做一次快照；开始时间落在缓存覆盖范围内时只查缓存和其他worker的段，
+        否则历史日志通过段索引定位，只读取匹配的记录，排序和过滤都在锁外完成。
+        q: 全文检索条件（语法见services/log_search.py），由倒排表求出命中的行，格式错误时抛出ValueError
+        """
+        query = SearchQuery.parse(q) if q else None
         with self.lock:
             # 从缓存获取最新日志
-            logs = list(self.log_cache)
-            
-            # 如果需要更多历史日志，从文件加载
-            if start_time or offset > len(logs):
-                file_logs = self._load_logs_from_files(start_time, end_time)
-                logs.extend(file_logs)
-            
-            # 去重并排序
-            unique_logs = {}
-            for log in logs:
-                key = f"{log.get('timestamp', '')}_{log.get('message', '')}"
-                if key not in unique_logs:
-                    unique_logs[key] = log
-            
-            logs = list(unique_logs.values())
-            logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-            
-            # 应用过滤条件
-            filtered_logs = self._filter_logs(logs, start_time, end_time, level, category, path)
-            
-            # 应用分页
-            total = len(filtered_logs)
-            paginated_logs = filtered_logs[offset:offset + limit]
-            
-            return {
-                "total": total,
-                "logs": paginated_logs,
-                "metrics": self._get_log_metrics(filtered_logs)
-            }
+            cached_logs = list(self.log_cache)
+            cache_covers = self._cache_covers(start_time)
+            cache_floor = self._cache_floor
+        
+        logs = self._filter_logs(cached_logs, start_time, end_time, level, category, path, status_code, query)
+        
+        # 如果需要更多历史日志（或全文检索），通过索引从文件查询
+        if not cache_covers and (start_time or query or offset > len(cached_logs)):
+            logs.extend(self._query_log_files(start_time, end_time, level, category, path, status_code,
+                                              query=query))
+        else:
+            # 缓存中只有本进程的日志，同一时间窗口内其他worker的日志从它们的段中读取
+            logs.extend(self._query_log_files(start_time or cache_floor, end_time, level, category, path,
+                                              status_code, peers_only=True, query=query))
+        
+        # 去重并排序（缓存中的日志可能已写入文件）
+        unique_logs = {}
+        for log in logs:
+            key = f"{log.get('timestamp', '')}_{log.get('message', '')}"
+            if key not in unique_logs:
+                unique_logs[key] = log
+        
+        filtered_logs = list(unique_logs.values())
+        filtered_logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        
+        # 应用分页
+        total = len(filtered_logs)
+        paginated_logs = filtered_logs[offset:offset + limit]
+        
+        return {
+            "total": total,
+            "logs": paginated_logs,
+            "metrics": self._get_log_metrics(filtered_logs)
+        }
 
-    def _load_logs_from_files(self, start_time=None, end_time=None) -> List[Dict]:
-        """从文件加载日志"""
-        logs = []
+    def get_logs_page(self, start_time=None, end_time=None, level=None, category=None, path=None,
+                      status_code=None, limit=100, cursor: Optional[str] = None,
+                      q: Optional[str] = None) -> Dict[str, Any]:
+        """按游标分页查询日志（键集分页）
+
+        游标记录上一页最后一条日志的(时间戳, 序号)，下一页从它之后继续读取，
+        翻到第几页的开销都只与limit有关，不再与偏移量成正比。
+        """
+        before = decode_log_cursor(cursor) if cursor else None
+        params = self._query_params(start_time=start_time, end_time=end_time, level=level, category=category,
+                                    path=path, status_code=status_code, q=q, limit=limit, cursor=cursor)
+        live, version = self._query_version(start_time, end_time, level, category, path, status_code, q)
+        key = self.query_cache.make_key("page", params, version)
+        result = self.query_cache.get(key)
+        if result is not None:
+            return result
         
-        # 确定日期范围
+        logs = list(itertools.islice(
+            self.iter_logs(start_time, end_time, level, category, path, status_code, before=before, q=q),
+            limit + 1
+        ))
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+        result = {
+            "logs": logs,
+            "next_cursor": encode_log_cursor(logs[-1]) if has_more else None
+        }
+        self.query_cache.set(key, result, live)
+        return result
+
+    @staticmethod
+    def _query_params(**params) -> Dict[str, Any]:
+        """规范化查询参数（级别不区分大小写，检索词合并空白），相同含义的查询使用同一缓存键"""
+        if params.get("level"):
+            params["level"] = params["level"].upper()
+        if params.get("q"):
+            params["q"] = " ".join(params["q"].split())
+        return params
+
+    def _query_version(self, start_time=None, end_time=None, level=None, category=None, path=None,
+                       status_code=None, q=None) -> Tuple[bool, List]:
+        """查询涉及的段版本，返回(是否涉及当天的数据, 版本)
+
+        版本由时间范围内各段的(文件名, 大小, 修改时间)组成。涉及当天时本进程写入中的段
+        不计入（写入其中的日志都先经过内存缓存），改为计入内存缓存中与查询匹配的日志
+        （条数、最早和最新的排序键）：不匹配的新日志（例如/api/logs请求本身的日志）不会使结果失效。
+        """
+        today = min(datetime.now(), datetime.utcnow()).strftime("%Y-%m-%d")
+        live = not end_time or end_time >= today
+        own_suffix = f"_w{os.getpid()}.jsonl"
+        version: List[Any] = []
+        for segment in self._log_segments(start_time, end_time):
+            if live and segment.endswith(own_suffix):
+                continue
+            try:
+                stat = os.stat(segment)
+            except OSError:
+                continue
+            version.append((os.path.basename(segment), stat.st_size, stat.st_mtime_ns))
+        if live:
+            with self.lock:
+                cached_logs = list(self.log_cache)
+            query = SearchQuery.parse(q) if q else None
+            matched = self._filter_logs(cached_logs, start_time, end_time, level, category, path,
+                                        status_code, query)
+            if matched:
+                version.append(("cache", len(matched), log_sort_key(matched[0]), log_sort_key(matched[-1])))
+            else:
+                # 缓存中没有匹配的日志时，匹配的日志可能刚被挤出缓存、只在本进程的段中
+                for segment in self._log_segments(start_time, end_time):
+                    if segment.endswith(own_suffix) and os.path.exists(segment):
+                        version.append((os.path.basename(segment), os.path.getsize(segment)))
+        return live, version
+
+    def iter_logs(self, start_time=None, end_time=None, level=None, category=None, path=None,
+                  status_code=None, before: Optional[Tuple[str, int]] = None,
+                  release_segments: bool = False, q: Optional[str] = None) -> Iterator[Dict]:
+        """按(时间戳, 序号)倒序逐条产出匹配的日志，不物化整个结果集
+
+        before: 只返回排序键小于它的日志（分页游标）
+        release_segments: 段索引不放入缓存、读完一个段后释放其解压缓存，用于全量导出时保持内存平稳
+        q: 全文检索条件，结果同样按时间倒序（最新的在前）
+        """
+        query = SearchQuery.parse(q) if q else None
+        if before and (not end_time or before[0] < end_time):
+            end_time = before[0]
+        
+        with self.lock:
+            cached_logs = list(self.log_cache)
+            cache_covers = self._cache_covers(start_time)
+        cached_logs = self._filter_logs(cached_logs, start_time, end_time, level, category, path,
+                                        status_code, query)
+        cached_logs.sort(key=log_sort_key, reverse=True)
+        if cache_covers:
+            # 只需补上其他worker的日志
+            file_logs = self._iter_log_files(start_time, end_time, level, category, path,
+                                             status_code, release_segments, peers_only=True, query=query)
+        else:
+            cached_keys = {log_sort_key(log) for log in cached_logs}
+            file_logs = (
+                log for log in self._iter_log_files(start_time, end_time, level, category, path,
+                                                     status_code, release_segments, query=query)
+                if log_sort_key(log) not in cached_keys
+            )
+        for log in heapq.merge(cached_logs, file_logs, key=log_sort_key, reverse=True):
+            if before and log_sort_key(log) >= before:
+                continue
+            yield log
+
+    def _cache_covers(self, start_time=None) -> bool:
+        """开始时间之后的日志是否全部在缓存中（调用方需持有锁）"""
+        return bool(start_time) and start_time > self._cache_floor
+
+    def _iter_log_files(self, start_time=None, end_time=None, level=None, category=None, path=None,
+                        status_code=None, release_segments=False, chunk_size=256,
+                        peers_only=False, query: Optional[SearchQuery] = None) -> Iterator[Dict]:
+        """按日期倒序遍历日志段，同一天的多个段（含各worker的段）归并后按块读取
+
+        已关闭的天数较多时交给扫描进程池，最多同时预取与进程数相同的天数，
+        调用方提前停止读取时取消尚未开始的任务。全量导出（release_segments）仍在
+        本进程中通过段索引逐块读取，索引不放入缓存，内存占用不随导出的天数和单天的结果量增长。
+        """
+        days = list(reversed(self._segments_by_date(start_time, end_time, peers_only)))
+        filters = self._scan_filters(start_time, end_time, level, category, path, status_code)
+        # 全量导出不交给进程池，也不做字节级扫描（两者都按段整体返回结果）
+        closed = self._closed_days(days) if not release_segments else []
+        closed_dates = {date_str for date_str, _ in closed}
+        if not self.scan_pool.worth_using(len(closed)):
+            closed = []
+        pending = iter(closed)
+        in_flight: Dict[str, Tuple[List[str], Any]] = {}
+        
+        def prefetch():
+            while len(in_flight) < self.scan_pool.workers:
+                day = next(pending, None)
+                if day is None:
+                    return
+                in_flight[day[0]] = (day[1], self.scan_pool.submit(day[1], filters, query))
+        
+        try:
+            prefetch()
+            for date_str, segments in days:
+                if date_str in in_flight:
+                    segments, future = in_flight.pop(date_str)
+                    prefetch()
+                    yield from self.scan_pool.result(future, segments, filters, query)
+                    continue
+                streams = []
+                for log_file in segments:
+                    try:
+                        streams.append(self._query_segment(log_file, filters, query, date_str in closed_dates,
+                                                           chunk_size, release_segments))
+                    except Exception as e:
+                        logger.error(f"查询日志文件 {log_file} 失败: {e}")
+                yield from heapq.merge(*streams, key=log_sort_key, reverse=True)
+        finally:
+            for _, future in in_flight.values():
+                future.cancel()
+
+    def _query_segment(self, log_file: str, filters: Dict[str, Any], query: Optional[SearchQuery],
+                       closed: bool, chunk_size: int = 256, release: bool = False) -> Iterator[Dict]:
+        """单个段中匹配的日志（按时间倒序）：通过段索引只读取匹配的行，
+        gzip归档和还没有索引的已关闭段改为字节级扫描"""
+        if should_scan(log_file, closed, self.index_manager.is_cached(log_file)):
+            return iter(scan_unindexed(log_file, filters, query))
+        # 全量导出逐段读取一次，索引不放入缓存，读完即可回收
+        index = self.index_manager.get(log_file, cache=not release)
+        rows = index.query(**filters)
+        if query is not None:
+            rows = self.search_index.filter_rows(log_file, index, query, rows)
+        return self._iter_segment_rows(index, rows, chunk_size, release)
+
+    @staticmethod
+    def _iter_segment_rows(index, rows: List[int], chunk_size: int, release: bool) -> Iterator[Dict]:
+        """分块读取段中的指定行"""
+        for i in range(0, len(rows), chunk_size):
+            yield from index.read_rows(rows[i:i + chunk_size])
+        if release and hasattr(index, "release"):
+            index.release()
+
+    def _date_range(self, start_time=None, end_time=None) -> List[str]:
+        """时间范围覆盖的日期（YYYYMMDD，升序）"""
         if start_time:
             start_date = datetime.fromisoformat(start_time.replace('Z', '+00:00')).date()
         else:
-            start_date = datetime.now().date() - timedelta(days=7)  # 默认加载最近7天
+            start_date = datetime.now().date() - timedelta(days=7)  # 默认查询最近7天
         
         if end_time:
             end_date = datetime.fromisoformat(end_time.replace('Z', '+00:00')).date()
         else:
             end_date = datetime.now().date()
         
-        # 加载指定日期范围的日志文件
+        dates = []
         current_date = start_date
         while current_date <= end_date:
-            date_str = current_date.strftime("%Y%m%d")
-            log_file = os.path.join(self.log_dir, f"{self.log_file_prefix}{date_str}.jsonl")
-            
-            if os.path.exists(log_file):
-                try:
-                    with open(log_file, "r", encoding="utf-8") as f:
-                        for line in f:
-                            try:
-                                log = json.loads(line.strip())
-                                logs.append(log)
-                            except json.JSONDecodeError:
-                                continue
-                except Exception as e:
-                    logger.error(f"读取日志文件 {log_file} 失败: {e}")
-            
+            dates.append(current_date.strftime("%Y%m%d"))
             current_date += timedelta(days=1)
-        
-        return logs
+        return dates
+
+    def _segments_by_date(self, start_time=None, end_time=None,
+                          peers_only=False) -> List[Tuple[str, List[str]]]:
+        """时间范围内每天的日志段（日期升序，跳过没有段的日期）"""
+        days = []
+        for date_str in self._date_range(start_time, end_time):
+            segments = self._segments_for_date(self.log_file_prefix, date_str)
+            if peers_only:
+                segments = [segment for segment in segments if self._is_peer_segment(segment)]
+            if segments:
+                days.append((date_str, segments))
+        return days
+
+    @staticmethod
+    def _closed_days(days: List[Tuple[str, List[str]]]) -> List[Tuple[str, List[str]]]:
+        """其中已关闭（早于今天、不再写入）的日期"""
+        today = min(datetime.now(), datetime.utcnow()).strftime("%Y%m%d")
+        return [day for day in days if day[0] < today]
+
+    @staticmethod
+    def _scan_filters(start_time=None, end_time=None, level=None, category=None, path=None,
+                      status_code=None) -> Dict[str, Any]:
+        """段索引query的过滤条件（可传给扫描进程）"""
+        return {
+            "start_time": start_time, "end_time": end_time, "level": level,
+            "category": category, "path": path, "status_code": status_code
+        }
+
+    def _log_segments(self, start_time=None, end_time=None, peers_only=False) -> List[str]:
+        """列出时间范围内的日志段文件（peers_only: 只列出其他worker的段）"""
+        segments = []
+        for date_str in self._date_range(start_time, end_time):
+            segments.extend(self._segments_for_date(self.log_file_prefix, date_str))
+        if peers_only:
+            segments = [segment for segment in segments if self._is_peer_segment(segment)]
+        return segments
 
-    def _filter_logs(self, logs: List[Dict], start_time=None, end_time=None, level=None, category=None, path=None) -> List[Dict]:
-        """过滤日志"""
-        filtered_logs = []
+    def _segments_for_date(self, prefix: str, date_str: str) -> List[str]:
+        """某一天的全部可查询段：列式段、各worker（轮转后）的JSONL段以及尚未压缩的gzip归档"""
+        pattern = os.path.join(glob.escape(self.log_dir), f"{prefix}{date_str}")
+        return sorted(glob.glob(pattern + COLUMNAR_SUFFIX)) + sorted(glob.glob(pattern + "*.jsonl")) \
+            + sorted(glob.glob(pattern + "*.jsonl.gz"))
+
+    def _query_log_files(self, start_time=None, end_time=None, level=None, category=None,
+                         path=None, status_code=None, peers_only=False,
+                         query: Optional[SearchQuery] = None) -> List[Dict]:
+        """通过段索引（和检索倒排表）查询文件中的日志，只读取匹配的行
+
+        已关闭的天数较多时按天并行交给扫描进程池，当天的段在本进程中查询。
+        """
+        days = self._segments_by_date(start_time, end_time, peers_only)
+        filters = self._scan_filters(start_time, end_time, level, category, path, status_code)
+        closed = self._closed_days(days)
+        closed_dates = {date_str for date_str, _ in closed}
+        if not self.scan_pool.worth_using(len(closed)):
+            closed = []
+        futures = [(segments, self.scan_pool.submit(segments, filters, query)) for _, segments in closed]
+        pooled_dates = {date_str for date_str, _ in closed}
         
-        for log in logs:
-            # 时间范围过滤
-            if start_time and log.get("timestamp", "") < start_time:
-                continue
-            if end_time and log.get("timestamp", "") > end_time:
-                continue
-            
-            # 日志级别过滤
-            if level and log.get("level", "") != level:
-                continue
-            
-            # 分类过滤
-            if category and log.get("category", "") != category:
-                continue
-            
-            # 路径过滤
-            if path and path not in log.get("path", ""):
+        logs = []
+        for date_str, segments in days:
+            if date_str in pooled_dates:
                 continue
-            
-            filtered_logs.append(log)
-        
-        return filtered_logs
+            for log_file in segments:
+                try:
+                    logs.extend(self._query_segment(log_file, filters, query, date_str in closed_dates))
+                except Exception as e:
+                    logger.error(f"查询日志文件 {log_file} 失败: {e}")
+        for segments, future in futures:
+            logs.extend(self.scan_pool.result(future, segments, filters, query))
+        return logs
+
+    def _filter_logs(self, logs: List[Dict], start_time=None, end_time=None, level=None, category=None,
+                     path=None, status_code=None, query: Optional[SearchQuery] = None) -> List[Dict]:
+        """过滤日志（与段索引、字节级扫描的过滤语义一致）"""
+        return [
+            log for log in logs
+            if record_matches(log, start_time, end_time, level, category, path, status_code, query)
+        ]
 
     def _get_log_metrics(self, logs: List[Dict]) -> Dict[str, Any]:
         """获取日志统计指标"""
@@ -420,8 +871,10 @@ class OptimizedLogService:
             level_counts[log.get('level', 'UNKNOWN')] += 1
             category_counts[log.get('category', 'UNKNOWN')] += 1
             
-            if 'response_time' in log and log['response_time'] is not None:
-                response_times.append(log['response_time'])
+            # 中间件写入的是processing_time_ms，结构化日志使用response_time
+            response_time = log.get('processing_time_ms', log.get('response_time'))
+            if response_time is not None:
+                response_times.append(response_time)
         
         metrics = {
             'total_count': len(logs),
@@ -440,26 +893,18 @@ class OptimizedLogService:
         return metrics
 
     def get_performance_metrics(self, hours=24) -> Dict[str, Any]:
-        """获取性能指标"""
+        """获取性能指标（完整小时/分钟读取汇总层，不再逐行解析文件）"""
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
         
-        # 从缓存获取最新指标
-        recent_metrics = [m for m in self.performance_cache 
-                         if datetime.fromisoformat(m.timestamp) >= start_time]
-        
-        # 从文件加载历史指标
-        file_metrics = self._load_performance_from_files(start_time, end_time)
-        
-        all_metrics = recent_metrics + file_metrics
-        
-        if not all_metrics:
+        summary = self.perf_store.summary(start_time, end_time)
+        data_points = summary['cpu_usage']['count']
+        if not data_points:
             return {}
         
-        # 计算统计信息
-        cpu_values = [m.cpu_usage for m in all_metrics]
-        memory_values = [m.memory_usage for m in all_metrics]
-        response_times = [m.avg_response_time for m in all_metrics if m.avg_response_time > 0]
+        def min_avg_max(name):
+            stats = summary[name]
+            return {'avg': stats['avg'], 'min': stats['min'], 'max': stats['max']}
         
         return {
             'time_range': {
@@ -467,28 +912,22 @@ class OptimizedLogService:
                 'end': end_time.isoformat(),
                 'hours': hours
             },
-            'cpu_usage': {
-                'avg': sum(cpu_values) / len(cpu_values),
-                'min': min(cpu_values),
-                'max': max(cpu_values)
-            },
-            'memory_usage': {
-                'avg': sum(memory_values) / len(memory_values),
-                'min': min(memory_values),
-                'max': max(memory_values)
-            },
-            'response_time': {
-                'avg': sum(response_times) / len(response_times) if response_times else 0,
-                'min': min(response_times) if response_times else 0,
-                'max': max(response_times) if response_times else 0
-            },
-            'total_requests': sum(m.request_count for m in all_metrics),
-            'total_errors': sum(m.error_count for m in all_metrics),
-            'data_points': len(all_metrics)
+            'cpu_usage': min_avg_max('cpu_usage'),
+            'memory_usage': min_avg_max('memory_usage'),
+            'response_time': min_avg_max('avg_response_time'),
+            'total_requests': int(summary['request_count']['sum']),
+            'total_errors': int(summary['error_count']['sum']),
+            'data_points': data_points
         }
 
+    def get_performance_series(self, hours=24, max_points=300) -> Dict[str, Any]:
+        """获取性能指标序列（按跨度自动选择raw/1m/1h层级）"""
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=hours)
+        return self.perf_store.series(start_time, end_time, max_points)
+
     def _load_performance_from_files(self, start_time: datetime, end_time: datetime) -> List[PerformanceMetrics]:
-        """从文件加载性能指标"""
+        """从旧版本的性能指标文件加载（仅用于导入时序存储）"""
         metrics = []
         
         current_date = start_time.date()
@@ -496,10 +935,11 @@ class OptimizedLogService:
         
         while current_date <= end_date:
             date_str = current_date.strftime("%Y%m%d")
-            perf_file = os.path.join(self.log_dir, f"{self.performance_file_prefix}{date_str}.jsonl")
-            
-            if os.path.exists(perf_file):
+            for perf_file in self._segments_for_date(self.performance_file_prefix, date_str):
                 try:
+                    if perf_file.endswith(COLUMNAR_SUFFIX):
+                        metrics.extend(self._load_performance_columns(perf_file, start_time, end_time))
+                        continue
                     with open(perf_file, "r", encoding="utf-8") as f:
                         for line in f:
                             try:
@@ -518,60 +958,223 @@ class OptimizedLogService:
         
         return metrics
 
-    def _cleanup_old_logs(self):
-        """清理过期日志"""
-        try:
-            cutoff_date = datetime.now() - timedelta(days=self.retention_days)
-            
+    def _load_performance_columns(self, perf_file: str, start_time: datetime, end_time: datetime) -> List[PerformanceMetrics]:
+        """从列式段读取性能指标：按时间戳列二分定位，只解压指标字段所在的列"""
+        segment = self.index_manager.get(perf_file)
+        window = segment.time_range(start_time.isoformat(), end_time.isoformat())
+        fields = [name for name in PerformanceMetrics.__dataclass_fields__]
+        columns = {name: segment.column(name)[window.start:window.stop] for name in fields}
+        return [
+            PerformanceMetrics(**{name: columns[name][i] for name in fields})
+            for i in range(len(window))
+        ]
+
+    # ---- 列式压缩 ----
+
+    def compact_closed_segments(self) -> int:
+        """把已关闭（早于今天）的JSONL/gzip日志文件压缩为列式文件，返回处理的日期数"""
+        closed_before = min(datetime.now(), datetime.utcnow()).strftime("%Y%m%d")
+        now = time.time()
+        groups: Dict[str, List[str]] = defaultdict(list)
+        
+        # 多个worker都会运行压缩任务，用跨进程锁串行化，后拿到锁的进程重新列目录，
+        # 不会重复合并已被删除的源文件
+        with self._maintenance_lock:
             for filename in os.listdir(self.log_dir):
-                if filename.startswith(self.log_file_prefix) or filename.startswith(self.performance_file_prefix):
+                if not (filename.endswith('.jsonl') or filename.endswith('.jsonl.gz')):
+                    continue
+                for prefix in (self.log_file_prefix, self.performance_file_prefix):
+                    if not filename.startswith(prefix):
+                        continue
+                    date_str = filename[len(prefix):len(prefix) + 8]
                     file_path = os.path.join(self.log_dir, filename)
-                    file_stat = os.stat(file_path)
-                    file_date = datetime.fromtimestamp(file_stat.st_mtime)
-                    
-                    if file_date < cutoff_date:
-                        # 压缩后删除
-                        self._compress_and_delete(file_path)
-                        logger.info(f"清理过期日志文件: {filename}")
+                    if date_str.isdigit() and date_str < closed_before and now - os.path.getmtime(file_path) >= self.compact_min_age:
+                        groups[f"{prefix}{date_str}"].append(file_path)
             
-        except Exception as e:
-            logger.error(f"清理过期日志失败: {e}")
+            for name, sources in groups.items():
+                self._compact_segment(os.path.join(self.log_dir, name + COLUMNAR_SUFFIX), sorted(sources))
+        return len(groups)
 
-    def _rotate_large_files(self):
-        """轮转大文件"""
+    def _compact_segment(self, target: str, sources: List[str]):
+        """把同一天的多个源文件（及已有的列式文件）合并写成一个列式文件"""
         try:
-            for filename in os.listdir(self.log_dir):
-                if filename.startswith(self.log_file_prefix) and filename.endswith('.jsonl'):
-                    file_path = os.path.join(self.log_dir, filename)
-                    
-                    if os.path.getsize(file_path) > self.max_file_size:
-                        # 压缩大文件
-                        self._compress_file(file_path)
-                        logger.info(f"轮转大文件: {filename}")
+            records = []
+            if os.path.exists(target):
+                records.extend(ColumnarSegment(target).records())
+            for source in sources:
+                records.extend(self._read_jsonl_records(source))
             
+            original_size = sum(os.path.getsize(source) for source in sources)
+            write_columnar(target, records)
+            self._forget_segment(target)
+            for source in sources:
+                os.remove(source)
+                self._forget_segment(source)
+            # 段已关闭，立即建好全文检索倒排表
+            if os.path.basename(target).startswith(self.log_file_prefix):
+                self.search_index.build(target, self.index_manager.get(target))
+            
+            logger.info(f"列式压缩 {os.path.basename(target)}: {len(records)} 条记录, "
+                        f"{original_size} -> {os.path.getsize(target)} 字节")
         except Exception as e:
-            logger.error(f"文件轮转失败: {e}")
+            logger.error(f"列式压缩 {target} 失败: {e}")
+
+    def _read_jsonl_records(self, file_path: str) -> List[Dict]:
+        """读取JSONL（mmap）或gzip压缩的JSONL（流式解压）文件中的全部记录"""
+        return list(SegmentScanner().scan_file(file_path))
+
+    # ---- 保留策略与磁盘预算 ----
+
+    def apply_retention(self) -> Dict[str, int]:
+        """执行保留策略：删除超过保留期的整天文件，按规则裁剪已关闭的列式段，再检查磁盘预算
 
-    def _compress_file(self, file_path: str):
-        """压缩文件"""
+        日志的天数按文件名中的日期计算；与其他worker的压缩、清理任务互斥。
+        """
+        result = {'rows_dropped': 0, 'days_deleted': 0}
         try:
-            compressed_path = file_path + '.gz'
-            
-            with open(file_path, 'rb') as f_in:
-                with gzip.open(compressed_path, 'wb') as f_out:
-                    f_out.writelines(f_in)
-            
-            os.remove(file_path)
-            
+            today = min(datetime.now(), datetime.utcnow()).date()
+            with self._maintenance_lock:
+                for prefix, max_days in ((self.log_file_prefix, self.retention.max_days),
+                                         (self.performance_file_prefix, self.retention.default_days),
+                                         (self.rollup.file_prefix, self.retention.max_days)):
+                    for date_str, files in sorted(self._closed_files_by_day(prefix).items()):
+                        age = (today - datetime.strptime(date_str, "%Y%m%d").date()).days
+                        if age >= max_days:
+                            self._delete_files(files)
+                            result['days_deleted'] += 1
+                            logger.info(f"删除超过保留期的文件: {prefix}{date_str}*")
+                        elif prefix == self.log_file_prefix and self.retention.active(age):
+                            segment = os.path.join(self.log_dir, f"{prefix}{date_str}{COLUMNAR_SUFFIX}")
+                            if segment in files:
+                                result['rows_dropped'] += self._apply_retention_rules(segment, age)
+            self.retention_stats['rows_dropped'] += result['rows_dropped']
+            self.retention_stats['days_deleted'] += result['days_deleted']
         except Exception as e:
-            logger.error(f"压缩文件 {file_path} 失败: {e}")
+            logger.error(f"执行日志保留策略失败: {e}")
+        self.enforce_disk_budget()
+        return result
 
-    def _compress_and_delete(self, file_path: str):
-        """压缩并删除文件"""
+    def _apply_retention_rules(self, segment_path: str, age_days: int) -> int:
+        """按保留规则裁剪一个列式段（只读取判断所需的列），返回删除的记录数"""
         try:
-            self._compress_file(file_path)
+            segment = ColumnarSegment(segment_path)
+            columns = {name: segment.column(name) for name in ("level", "category", "path", "timestamp", "seq")}
+            rows = self.retention.kept_rows(age_days, columns, segment.row_count)
+            dropped = segment.row_count - len(rows)
+            if not dropped:
+                return 0
+            if rows:
+                write_columnar(segment_path, segment.read_rows(rows))
+                self._forget_segment(segment_path)
+                self.search_index.build(segment_path, self.index_manager.get(segment_path))
+            else:
+                self._delete_files([segment_path])
+            logger.info(f"保留策略裁剪 {os.path.basename(segment_path)}: 删除 {dropped} 条, 保留 {len(rows)} 条")
+            return dropped
         except Exception as e:
-            logger.error(f"压缩删除文件 {file_path} 失败: {e}")
+            logger.error(f"执行保留策略 {segment_path} 失败: {e}")
+            return 0
+
+    def enforce_disk_budget(self) -> int:
+        """日志目录超出磁盘预算或磁盘可用空间不足时，从最早的一天开始删除已关闭的日志
+
+        删除全部已关闭的日志后仍超出时，写入线程只写入WARNING及以上级别，直到下次检查恢复。
+        返回删除的天数。
+        """
+        evicted = 0
+        try:
+            with self._maintenance_lock:
+                usage = self._directory_size()
+                free = shutil.disk_usage(self.log_dir).free
+                days = defaultdict(list)
+                for prefix in (self.log_file_prefix, self.performance_file_prefix):
+                    for date_str, files in self._closed_files_by_day(prefix).items():
+                        days[date_str].extend(files)
+                for date_str in sorted(days):
+                    if usage <= self.disk_budget_bytes and free >= self.disk_min_free_bytes:
+                        break
+                    freed = self._delete_files(days[date_str])
+                    usage -= freed
+                    free += freed
+                    evicted += 1
+                    logger.warning(f"日志超出磁盘预算，删除 {date_str} 的日志（释放 {freed} 字节）")
+                self._disk_usage = usage
+                over_budget = usage > self.disk_budget_bytes or free < self.disk_min_free_bytes
+                if over_budget and not self._over_budget:
+                    logger.error(f"删除全部已关闭的日志后仍超出磁盘预算（占用 {usage} 字节，可用 {free} 字节），"
+                                 f"暂停写入WARNING以下级别的日志")
+                elif self._over_budget and not over_budget:
+                    logger.info("日志磁盘占用已回到预算以内，恢复写入全部级别的日志")
+                self._over_budget = over_budget
+            self.retention_stats['budget_evictions'] += evicted
+        except Exception as e:
+            logger.error(f"检查日志磁盘预算失败: {e}")
+        return evicted
+
+    def _directory_size(self) -> int:
+        """日志目录中全部文件的总大小"""
+        total = 0
+        try:
+            with os.scandir(self.log_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            total += entry.stat().st_size
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.error(f"统计日志目录大小失败: {e}")
+        return total
+
+    def _closed_files_by_day(self, prefix: str) -> Dict[str, List[str]]:
+        """已关闭（早于今天）的各天中以prefix开头的文件（含索引等旁路文件），按日期分组"""
+        closed_before = min(datetime.now(), datetime.utcnow()).strftime("%Y%m%d")
+        days: Dict[str, List[str]] = defaultdict(list)
+        for filename in os.listdir(self.log_dir):
+            if not filename.startswith(prefix) or filename.endswith('.tmp'):
+                continue
+            date_str = filename[len(prefix):len(prefix) + 8]
+            if date_str.isdigit() and date_str < closed_before:
+                days[date_str].append(os.path.join(self.log_dir, filename))
+        return days
+
+    def _delete_files(self, files: List[str]) -> int:
+        """删除文件（日志段连同其索引和检索倒排表），返回释放的字节数"""
+        freed = 0
+        for file_path in sorted(files, key=lambda path: path.endswith((INDEX_SUFFIX, SEARCH_SUFFIX))):
+            try:
+                freed += os.path.getsize(file_path)
+                os.remove(file_path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"删除日志文件 {file_path} 失败: {e}")
+                continue
+            if not file_path.endswith((INDEX_SUFFIX, SEARCH_SUFFIX)):
+                self._forget_segment(file_path)
+        return freed
+
+    def _forget_segment(self, file_path: str):
+        """段文件被删除、替换或轮转时丢弃其索引和检索倒排表"""
+        self.index_manager.forget(file_path)
+        self.search_index.forget(file_path)
+
+    def get_log_stats(self, start_time=None, end_time=None) -> Dict[str, Any]:
+        """统计时间范围内的日志（合并预聚合的统计桶，默认最近24小时）"""
+        return self.rollup.query(start_time, end_time)
+
+    def get_latency_stats(self, hours=1, route=None) -> Dict[str, Any]:
+        """按路由、状态码类别的响应时间分位数（合并所有worker）"""
+        return self.latency.query(hours=hours, route=route)
+
+    def _iter_day_records(self, date_str: str) -> Iterator[Dict]:
+        """遍历某天全部日志段中的记录（用于重建统计）"""
+        for log_file in self._segments_for_date(self.log_file_prefix, date_str):
+            if log_file.endswith('.gz'):
+                yield from SegmentScanner().scan_file(log_file)
+                continue
+            index = self.index_manager.get(log_file, cache=False)
+            yield from self._iter_segment_rows(index, list(range(index.row_count)), 256, True)
 
     def get_recent_logs(self, limit=50):
         """获取最近的日志"""
@@ -582,51 +1185,95 @@ class OptimizedLogService:
         with self.lock:
             self.log_cache.clear()
             self.performance_cache.clear()
+            self._cache_floor = max(self._cache_floor, datetime.now().isoformat(), datetime.utcnow().isoformat())
             logger.info("日志缓存已清空")
 
     def get_service_stats(self) -> Dict[str, Any]:
         """获取服务统计信息"""
+        response_time = self.latency.overall(hours=1)
         with self.lock:
             return {
                 'total_logs': self.metrics['total_logs'],
                 'cache_size': len(self.log_cache),
-                'pending_logs': len(self.pending_logs),
+                'pending_logs': self.writer.qsize(),
+                'writer': self.writer.get_stats(),
+                'tail': self.tail.get_stats(),
+                'query_cache': self.query_cache.get_stats(),
+                'scan_pool': self.scan_pool.get_stats(),
+                'retention': {
+                    **self.retention_stats,
+                    'policies': self.retention.describe(),
+                    'disk_usage': self._disk_usage,
+                    'disk_budget': self.disk_budget_bytes,
+                    'over_budget': self._over_budget
+                },
                 'logs_per_level': dict(self.metrics['logs_per_level']),
                 'logs_per_category': dict(self.metrics['logs_per_category']),
                 'performance_cache_size': len(self.performance_cache),
-                'avg_response_time': sum(self.metrics['avg_response_times']) / len(self.metrics['avg_response_times']) if self.metrics['avg_response_times'] else 0,
+                'avg_response_time': response_time['avg'] or 0,
+                'response_time_ms': response_time,
                 'error_rate': sum(self.metrics['error_rates']) / len(self.metrics['error_rates']) if self.metrics['error_rates'] else 0
             }
 
     def force_flush(self):
         """强制刷新所有待写入日志"""
-        self._flush_pending_logs()
+        self.writer.flush()
 
     async def async_force_flush(self):
-        """异步强制刷新"""
-        with self.lock:
-            logs_to_write = self.pending_logs.copy()
-            self.pending_logs.clear()
-        
-        if logs_to_write:
-            await self._async_flush_logs(logs_to_write)
+        """异步强制刷新（在线程池中等待写入线程完成）"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.writer.flush)
 
     def shutdown(self):
-        """关闭日志服务"""
+        """关闭日志服务（重复调用无效）"""
+        with self.lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
         logger.info("正在关闭日志服务...")
-        self._shutdown = True
+        
+        # 先执行关闭回调（如写入请求日志管道中未结束的合并汇总）
+        for hook in self._shutdown_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"日志服务关闭回调失败: {e}")
         
         # 取消定时器
-        if self.flush_timer:
-            self.flush_timer.cancel()
+        for timer in self._timers.values():
+            timer.cancel()
         
-        # 刷新所有待写入日志
-        self.force_flush()
+        self.system_metrics.stop()
+        self.scan_pool.shutdown()
+        
+        # 停止写入线程（退出前写完队列中的全部日志）
+        self.writer.stop()
+        self.index_manager.save_all()
+        self.search_index.save_all()
+        self.rollup.save()
+        self.latency.save()
         
         logger.info("日志服务已关闭")
 
 # 为了向后兼容，保留原始类名的别名
 LogService = OptimizedLogService
 
-# 创建单例实例
-log_service = LogService()
\ No newline at end of file
+# 应用共享的单例实例：由应用启动事件启动、关闭事件停止，
+# 中间件和日志接口使用同一个实例，内存缓存能看到全部新写入的日志
+log_service = LogService(autostart=False)
+
+
+def get_log_service() -> OptimizedLogService:
+    """获取日志服务单例"""
+    return log_service
+
+
+async def init_log_service():
+    """启动日志服务单例"""
+    log_service.start()
+
+
+async def close_log_service():
+    """关闭日志服务单例，写完队列中的全部日志"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, log_service.shutdown)
\ No newline at end of file
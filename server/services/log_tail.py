@@ -0,0 +1,137 @@
+"""日志实时推送（live tail）
+
+管理员通过WebSocket订阅日志，订阅时指定level / category / path / status_code过滤条件。
+save_log把每条新日志交给LogTailHub，在写入方所在线程按条件过滤后放入各订阅者的
+有界队列，WebSocket发送任务从队列中批量取出推送给客户端。
+
+订阅者的队列满了说明客户端消费跟不上，此时直接丢弃该订阅（清空队列并通知客户端），
+不会阻塞写日志的一方，也不会无限占用内存。没有订阅者时publish直接返回。
+"""
+import asyncio
+import itertools
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("log_tail")
+
+_DROPPED = object()  # 队列溢出标记
+
+
+class TailSubscriber:
+    """一个订阅者：过滤条件 + 所在事件循环中的有界队列"""
+
+    def __init__(self, subscriber_id: int, loop: asyncio.AbstractEventLoop, max_queue_size: int,
+                 level: Optional[str] = None, category: Optional[str] = None,
+                 path: Optional[str] = None, status_code: Optional[int] = None):
+        self.id = subscriber_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.level = level.upper() if level else None
+        self.category = category
+        self.path = path
+        self.status_code = status_code
+        self.dropped = False
+        self.delivered = 0
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        """过滤条件与get_logs一致：级别不区分大小写，路径按子串匹配"""
+        if self.level and str(entry.get("level", "")).upper() != self.level:
+            return False
+        if self.category and entry.get("category") != self.category:
+            return False
+        if self.path and self.path not in str(entry.get("path", "")):
+            return False
+        if self.status_code is not None and entry.get("status_code") != self.status_code:
+            return False
+        return True
+
+    def _put(self, entry: Dict[str, Any]):
+        """在订阅者的事件循环中执行"""
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            # 消费跟不上：清空队列，只留下溢出标记，由发送任务通知客户端后结束订阅
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_DROPPED)
+
+    async def next_batch(self, max_batch: int) -> Optional[List[Dict[str, Any]]]:
+        """等待并取出一批日志；订阅因溢出被丢弃时返回None"""
+        first = await self.queue.get()
+        if first is _DROPPED:
+            return None
+        batch = [first]
+        while len(batch) < max_batch and not self.queue.empty():
+            entry = self.queue.get_nowait()
+            if entry is _DROPPED:
+                return None
+            batch.append(entry)
+        self.delivered += len(batch)
+        return batch
+
+
+class LogTailHub:
+    """把新日志分发给匹配的订阅者"""
+
+    def __init__(self, max_subscribers: int = 20, max_queue_size: int = 1000):
+        self.max_subscribers = max_subscribers
+        self.max_queue_size = max_queue_size
+        self._subscribers: Dict[int, TailSubscriber] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.stats = {'published': 0, 'dropped_subscribers': 0}
+
+    def subscribe(self, level: Optional[str] = None, category: Optional[str] = None,
+                  path: Optional[str] = None, status_code: Optional[int] = None) -> TailSubscriber:
+        """在当前事件循环中创建订阅，超过订阅数上限时抛出ValueError"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise ValueError(f"日志订阅数已达上限 {self.max_subscribers}")
+            subscriber = TailSubscriber(next(self._ids), loop, self.max_queue_size,
+                                        level, category, path, status_code)
+            self._subscribers[subscriber.id] = subscriber
+        logger.info(f"新增日志订阅 {subscriber.id}")
+        return subscriber
+
+    def unsubscribe(self, subscriber: TailSubscriber):
+        with self._lock:
+            removed = self._subscribers.pop(subscriber.id, None)
+        if removed is not None:
+            if subscriber.dropped:
+                self.stats['dropped_subscribers'] += 1
+            logger.info(f"取消日志订阅 {subscriber.id}（已推送 {subscriber.delivered} 条）")
+
+    def publish(self, entry: Dict[str, Any]):
+        """分发一条日志（可在任意线程调用）"""
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        self.stats['published'] += 1
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        for subscriber in subscribers:
+            if subscriber.dropped or not subscriber.matches(entry):
+                continue
+            if subscriber.loop is current_loop:
+                subscriber._put(entry)
+            else:
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber._put, entry)
+                except RuntimeError:
+                    # 事件循环已关闭
+                    self.unsubscribe(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'subscribers': self.subscriber_count}
@@ -0,0 +1,193 @@
+"""后台日志写入线程
+
+请求路径只把日志条目追加到有界队列（collections.deque的append/popleft是原子操作，
+生产者之间无需加锁），由单独的写入线程批量取出后一次性提交给处理函数
+（组提交），文件I/O和序列化都不会发生在调用方线程上。
+
+队列满时的处理策略：
+- drop: 丢弃新条目（默认）
+- block: 阻塞调用方直到写入线程腾出空间（会阻塞事件循环，慎用）
+- sample: 按采样率保留新条目，重要条目（ERROR/CRITICAL）始终保留
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("log_writer")
+
+FULL_POLICIES = ("drop", "block", "sample")
+
+
+class _FlushMarker:
+    """插入队列的刷新标记，写入线程处理到它时通知等待方"""
+
+    __slots__ = ("event",)
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+class LogWriter:
+    """单线程日志写入器"""
+
+    MAX_RETRIES = 3  # 批量写入失败后的最大重试次数
+
+    def __init__(self, handler: Callable[[List[Any]], None], max_queue_size: int = 10000,
+                 full_policy: str = "drop", sample_rate: float = 0.1,
+                 batch_size: int = 50, flush_interval: float = 5.0, name: str = "log-writer"):
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(f"未知的队列满处理策略: {full_policy}，可选值: {', '.join(FULL_POLICIES)}")
+        self._handler = handler
+        self.max_queue_size = max_queue_size
+        self.full_policy = full_policy
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+
+        self._queue: deque = deque()
+        self._wakeup = threading.Event()
+        self._drained = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._retry_batch: List[Any] = []
+        self._retry_count = 0
+
+        # 统计计数（近似值，不加锁）
+        self.stats: Dict[str, int] = {
+            'enqueued': 0,
+            'dropped': 0,
+            'sampled_out': 0,
+            'blocked': 0,
+            'written': 0,
+            'batches': 0,
+            'failed_batches': 0
+        }
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        """启动写入线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """停止写入线程，退出前写完队列中的全部条目"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # 线程未启动或已退出时，在当前线程写完剩余条目
+        self._drain()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---- 生产者接口 ----
+
+    def put(self, item: Any, important: bool = False) -> bool:
+        """追加一条日志，返回是否被接受"""
+        queue = self._queue
+        if len(queue) >= self.max_queue_size:
+            if not self._handle_full(important):
+                return False
+        queue.append(item)
+        self.stats['enqueued'] += 1
+        if len(queue) >= self.batch_size and not self._wakeup.is_set():
+            self._wakeup.set()
+        return True
+
+    def _handle_full(self, important: bool) -> bool:
+        """队列已满时按策略决定是否接受新条目"""
+        if self.full_policy == "block" and self.running:
+            self.stats['blocked'] += 1
+            self._wakeup.set()
+            while len(self._queue) >= self.max_queue_size and self.running:
+                self._drained.clear()
+                self._drained.wait(0.05)
+            return True
+        if self.full_policy == "sample" and len(self._queue) < self.max_queue_size * 2:
+            if important or random.random() < self.sample_rate:
+                return True
+            self.stats['sampled_out'] += 1
+            return False
+        self.stats['dropped'] += 1
+        return False
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """等待当前已入队的条目全部写入"""
+        if not self.running or threading.current_thread() is self._thread:
+            self._drain()
+            return True
+        marker = _FlushMarker()
+        self._queue.append(marker)
+        self._wakeup.set()
+        return marker.event.wait(timeout)
+
+    def qsize(self) -> int:
+        return len(self._queue)
+
+    # ---- 写入线程 ----
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        """取出队列中的全部条目并组提交"""
+        queue = self._queue
+        batch = self._retry_batch
+        self._retry_batch = []
+        markers = []
+        while True:
+            try:
+                item = queue.popleft()
+            except IndexError:
+                break
+            if isinstance(item, _FlushMarker):
+                markers.append(item)
+            else:
+                batch.append(item)
+        self._drained.set()
+
+        if batch:
+            try:
+                self._handler(batch)
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+                self._retry_count = 0
+            except Exception as e:
+                self.stats['failed_batches'] += 1
+                self._retry_count += 1
+                if self._retry_count < self.MAX_RETRIES:
+                    logger.error(f"批量写入日志失败，稍后重试: {e}")
+                    self._retry_batch = batch
+                    time.sleep(0.1)
+                else:
+                    logger.error(f"批量写入日志连续失败 {self._retry_count} 次，丢弃 {len(batch)} 条日志: {e}")
+                    self.stats['dropped'] += len(batch)
+                    self._retry_count = 0
+
+        for marker in markers:
+            marker.event.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入器统计信息"""
+        return {
+            **self.stats,
+            'queue_size': len(self._queue),
+            'max_queue_size': self.max_queue_size,
+            'full_policy': self.full_policy,
+            'running': self.running
+        }
@@ -0,0 +1,222 @@
+"""系统指标采集
+
+按固定分辨率（1秒、10秒或60秒）采样，样本保存在定长环形缓冲区中：
+- CPU使用率用psutil的非阻塞模式，取两次采样之间的增量，不再阻塞线程等待
+- 请求数、错误数和响应时间由LoggingMiddleware逐个请求计入，每次采样取区间增量
+- 活动连接数等即时值通过注册的取值函数读取（WebSocket连接数、数据库连接池占用数）
+
+日志服务每分钟汇总最近一分钟的样本写入性能指标文件。
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import psutil
+
+from config import METRICS_RESOLUTION_SECONDS, METRICS_RETENTION_SECONDS
+
+logger = logging.getLogger("metrics_service")
+
+SUPPORTED_RESOLUTIONS = (1, 10, 60)
+
+# 计入active_connections的即时值
+CONNECTION_GAUGES = ("websocket_connections", "db_connections")
+
+
+class RingBuffer:
+    """定长环形缓冲区，写满后覆盖最旧的元素"""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"环形缓冲区容量必须大于0: {capacity}")
+        self.capacity = capacity
+        self._items: List[Any] = [None] * capacity
+        self._next = 0
+        self._size = 0
+
+    def append(self, item: Any):
+        self._items[self._next] = item
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def items(self) -> List[Any]:
+        """按写入顺序返回全部元素"""
+        start = (self._next - self._size) % self.capacity
+        if start + self._size <= self.capacity:
+            return self._items[start:start + self._size]
+        return self._items[start:] + self._items[:self._next]
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class MetricsCollector:
+    """按固定分辨率采样系统与应用指标"""
+
+    def __init__(self, resolution: int = METRICS_RESOLUTION_SECONDS,
+                 retention_seconds: int = METRICS_RETENTION_SECONDS, disk_path: Optional[str] = None):
+        if resolution not in SUPPORTED_RESOLUTIONS:
+            raise ValueError(f"不支持的采样分辨率: {resolution}秒（可选 {SUPPORTED_RESOLUTIONS}）")
+        self.resolution = resolution
+        self.disk_path = disk_path or os.path.abspath(os.sep)
+        self.samples = RingBuffer(max(1, retention_seconds // resolution))
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._process = psutil.Process()
+        self._lock = threading.Lock()
+        self._reset_counters()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ---- 数据来源 ----
+
+    def _reset_counters(self):
+        self._requests = 0
+        self._errors = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    def record_request(self, status_code: int, latency_ms: float):
+        """计入一个请求（5xx计为错误）"""
+        with self._lock:
+            self._requests += 1
+            if status_code >= 500:
+                self._errors += 1
+            self._latency_sum += latency_ms
+            if latency_ms > self._latency_max:
+                self._latency_max = latency_ms
+
+    def register_gauge(self, name: str, getter: Callable[[], float]):
+        """注册即时值（采样时调用取值函数）"""
+        self._gauges[name] = getter
+
+    # ---- 采样 ----
+
+    def _prime(self):
+        """psutil的非阻塞CPU使用率以上次调用为基准，首次调用只建立基准"""
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+
+    def sample(self) -> Dict[str, Any]:
+        """采集一个样本并写入环形缓冲区"""
+        with self._lock:
+            requests, errors = self._requests, self._errors
+            latency_sum, latency_max = self._latency_sum, self._latency_max
+            self._reset_counters()
+
+        gauges = {}
+        for name, getter in list(self._gauges.items()):
+            try:
+                gauges[name] = getter()
+            except Exception as e:
+                logger.error(f"读取指标 {name} 失败: {e}")
+
+        try:
+            disk_percent = psutil.disk_usage(self.disk_path).percent
+        except OSError:
+            disk_percent = None
+
+        sample = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "process_cpu_percent": self._process.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "process_rss_mb": round(self._process.memory_info().rss / 1024 / 1024, 2),
+            "disk_percent": disk_percent,
+            "requests": requests,
+            "errors": errors,
+            "avg_response_time_ms": round(latency_sum / requests, 2) if requests else 0.0,
+            "max_response_time_ms": latency_max,
+            "gauges": gauges
+        }
+        with self._lock:
+            self.samples.append(sample)
+        return sample
+
+    def _run(self):
+        # 按单调时钟对齐采样时刻，采样本身的耗时不会累积成漂移
+        next_tick = time.monotonic() + self.resolution
+        while not self._stop_event.wait(max(0.0, next_tick - time.monotonic())):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"采集系统指标失败: {e}")
+            next_tick += self.resolution
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic() + self.resolution
+
+    def start(self):
+        """启动采样线程（重复调用无效）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._prime()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-collector", daemon=True)
+        self._thread.start()
+        logger.info(f"系统指标采集已启动，分辨率 {self.resolution} 秒")
+
+    def stop(self):
+        """停止采样线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.resolution + 1)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---- 查询 ----
+
+    def recent(self, seconds: Optional[int] = None) -> List[Dict[str, Any]]:
+        """最近一段时间的样本（按时间升序），不指定时返回缓冲区中的全部样本"""
+        with self._lock:
+            samples = self.samples.items()
+        if seconds is None:
+            return samples
+        count = max(1, seconds // self.resolution)
+        return samples[-count:]
+
+    def summarize(self, seconds: int) -> Optional[Dict[str, Any]]:
+        """汇总最近一段时间的样本：使用率取平均，计数求和，即时值取最新"""
+        samples = self.recent(seconds)
+        if not samples:
+            return None
+        requests = sum(s["requests"] for s in samples)
+        latest = samples[-1]
+        return {
+            "timestamp": latest["timestamp"],
+            "cpu_percent": sum(s["cpu_percent"] for s in samples) / len(samples),
+            "memory_percent": latest["memory_percent"],
+            "disk_percent": latest["disk_percent"],
+            "requests": requests,
+            "errors": sum(s["errors"] for s in samples),
+            "avg_response_time_ms": (
+                sum(s["avg_response_time_ms"] * s["requests"] for s in samples) / requests if requests else 0.0
+            ),
+            "active_connections": int(sum(latest["gauges"].get(name, 0) for name in CONNECTION_GAUGES)),
+            "gauges": latest["gauges"],
+            "samples": len(samples)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取采集器状态"""
+        return {
+            "resolution_seconds": self.resolution,
+            "capacity": self.samples.capacity,
+            "sample_count": len(self.samples),
+            "running": self.running,
+            "gauges": sorted(self._gauges)
+        }
+
+
+# 全局指标采集器
+metrics_collector = MetricsCollector()
+
+
+def get_metrics_collector() -> MetricsCollector:
+    """获取指标采集器实例"""
+    return metrics_collector
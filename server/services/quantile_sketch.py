@@ -0,0 +1,101 @@
+"""分位数草图（DDSketch）
+
+按对数间隔分桶记录数值：桶i覆盖(γ^(i-1), γ^i]，γ = (1+α)/(1-α)。
+任意分位数的估计值相对误差不超过α；两个草图按桶相加即可合并，
+适合按分钟/小时预聚合后再跨时间段、跨进程合并响应时间分布。
+"""
+import math
+from typing import Any, Dict, Optional
+
+
+class DDSketch:
+    """可合并的相对误差分位数草图"""
+
+    MIN_VALUE = 1e-9  # 不大于该值的数值计入零桶
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"相对误差必须在(0, 1)之间: {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        """记录一个数值"""
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "DDSketch"):
+        """合并另一个草图（两者的相对误差必须相同）"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("无法合并相对误差不同的草图")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估计分位数，q取值[0, 1]；空草图返回None"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # 估计值限制在实际观测到的最小/最大值之间
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为可JSON存储的字典"""
+        return {
+            "alpha": self.relative_accuracy,
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "zero": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DDSketch":
+        sketch = cls(data.get("alpha", 0.01))
+        sketch.bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        sketch.zero_count = data.get("zero", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
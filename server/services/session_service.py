@@ -4,7 +4,7 @@ import uuid
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from threading import Lock, Timer
 import aiofiles
 
@@ -26,6 +26,7 @@ class OptimizedSessionService:
         
         # 内存数据结构
         self.active_sessions: Dict[str, Dict] = {}
+        self._session_owners: Dict[str, str] = {}  # 会话ID -> 用户名（按会话ID查找时不再遍历所有用户）
         self._pending_changes = 0  # 待保存的更改数量
         self._save_timer: Optional[Timer] = None
         self._lock = Lock()  # 线程安全锁
@@ -69,6 +70,27 @@ class OptimizedSessionService:
         else:
             logger.info(f"会话文件 {self.session_file} 不存在，将创建新文件")
             self.active_sessions = {}
+        self._rebuild_session_index()
+
+    def _rebuild_session_index(self):
+        """根据active_sessions重建会话ID到用户名的索引"""
+        self._session_owners = {
+            session_id: username
+            for username, user_data in self.active_sessions.items()
+            for session_id in user_data.get('sessions', ())
+        }
+
+    def _find_session(self, session_id: str) -> Optional[Tuple[str, Dict]]:
+        """按会话ID查找(用户名, 会话)，O(1)"""
+        username = self._session_owners.get(session_id)
+        if username is None:
+            return None
+        session = self.active_sessions.get(username, {}).get('sessions', {}).get(session_id)
+        if session is None:
+            # 索引与会话数据不一致（不应出现），丢弃失效的索引项
+            self._session_owners.pop(session_id, None)
+            return None
+        return username, session
 
     def _convert_str_to_datetime(self, session: Dict):
         """将字符串时间转换为datetime对象"""
@@ -239,6 +261,7 @@ class OptimizedSessionService:
             # 删除过期会话
             for session_id in expired_sessions:
                 del user_data['sessions'][session_id]
+                self._session_owners.pop(session_id, None)
                 cleaned_up = True
             
             # 如果用户没有会话了，删除用户
@@ -338,6 +361,7 @@ class OptimizedSessionService:
             session_data.update(session_attributes)
         
         self.active_sessions[username]['sessions'][session_id] = session_data
+        self._session_owners[session_id] = username
         
         # 标记需要保存，但不立即保存
         self._mark_dirty()
@@ -346,18 +370,21 @@ class OptimizedSessionService:
 
     def end_session(self, session_id: str, reason: str = None) -> bool:
         """结束会话（优化版本）"""
-        for username, user_data in self.active_sessions.items():
-            if 'sessions' in user_data and session_id in user_data['sessions']:
-                del user_data['sessions'][session_id]
-                
-                if not user_data['sessions']:
-                    del self.active_sessions[username]
-                
-                # 标记需要保存
-                self._mark_dirty()
-                reason_str = f"，原因: {reason}" if reason else ""
-                logger.info(f"结束用户 {username} 的会话: {session_id}{reason_str}")
-                return True
+        found = self._find_session(session_id)
+        if found is not None:
+            username = found[0]
+            user_data = self.active_sessions[username]
+            del user_data['sessions'][session_id]
+            del self._session_owners[session_id]
+            
+            if not user_data['sessions']:
+                del self.active_sessions[username]
+            
+            # 标记需要保存
+            self._mark_dirty()
+            reason_str = f"，原因: {reason}" if reason else ""
+            logger.info(f"结束用户 {username} 的会话: {session_id}{reason_str}")
+            return True
         
         logger.warning(f"尝试结束不存在的会话: {session_id}")
         return False
@@ -367,28 +394,28 @@ class OptimizedSessionService:
         # 只在必要时清理过期会话
         self._cleanup_expired_sessions()
         
-        for username, user_data in self.active_sessions.items():
-            if 'sessions' in user_data and session_id in user_data['sessions']:
-                session = user_data['sessions'][session_id]
-                
-                # 延长会话有效期
-                session["expire_time"] = datetime.utcnow() + timedelta(minutes=self.session_expire_minutes)
-                session["last_activity"] = datetime.utcnow()
-                
-                # 检测会话劫持
-                hijacked = False
-                if client_info:
-                    hijacked = not self._verify_client_info(session, client_info)
-                
-                # 标记需要保存
-                self._mark_dirty()
-                logger.debug(f"会话 {session_id} 验证有效，已延长有效期")
-                return {
-                    "valid": True,
-                    "username": username,
-                    "expire_time": session["expire_time"],
-                    "hijacked": hijacked
-                }
+        found = self._find_session(session_id)
+        if found is not None:
+            username, session = found
+            
+            # 延长会话有效期
+            session["expire_time"] = datetime.utcnow() + timedelta(minutes=self.session_expire_minutes)
+            session["last_activity"] = datetime.utcnow()
+            
+            # 检测会话劫持
+            hijacked = False
+            if client_info:
+                hijacked = not self._verify_client_info(session, client_info)
+            
+            # 标记需要保存
+            self._mark_dirty()
+            logger.debug(f"会话 {session_id} 验证有效，已延长有效期")
+            return {
+                "valid": True,
+                "username": username,
+                "expire_time": session["expire_time"],
+                "hijacked": hijacked
+            }
         
         logger.warning(f"无效的会话ID: {session_id}")
         return {"valid": False, "hijacked": False}
@@ -419,41 +446,40 @@ class OptimizedSessionService:
 
     def detect_session_hijacking(self, session_id: str, client_info: Dict) -> Dict:
         """检测会话是否被劫持"""
-        for username, user_data in self.active_sessions.items():
-            if 'sessions' in user_data and session_id in user_data['sessions']:
-                session = user_data['sessions'][session_id]
-                
-                risk_score = 0
-                is_client_match = self._verify_client_info(session, client_info)
-                if not is_client_match:
-                    risk_score += 70
-                
-                is_hijacked = risk_score >= 70
-                
-                if is_hijacked:
-                    logger.warning(f"检测到会话劫持: {session_id}，用户: {username}")
-                
-                return {
-                    "hijacked": is_hijacked,
-                    "risk_score": risk_score,
-                    "session_id": session_id,
-                    "username": username
-                }
+        found = self._find_session(session_id)
+        if found is not None:
+            username, session = found
+            
+            risk_score = 0
+            is_client_match = self._verify_client_info(session, client_info)
+            if not is_client_match:
+                risk_score += 70
+            
+            is_hijacked = risk_score >= 70
+            
+            if is_hijacked:
+                logger.warning(f"检测到会话劫持: {session_id}，用户: {username}")
+            
+            return {
+                "hijacked": is_hijacked,
+                "risk_score": risk_score,
+                "session_id": session_id,
+                "username": username
+            }
         
         logger.warning(f"尝试检测不存在的会话: {session_id}")
         return {"hijacked": False, "risk_score": 0}
 
     def update_session_activity(self, session_id: str) -> bool:
         """更新会话的最后活动时间（优化版本）"""
-        for username, user_data in self.active_sessions.items():
-            if 'sessions' in user_data and session_id in user_data['sessions']:
-                session = user_data['sessions'][session_id]
-                session["last_activity"] = datetime.utcnow()
-                
-                # 标记需要保存，但不立即保存
-                self._mark_dirty()
-                logger.debug(f"更新会话 {session_id} 的最后活动时间")
-                return True
+        found = self._find_session(session_id)
+        if found is not None:
+            found[1]["last_activity"] = datetime.utcnow()
+            
+            # 标记需要保存，但不立即保存
+            self._mark_dirty()
+            logger.debug(f"更新会话 {session_id} 的最后活动时间")
+            return True
         
         logger.warning(f"尝试更新不存在的会话: {session_id}")
         return False
@@ -490,6 +516,7 @@ class OptimizedSessionService:
     def clear_all_sessions(self):
         """清除所有会话"""
         self.active_sessions = {}
+        self._session_owners = {}
         self._force_save_sessions()
         logger.info("已清除所有会话")
 
@@ -497,13 +524,14 @@ class OptimizedSessionService:
         """根据会话ID获取会话信息"""
         self._cleanup_expired_sessions()
         
-        for username, user_data in self.active_sessions.items():
-            if 'sessions' in user_data and session_id in user_data['sessions']:
-                session = user_data['sessions'][session_id].copy()
-                session['username'] = username
-                session['session_id'] = session_id
-                logger.debug(f"获取会话 {session_id} 的信息")
-                return session
+        found = self._find_session(session_id)
+        if found is not None:
+            username, session = found
+            session = session.copy()
+            session['username'] = username
+            session['session_id'] = session_id
+            logger.debug(f"获取会话 {session_id} 的信息")
+            return session
         
         logger.warning(f"尝试获取不存在的会话: {session_id}")
         return None
@@ -512,17 +540,17 @@ class OptimizedSessionService:
         """根据会话ID获取设备类型信息"""
         self._cleanup_expired_sessions()
         
-        for username, user_data in self.active_sessions.items():
-            if 'sessions' in user_data and session_id in user_data['sessions']:
-                session = user_data['sessions'][session_id]
-                device_info = {
-                    'device_type': session.get('device_type', 'unknown'),
-                    'browser': session.get('browser', 'unknown'),
-                    'user_agent': session.get('user_agent', 'unknown'),
-                    'ip': session.get('ip', 'unknown')
-                }
-                logger.debug(f"获取会话 {session_id} 的设备类型信息: {device_info}")
-                return device_info
+        found = self._find_session(session_id)
+        if found is not None:
+            session = found[1]
+            device_info = {
+                'device_type': session.get('device_type', 'unknown'),
+                'browser': session.get('browser', 'unknown'),
+                'user_agent': session.get('user_agent', 'unknown'),
+                'ip': session.get('ip', 'unknown')
+            }
+            logger.debug(f"获取会话 {session_id} 的设备类型信息: {device_info}")
+            return device_info
         
         logger.warning(f"尝试获取不存在的会话的设备类型信息: {session_id}")
         return {}
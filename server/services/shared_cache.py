@@ -0,0 +1,275 @@
+"""跨进程共享内存缓存
+
+多个uvicorn worker进程通过mmap映射同一个文件，共享一张定长槽位的哈希表，
+无需Redis即可在同一台主机上共享缓存。
+
+存储布局：
+- 文件头（64字节）：魔数、槽位数、槽位大小、组相联路数、条目数、已用字节数
+- 槽位区：每个槽位 = 32字节槽位头 + 键（UTF-8）+ 值（JSON）
+  槽位头：状态、键长度、值长度、键哈希、过期时间、最后访问时间
+
+键按稳定哈希（blake2b，跨进程一致）映射到一组（ways个）槽位，组内满时
+淘汰过期项或最久未访问的项。所有读写都在跨进程文件锁内进行。
+"""
+import fnmatch
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.file_lock import InterProcessLock
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"XTSHMC01"
+_HEADER = struct.Struct("<8sIIIQQ")  # 魔数, 槽位数, 槽位大小, 路数, 条目数, 已用字节
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<BxHIQdd")  # 状态, 键长度, 值长度, 键哈希, 过期时间, 最后访问时间
+_EMPTY = 0
+_USED = 1
+
+
+def default_shared_cache_path() -> str:
+    """默认的共享缓存文件路径（优先使用/dev/shm）"""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "xt_shared_cache.bin")
+
+
+class SharedMemoryCache:
+    """基于mmap的跨进程缓存，接口与SyncMemoryCache一致
+
+    值以JSON存储（与Redis模式相同），超过槽位容量的值不会被缓存。
+    """
+
+    def __init__(self, path: Optional[str] = None, slots: int = 4096, slot_size: int = 1024,
+                 ways: int = 8, default_ttl: int = 3600, metrics=None):
+        if slot_size <= _SLOT.size + 16:
+            raise ValueError(f"槽位大小过小: {slot_size}")
+        self.path = path or default_shared_cache_path()
+        self.ways = max(1, min(ways, slots))
+        self.buckets = max(1, slots // self.ways)
+        self.slots = self.buckets * self.ways
+        self.slot_size = slot_size
+        self.default_ttl = default_ttl
+        self.max_size = self.slots
+        self.metrics = metrics
+        self._payload_size = slot_size - _SLOT.size
+        self._sweep_cursor = 0  # 增量过期清理的扫描位置
+        self._file_size = _HEADER_SIZE + self.slots * slot_size
+
+        self._lock = InterProcessLock(self.path + ".lock")
+        with self._lock:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(self._fd).st_size != self._file_size:
+                os.ftruncate(self._fd, self._file_size)
+            self._mm = mmap.mmap(self._fd, self._file_size)
+            magic, slots_, slot_size_, ways_, _, _ = _HEADER.unpack_from(self._mm, 0)
+            if (magic, slots_, slot_size_, ways_) != (_MAGIC, self.slots, slot_size, self.ways):
+                # 新文件或布局不一致，重新初始化
+                self._mm[:] = bytes(self._file_size)
+                _HEADER.pack_into(self._mm, 0, _MAGIC, self.slots, slot_size, self.ways, 0, 0)
+                logger.info(f"初始化共享内存缓存: {self.path} ({self.slots}槽位 x {slot_size}字节)")
+
+    # ---- 内部工具 ----
+
+    @staticmethod
+    def _hash(key_bytes: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), "little")
+
+    def _slot_offset(self, index: int) -> int:
+        return _HEADER_SIZE + index * self.slot_size
+
+    def _bucket(self, key_hash: int) -> range:
+        first = (key_hash % self.buckets) * self.ways
+        return range(first, first + self.ways)
+
+    def _adjust_header(self, items: int, used_bytes: int):
+        magic, slots, slot_size, ways, count, total = _HEADER.unpack_from(self._mm, 0)
+        _HEADER.pack_into(self._mm, 0, magic, slots, slot_size, ways,
+                          max(0, count + items), max(0, total + used_bytes))
+
+    def _read_key(self, offset: int, key_len: int) -> bytes:
+        start = offset + _SLOT.size
+        return self._mm[start:start + key_len]
+
+    def _find(self, key_bytes: bytes, key_hash: int) -> Tuple[Optional[int], tuple]:
+        """在键所属的组内查找槽位，返回(槽位序号, 槽位头)"""
+        for index in self._bucket(key_hash):
+            offset = self._slot_offset(index)
+            header = _SLOT.unpack_from(self._mm, offset)
+            if header[0] == _USED and header[3] == key_hash and self._read_key(offset, header[1]) == key_bytes:
+                return index, header
+        return None, ()
+
+    def _clear_slot(self, index: int, header: tuple):
+        _SLOT.pack_into(self._mm, self._slot_offset(index), _EMPTY, 0, 0, 0, 0.0, 0.0)
+        self._adjust_header(-1, -header[2])
+
+    def _record_eviction(self, cause: str, key: str):
+        if self.metrics is not None:
+            self.metrics.record_eviction(cause, key)
+
+    def _slot_key(self, index: int, header: tuple) -> str:
+        return self._read_key(self._slot_offset(index), header[1]).decode("utf-8", "replace")
+
+    # ---- 缓存接口 ----
+
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存值"""
+        key_bytes = key.encode("utf-8")
+        key_hash = self._hash(key_bytes)
+        with self._lock:
+            index, header = self._find(key_bytes, key_hash)
+            if index is None:
+                return None
+            now = time.time()
+            if header[4] and now > header[4]:
+                self._clear_slot(index, header)
+                self._record_eviction("ttl", key)
+                return None
+            offset = self._slot_offset(index)
+            _SLOT.pack_into(self._mm, offset, *header[:5], now)
+            start = offset + _SLOT.size + header[1]
+            raw = self._mm[start:start + header[2]]
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """设置缓存值"""
+        key_bytes = key.encode("utf-8")
+        value_bytes = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        key_hash = self._hash(key_bytes)
+        if len(key_bytes) + len(value_bytes) > self._payload_size:
+            # 超过槽位容量，不缓存并移除旧值
+            self.delete(key)
+            self._record_eviction("size", key)
+            return False
+
+        now = time.time()
+        expires_at = 0.0
+        if ttl is not None:
+            expires_at = now + ttl
+        elif self.default_ttl > 0:
+            expires_at = now + self.default_ttl
+
+        with self._lock:
+            index, header = self._find(key_bytes, key_hash)
+            if index is not None:
+                self._clear_slot(index, header)
+            else:
+                index = self._choose_slot(key_hash, now)
+            offset = self._slot_offset(index)
+            _SLOT.pack_into(self._mm, offset, _USED, len(key_bytes), len(value_bytes), key_hash, expires_at, now)
+            start = offset + _SLOT.size
+            self._mm[start:start + len(key_bytes)] = key_bytes
+            start += len(key_bytes)
+            self._mm[start:start + len(value_bytes)] = value_bytes
+            self._adjust_header(1, len(value_bytes))
+        return True
+
+    def _choose_slot(self, key_hash: int, now: float) -> int:
+        """选择写入槽位：空槽 > 过期槽 > 组内最久未访问的槽"""
+        victim, victim_header = None, None
+        for index in self._bucket(key_hash):
+            header = _SLOT.unpack_from(self._mm, self._slot_offset(index))
+            if header[0] != _USED:
+                return index
+            if header[4] and now > header[4]:
+                self._record_eviction("ttl", self._slot_key(index, header))
+                self._clear_slot(index, header)
+                return index
+            if victim_header is None or header[5] < victim_header[5]:
+                victim, victim_header = index, header
+        self._record_eviction("lru", self._slot_key(victim, victim_header))
+        self._clear_slot(victim, victim_header)
+        return victim
+
+    def delete(self, key: str) -> bool:
+        """删除缓存项"""
+        key_bytes = key.encode("utf-8")
+        with self._lock:
+            index, header = self._find(key_bytes, self._hash(key_bytes))
+            if index is None:
+                return False
+            self._clear_slot(index, header)
+            return True
+
+    def clear(self) -> bool:
+        """清空所有缓存"""
+        with self._lock:
+            self._mm[_HEADER_SIZE:] = bytes(self._file_size - _HEADER_SIZE)
+            _HEADER.pack_into(self._mm, 0, _MAGIC, self.slots, self.slot_size, self.ways, 0, 0)
+        logger.info("共享内存缓存已清空")
+        return True
+
+    def exists(self, key: str) -> bool:
+        """检查键是否存在"""
+        return self.get(key) is not None
+
+    def _scan(self):
+        """遍历所有已使用的槽位（调用方需持有锁）"""
+        for index in range(self.slots):
+            header = _SLOT.unpack_from(self._mm, self._slot_offset(index))
+            if header[0] == _USED:
+                yield index, header
+
+    def keys(self, pattern: str = "*") -> List[str]:
+        """获取所有键（简单模式匹配）"""
+        now = time.time()
+        with self._lock:
+            keys = [
+                self._slot_key(index, header) for index, header in self._scan()
+                if not (header[4] and now > header[4])
+            ]
+        if pattern == "*":
+            return keys
+        return [key for key in keys if fnmatch.fnmatch(key, pattern)]
+
+    def cleanup_expired(self, limit: Optional[int] = None) -> int:
+        """清理过期的缓存项，返回清理数量
+
+        过期项在读写时已按组惰性回收；这里从上次位置起最多检查limit个槽位，
+        使每次持有跨进程锁的时间有上限。
+        """
+        now = time.time()
+        expired = 0
+        count = self.slots if limit is None else min(limit, self.slots)
+        with self._lock:
+            for step in range(count):
+                index = (self._sweep_cursor + step) % self.slots
+                header = _SLOT.unpack_from(self._mm, self._slot_offset(index))
+                if header[0] == _USED and header[4] and now > header[4]:
+                    self._record_eviction("ttl", self._slot_key(index, header))
+                    self._clear_slot(index, header)
+                    expired += 1
+            self._sweep_cursor = (self._sweep_cursor + count) % self.slots
+        if expired:
+            logger.debug(f"清理了 {expired} 个过期共享缓存项")
+        return expired
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            _, _, _, _, items, used_bytes = _HEADER.unpack_from(self._mm, 0)
+        return {
+            'total_items': items,
+            'max_size': self.slots,
+            'default_ttl': self.default_ttl,
+            'eviction_policy': 'lru',
+            'slot_size': self.slot_size,
+            'ways': self.ways,
+            'shared_path': self.path,
+            'memory_usage_estimate': used_bytes
+        }
+
+    def close(self):
+        """解除映射并关闭文件"""
+        try:
+            self._mm.close()
+            os.close(self._fd)
+        finally:
+            self._lock.close()
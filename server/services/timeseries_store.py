@@ -0,0 +1,584 @@
+"""性能指标时序存储
+
+性能指标按定长记录存放在三个精度层级中，每层一个追加写入的二进制文件：
+- raw: 原始样本，保留1天（同一秒内的重复样本只保留第一条）
+- 1m:  每分钟汇总（各字段的样本数、和、最小值、最大值），保留30天
+- 1h:  每小时汇总，保留1年
+
+样本写入raw层的同时累加到当前分钟桶，分钟结束时写入1m层并累加到当前小时桶，
+小时结束时写入1h层。各层在内存中按列保存在array中，时间戳有序，范围查询用二分定位。
+
+多worker部署时每个进程只追加和裁剪自己的文件 perf_ts_{层级}_w{pid}.bin，查询时合并
+本进程内存中的数据和其他进程的文件（按大小和修改时间缓存）。超过 SOURCE_STALE_SECONDS
+未更新的其他进程文件视为进程已退出，在每日清理时补全其未结束的分钟/小时桶，并入
+归档文件 perf_ts_{层级}.bin（旧版本的单文件存储也作为归档读取）后删除；归档只在跨进程
+文件锁内重写。
+
+汇总查询（min/avg/max/sum）按精度从粗到细拼接：完整的小时用1h层，剩余的完整分钟
+用1m层，首尾不足一分钟的部分用raw层，合并的行数与时间跨度无关，30天约720行。
+序列查询选择点数不超过期望值的最细层级（跨度越大层级越粗）。
+"""
+import glob
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.file_lock import InterProcessLock
+
+logger = logging.getLogger("timeseries_store")
+
+FIELDS = ("cpu_usage", "memory_usage", "disk_usage", "active_connections",
+          "request_count", "error_count", "avg_response_time")
+# 为0时视为没有数据（没有请求的区间不参与响应时间统计）
+SKIP_ZERO_FIELDS = ("avg_response_time",)
+
+_EPOCH = datetime(1970, 1, 1)
+_MAGIC = b"XTTS0001"
+_RAW_RECORD = struct.Struct("<d" + "d" * len(FIELDS))
+_ROLLUP_RECORD = struct.Struct("<d" + "Iddd" * len(FIELDS))
+
+# 层级名 -> (桶宽度秒数, 保留秒数)
+TIERS: Dict[str, Tuple[int, int]] = {
+    "raw": (0, 24 * 3600),
+    "1m": (60, 30 * 24 * 3600),
+    "1h": (3600, 365 * 24 * 3600),
+}
+# 其他进程的文件超过该时长未更新时视为进程已退出，并入归档
+SOURCE_STALE_SECONDS = 3 * 3600
+
+
+def to_epoch(value) -> float:
+    """UTC时间（datetime或ISO字符串，不带时区）转为秒数"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return (value.replace(tzinfo=None) - _EPOCH).total_seconds()
+
+
+def from_epoch(seconds: float) -> datetime:
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+class _Aggregate:
+    """一组样本的各字段统计：样本数、和、最小值、最大值"""
+
+    __slots__ = ("start", "count", "sum", "min", "max")
+
+    def __init__(self, start: float = 0.0):
+        self.start = start
+        n = len(FIELDS)
+        self.count = [0] * n
+        self.sum = [0.0] * n
+        self.min = [0.0] * n
+        self.max = [0.0] * n
+
+    def add_value(self, i: int, value: float):
+        if self.count[i] == 0:
+            self.min[i] = self.max[i] = value
+        else:
+            if value < self.min[i]:
+                self.min[i] = value
+            if value > self.max[i]:
+                self.max[i] = value
+        self.count[i] += 1
+        self.sum[i] += value
+
+    def add_sample(self, values: List[float]):
+        for i, value in enumerate(values):
+            if value == 0 and FIELDS[i] in SKIP_ZERO_FIELDS:
+                continue
+            self.add_value(i, value)
+
+    def merge_stats(self, i: int, count: int, total: float, low: float, high: float):
+        if not count:
+            return
+        if self.count[i] == 0:
+            self.min[i], self.max[i] = low, high
+        else:
+            self.min[i] = min(self.min[i], low)
+            self.max[i] = max(self.max[i], high)
+        self.count[i] += count
+        self.sum[i] += total
+
+    def merge(self, other: "_Aggregate"):
+        for i in range(len(FIELDS)):
+            self.merge_stats(i, other.count[i], other.sum[i], other.min[i], other.max[i])
+
+    def pack(self) -> bytes:
+        values: List[Any] = [self.start]
+        for i in range(len(FIELDS)):
+            values.extend((self.count[i], self.sum[i], self.min[i], self.max[i]))
+        return _ROLLUP_RECORD.pack(*values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for i, name in enumerate(FIELDS):
+            count = self.count[i]
+            result[name] = {
+                "avg": self.sum[i] / count if count else 0,
+                "min": self.min[i] if count else 0,
+                "max": self.max[i] if count else 0,
+                "sum": self.sum[i],
+                "count": count
+            }
+        return result
+
+
+class _Tier:
+    """一个精度层级：按列存放的定长记录和对应的追加文件"""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.width, self.retention = TIERS[name]
+        self.path = path
+        self.record = _RAW_RECORD if name == "raw" else _ROLLUP_RECORD
+        self.times = array("d")
+        if name == "raw":
+            self.values = [array("d") for _ in FIELDS]
+        else:
+            self.counts = [array("I") for _ in FIELDS]
+            self.sums = [array("d") for _ in FIELDS]
+            self.mins = [array("d") for _ in FIELDS]
+            self.maxs = [array("d") for _ in FIELDS]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def _append_row(self, row: tuple):
+        self.times.append(row[0])
+        if self.name == "raw":
+            for column, value in zip(self.values, row[1:]):
+                column.append(value)
+        else:
+            for i in range(len(FIELDS)):
+                base = 1 + i * 4
+                self.counts[i].append(row[base])
+                self.sums[i].append(row[base + 1])
+                self.mins[i].append(row[base + 2])
+                self.maxs[i].append(row[base + 3])
+
+    def append(self, data: bytes):
+        """追加一条记录（内存与文件）"""
+        self._append_row(self.record.unpack(data))
+        try:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "ab") as f:
+                if new_file:
+                    f.write(_MAGIC)
+                f.write(data)
+        except OSError as e:
+            logger.error(f"写入性能指标 {self.path} 失败: {e}")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            if data[:len(_MAGIC)] != _MAGIC:
+                logger.error(f"性能指标文件 {self.path} 格式无效，已忽略")
+                return
+            body = memoryview(data)[len(_MAGIC):]
+            usable = len(body) - len(body) % self.record.size  # 忽略未写完的尾部记录
+            rows = list(self.record.iter_unpack(body[:usable]))
+            if any(rows[i][0] < rows[i - 1][0] for i in range(1, len(rows))):
+                rows.sort(key=lambda row: row[0])  # 二分查找要求时间戳有序
+            for row in rows:
+                self._append_row(row)
+        except OSError as e:
+            logger.error(f"读取性能指标 {self.path} 失败: {e}")
+
+    def rewrite(self, rows: List[bytes]):
+        """用给定的记录（需按时间升序）原子地重写文件和内存中的列"""
+        self.__init__(self.name, self.path)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_MAGIC)
+            for data in rows:
+                f.write(data)
+        os.replace(temp_path, self.path)
+        for data in rows:
+            self._append_row(self.record.unpack(data))
+
+    def prune(self, now: float) -> int:
+        """删除超过保留期的记录并重写文件，返回删除的条数"""
+        cutoff = bisect_left(self.times, now - self.retention)
+        if cutoff == 0:
+            return 0
+        self.rewrite([self.row_bytes(i) for i in range(cutoff, len(self.times))])
+        return cutoff
+
+    def row_bytes(self, i: int) -> bytes:
+        if self.name == "raw":
+            return self.record.pack(self.times[i], *(column[i] for column in self.values))
+        values: List[Any] = [self.times[i]]
+        for f in range(len(FIELDS)):
+            values.extend((self.counts[f][i], self.sums[f][i], self.mins[f][i], self.maxs[f][i]))
+        return self.record.pack(*values)
+
+    def rows_between(self, start: float, end: float) -> Tuple[int, int]:
+        """时间戳在[start, end)内的行号区间"""
+        return bisect_left(self.times, start), bisect_left(self.times, end)
+
+    def aggregate(self, lo: int, hi: int, into: _Aggregate):
+        """把[lo, hi)行的统计合并进into（在array切片上求值）"""
+        if lo >= hi:
+            return
+        for i, name in enumerate(FIELDS):
+            if self.name == "raw":
+                column = self.values[i][lo:hi]
+                if name in SKIP_ZERO_FIELDS:
+                    column = [value for value in column if value != 0]
+                if column:
+                    into.merge_stats(i, len(column), sum(column), min(column), max(column))
+            else:
+                counts = self.counts[i][lo:hi]
+                total = sum(counts)
+                if not total:
+                    continue
+                present = [row for row, count in enumerate(counts, lo) if count]
+                into.merge_stats(
+                    i, total, sum(self.sums[i][lo:hi]),
+                    min(self.mins[i][row] for row in present),
+                    max(self.maxs[i][row] for row in present)
+                )
+
+
+class _TierSet:
+    """一组raw/1m/1h层级：一个进程的文件或归档，以及该进程尚未结束的分钟桶和小时桶"""
+
+    def __init__(self, paths: Dict[str, str]):
+        self.tiers = {name: _Tier(name, paths[name]) for name in TIERS}
+        self.open_minute: Optional[_Aggregate] = None
+        self.open_hour: Optional[_Aggregate] = None
+
+    def load(self) -> "_TierSet":
+        for tier in self.tiers.values():
+            tier.load()
+        return self
+
+    def signature(self) -> tuple:
+        """各层级文件的(大小, 修改时间)，文件变化后重新加载"""
+        result = []
+        for tier in self.tiers.values():
+            try:
+                stat = os.stat(tier.path)
+                result.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                result.append(None)
+        return tuple(result)
+
+    @property
+    def is_empty(self) -> bool:
+        return all(len(tier) == 0 for tier in self.tiers.values())
+
+    # ---- 分钟桶和小时桶 ----
+
+    def restore_open_buckets(self):
+        """重启后从1m层和raw层重建尚未写入汇总层的小时桶和分钟桶
+
+        停机期间跨过的桶在重建时直接写入汇总层，只有最后一个桶保持未结束状态。
+        """
+        raw, minutes, hours = self.tiers["raw"], self.tiers["1m"], self.tiers["1h"]
+        hour_from = hours.times[-1] + 3600 if len(hours) else 0.0
+        minute_from = minutes.times[-1] + 60 if len(minutes) else 0.0
+        for row in range(bisect_left(minutes.times, hour_from), len(minutes)):
+            bucket = _Aggregate(minutes.times[row])
+            for i in range(len(FIELDS)):
+                bucket.merge_stats(i, minutes.counts[i][row], minutes.sums[i][row],
+                                   minutes.mins[i][row], minutes.maxs[i][row])
+            self._add_to_hour(bucket)
+        for row in range(bisect_left(raw.times, minute_from), len(raw)):
+            self.add_to_minute(raw.times[row], [column[row] for column in raw.values])
+
+    def close_open_buckets(self):
+        """把未结束的分钟桶和小时桶写入汇总层（进程已退出，不会再有新样本）"""
+        if self.open_minute is not None:
+            self._close_minute()
+        if self.open_hour is not None:
+            bucket, self.open_hour = self.open_hour, None
+            self.tiers["1h"].append(bucket.pack())
+
+    def add_to_minute(self, seconds: float, row: List[float]):
+        start = seconds - seconds % 60
+        bucket = self.open_minute
+        if bucket is not None and bucket.start != start:
+            self._close_minute()
+            bucket = None
+        if bucket is None:
+            bucket = self.open_minute = _Aggregate(start)
+        bucket.add_sample(row)
+
+    def _close_minute(self):
+        bucket, self.open_minute = self.open_minute, None
+        self.tiers["1m"].append(bucket.pack())
+        self._add_to_hour(bucket)
+
+    def _add_to_hour(self, minute: _Aggregate):
+        start = minute.start - minute.start % 3600
+        bucket = self.open_hour
+        if bucket is not None and bucket.start != start:
+            self.open_hour = None
+            self.tiers["1h"].append(bucket.pack())
+            bucket = None
+        if bucket is None:
+            bucket = self.open_hour = _Aggregate(start)
+        bucket.merge(minute)
+
+    # ---- 查询 ----
+
+    def _closed_until(self, name: str) -> float:
+        """该层级已写入的最后一个完整桶的结束时间"""
+        tier = self.tiers[name]
+        return tier.times[-1] + tier.width if len(tier) else 0.0
+
+    def summarize(self, start: float, end: float, total: _Aggregate) -> int:
+        """把[start, end)的统计合并进total，返回读取的行数
+
+        按层级从粗到细，每层处理完全落在剩余区间内且已结束的桶，其余用raw层。
+        """
+        rows = 0
+        pending = [(start, end)]
+        for name in ("1h", "1m"):
+            tier = self.tiers[name]
+            width = tier.width
+            closed = self._closed_until(name)
+            remaining = []
+            for lo_time, hi_time in pending:
+                first = -(-lo_time // width) * width  # 向上取整到桶边界
+                last = min(hi_time - hi_time % width, closed)
+                if first >= last:
+                    remaining.append((lo_time, hi_time))
+                    continue
+                lo, hi = tier.rows_between(first, last)
+                tier.aggregate(lo, hi, total)
+                rows += hi - lo
+                remaining.append((lo_time, first))
+                remaining.append((last, hi_time))
+            pending = [(lo_time, hi_time) for lo_time, hi_time in remaining if lo_time < hi_time]
+        raw = self.tiers["raw"]
+        for lo_time, hi_time in pending:
+            lo, hi = raw.rows_between(lo_time, hi_time)
+            raw.aggregate(lo, hi, total)
+            rows += hi - lo
+        return rows
+
+    def collect_points(self, name: str, start: float, end: float, points: Dict[float, list]):
+        """把[start, end)内的行累加到points：时间 -> [各字段的和, 各字段的样本数]"""
+        tier = self.tiers[name]
+        lo, hi = tier.rows_between(start, end)
+        n = len(FIELDS)
+        for row in range(lo, hi):
+            point = points.get(tier.times[row])
+            if point is None:
+                point = points[tier.times[row]] = [[0.0] * n, [0] * n]
+            for i in range(n):
+                if name == "raw":
+                    point[0][i] += tier.values[i][row]
+                    point[1][i] += 1
+                else:
+                    point[0][i] += tier.sums[i][row]
+                    point[1][i] += tier.counts[i][row]
+
+
+class TimeSeriesStore:
+    """三级精度的性能指标时序存储"""
+
+    def __init__(self, directory: str, file_prefix: str = "perf_ts_"):
+        self.directory = directory
+        self.file_prefix = file_prefix
+        self._lock = threading.Lock()
+        self._own = _TierSet(self._paths(f"_w{os.getpid()}")).load()
+        self.tiers = self._own.tiers
+        self.duplicates = 0
+        self._own.restore_open_buckets()
+        # 其他进程和归档的层级：来源（pid或archive）-> (文件签名, 层级)
+        self._sources: Dict[str, Tuple[tuple, _TierSet]] = {}
+        self._source_re = re.compile(rf"^{re.escape(file_prefix)}(?:raw|1m|1h)(?:_w(\d+))?\.bin$")
+        self._archive_lock = InterProcessLock(os.path.join(directory, f"{file_prefix}archive.lock"))
+
+    def _paths(self, suffix: str = "") -> Dict[str, str]:
+        return {name: os.path.join(self.directory, f"{self.file_prefix}{name}{suffix}.bin") for name in TIERS}
+
+    @property
+    def is_empty(self) -> bool:
+        with self._lock:
+            if not self._own.is_empty:
+                return False
+        return all(tier_set.is_empty for tier_set in self._peer_sets().values())
+
+    # ---- 写入 ----
+
+    def add(self, timestamp, values: Dict[str, Any]) -> bool:
+        """写入一个样本（timestamp为UTC时间），同一秒内或早于本进程最新样本的重复样本被丢弃"""
+        seconds = to_epoch(timestamp)
+        row = [float(values.get(name) or 0) for name in FIELDS]
+        with self._lock:
+            raw = self.tiers["raw"]
+            if len(raw) and int(seconds) <= int(raw.times[-1]):
+                self.duplicates += 1
+                return False
+            raw.append(_RAW_RECORD.pack(seconds, *row))
+            self._own.add_to_minute(seconds, row)
+        return True
+
+    def prune(self, now: Optional[float] = None) -> Dict[str, int]:
+        """按各层级的保留期删除本进程和归档中的旧记录，并把已退出进程的文件并入归档"""
+        now = to_epoch(datetime.utcnow()) if now is None else now
+        with self._lock:
+            pruned = {name: tier.prune(now) for name, tier in self.tiers.items()}
+        try:
+            for name, count in self._archive(now).items():
+                pruned[name] += count
+        except Exception as e:
+            logger.error(f"归档性能指标失败: {e}")
+        return pruned
+
+    # ---- 其他进程与归档 ----
+
+    def _source_ids(self) -> List[str]:
+        """目录中其他进程（pid）和归档（archive）的文件来源"""
+        own = str(os.getpid())
+        sources = set()
+        for path in glob.glob(os.path.join(glob.escape(self.directory), f"{self.file_prefix}*.bin")):
+            match = self._source_re.match(os.path.basename(path))
+            if match and match.group(1) != own:
+                sources.add(match.group(1) or "archive")
+        return sorted(sources)
+
+    def _source_paths(self, source: str) -> Dict[str, str]:
+        return self._paths("" if source == "archive" else f"_w{source}")
+
+    def _peer_sets(self) -> Dict[str, _TierSet]:
+        """其他进程和归档的层级（文件未变化时使用缓存）"""
+        result = {}
+        for source in self._source_ids():
+            tier_set = _TierSet(self._source_paths(source))
+            signature = tier_set.signature()
+            with self._lock:
+                cached = self._sources.get(source)
+            if cached is not None and cached[0] == signature:
+                result[source] = cached[1]
+                continue
+            result[source] = tier_set.load()
+            with self._lock:
+                self._sources[source] = (signature, tier_set)
+        with self._lock:
+            for source in set(self._sources) - set(result):
+                del self._sources[source]
+        return result
+
+    def _archive(self, now: float) -> Dict[str, int]:
+        """把超过SOURCE_STALE_SECONDS未更新的其他进程文件并入归档，并裁剪归档（跨进程互斥）"""
+        pruned = {name: 0 for name in TIERS}
+        with self._archive_lock:
+            archive = _TierSet(self._paths()).load()
+            rows = {name: [tier.row_bytes(i) for i in range(len(tier))] for name, tier in archive.tiers.items()}
+            merged = []
+            for source in self._source_ids():
+                if source == "archive":
+                    continue
+                paths = self._source_paths(source)
+                mtimes = [os.path.getmtime(path) for path in paths.values() if os.path.exists(path)]
+                if not mtimes or time.time() - max(mtimes) < SOURCE_STALE_SECONDS:
+                    continue
+                # 补全的桶会追加到该进程的文件中，文件随后被删除
+                tier_set = _TierSet(paths).load()
+                tier_set.restore_open_buckets()
+                tier_set.close_open_buckets()
+                for name, tier in tier_set.tiers.items():
+                    rows[name].extend(tier.row_bytes(i) for i in range(len(tier)))
+                merged.append((source, paths))
+            if not merged and all(
+                    not len(tier) or tier.times[0] >= now - tier.retention for tier in archive.tiers.values()):
+                return pruned
+            for name, tier in archive.tiers.items():
+                record = tier.record
+                kept = sorted((data for data in rows[name] if record.unpack_from(data)[0] >= now - tier.retention),
+                              key=lambda data: record.unpack_from(data)[0])
+                pruned[name] = len(rows[name]) - len(kept)
+                tier.rewrite(kept)
+            for source, paths in merged:
+                for path in paths.values():
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                logger.info(f"已把进程 {source} 的性能指标并入归档")
+        return pruned
+
+    # ---- 查询 ----
+
+    def summary(self, start_time, end_time) -> Dict[str, Any]:
+        """[start, end)范围内各字段的统计，完整的小时/分钟用汇总层，其余用raw层"""
+        start, end = to_epoch(start_time), to_epoch(end_time)
+        total = _Aggregate(start)
+        peers = self._peer_sets()
+        with self._lock:
+            rows = self._own.summarize(start, end, total)
+        for tier_set in peers.values():
+            rows += tier_set.summarize(start, end, total)
+        result = total.to_dict()
+        result["rows_read"] = rows
+        result["sources"] = 1 + len(peers)
+        return result
+
+    def choose_tier(self, start: float, end: float, max_points: int, now: Optional[float] = None) -> str:
+        """点数不超过max_points（桶宽度不小于跨度/max_points）且保留期覆盖起点的最细层级
+
+        raw层的样本间隔按采集间隔（约60秒）估算。
+        """
+        now = to_epoch(datetime.utcnow()) if now is None else now
+        step = (end - start) / max(1, max_points)
+        for name, width in (("raw", 60), ("1m", 60), ("1h", 3600)):
+            _, retention = TIERS[name]
+            if width >= step and start >= now - retention:
+                return name
+        return "1h"
+
+    def series(self, start_time, end_time, max_points: int = 300) -> Dict[str, Any]:
+        """时间范围内的序列，按点数选择层级；各进程同一时间桶的汇总合并为一个点"""
+        start, end = to_epoch(start_time), to_epoch(end_time)
+        name = self.choose_tier(start, end, max_points)
+        collected: Dict[float, list] = {}
+        peers = self._peer_sets()
+        with self._lock:
+            self._own.collect_points(name, start, end, collected)
+        for tier_set in peers.values():
+            tier_set.collect_points(name, start, end, collected)
+        points = []
+        for timestamp in sorted(collected):
+            sums, counts = collected[timestamp]
+            point: Dict[str, Any] = {"timestamp": from_epoch(timestamp).isoformat()}
+            for i, field in enumerate(FIELDS):
+                point[field] = sums[i] / counts[i] if counts[i] else 0
+            points.append(point)
+        return {"tier": name, "points": points}
+
+    def import_samples(self, samples: Iterable[Tuple[Any, Dict[str, Any]]]) -> int:
+        """导入历史样本（需按时间升序），返回写入的条数"""
+        count = 0
+        for timestamp, values in samples:
+            if self.add(timestamp, values):
+                count += 1
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        peers = self._peer_sets()
+        with self._lock:
+            rows = {name: len(tier) for name, tier in self.tiers.items()}
+            duplicates = self.duplicates
+        for tier_set in peers.values():
+            for name, tier in tier_set.tiers.items():
+                rows[name] += len(tier)
+        return {
+            "rows": rows,
+            "sources": 1 + len(peers),
+            "duplicates_dropped": duplicates
+        }
@@ -0,0 +1,51 @@
+"""跨进程文件锁
+
+多个uvicorn worker共用同一目录或文件时（共享内存缓存、日志维护任务、性能指标归档），
+用它串行化跨进程的读写。
+"""
+import os
+import threading
+
+
+class InterProcessLock:
+    """跨进程互斥锁
+
+    进程内用threading.Lock串行化线程，进程间用文件锁（POSIX为flock，
+    Windows为msvcrt.locking）。
+    """
+
+    def __init__(self, path: str):
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.name == "nt":
+            import msvcrt
+            self._msvcrt = msvcrt
+        else:
+            import fcntl
+            self._fcntl = fcntl
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if os.name == "nt":
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                self._msvcrt.locking(self._fd, self._msvcrt.LK_LOCK, 1)
+            else:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        except Exception:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if os.name == "nt":
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                self._msvcrt.locking(self._fd, self._msvcrt.LK_UNLCK, 1)
+            else:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+    def close(self):
+        os.close(self._fd)